@@ -1,71 +1,219 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
-import uvicorn
+from fastapi.responses import JSONResponse, Response
 import base64
-from watchreq_script import get_gmail_service, get_label_id, send_gmail_watch, get_message_body, get_top_news_data, download_image, get_text_content, PROJECT_ID, TOPIC_NAME, LABEL_NAME
-from my_crew import kickoff_linkedin_post
-from linkedin_post import markdown_to_linkedin_unicode, post_to_linkedin
-from dotenv import load_dotenv
+import binascii
+import json
 import os
+import sys
+from job_queue import JobQueue, QueueFullError
+from job_store import job_store
+from coordination import Leadership
+from gmail_watch import watch_renewer, GMAIL_WATCH_RENEWAL
+import http_client
+import metrics
+from perplexity_cache import perplexity_cache
+from post_schedule import post_schedule, DripScheduler, POST_DRIP_INTERVAL
+from warmup import Warmup
+from dotenv import load_dotenv
 
 load_dotenv()
 
-linkedin_access_token = os.getenv("LINKEDIN_ACCESS_TOKEN")
-linkedin_owner_urn = os.getenv("LINKEDIN_OWNER_URN")
+POST_DRIP_ENABLED = os.getenv("POST_DRIP_ENABLED", "false").lower() == "true"
+
+
+# The pipeline modules pull in crewai, the Google API client, lxml and Pillow. They are imported by the
+# warmup once the server is listening (or by the first job), so a cold start can accept a push right away.
+def run_mail_pipeline(notification):
+    from pipeline import run_mail_pipeline
+    return run_mail_pipeline(notification)
+
+
+def run_batch(request):
+    from batch_mode import run_batch
+    return run_batch(request)
+
+
+def publish_scheduled_post(row):
+    from batch_mode import publish_scheduled_post
+    return publish_scheduled_post(row)
+
+
+def import_pipeline():
+    import pipeline, batch_mode  # noqa: F401
+
+
+def build_crews():
+    from my_crew import crew_runner
+    crew_runner.warm()
+
 
+def build_gmail_client():
+    from gmail_client import gmail_client
+    gmail_client.get_service()
+
+
+def llm_provider_status():
+    # Only once the warmup or a job loaded my_crew, importing it here would load crewai on the event loop
+    router = getattr(sys.modules.get("my_crew"), "llm_router", None)
+    return router.status() if router is not None else None
+
+
+job_queue = JobQueue(run_mail_pipeline, name="mail", store=job_store)
+# Batch runs fan out internally, one at a time is enough
+batch_queue = JobQueue(run_batch, concurrency=1, max_size=5, name="batch", store=job_store)
+# Only one replica publishes, its lease outlives the wait after a published post
+drip_scheduler = DripScheduler(publish_scheduled_post, leadership=Leadership("post-drip", ttl=2 * POST_DRIP_INTERVAL + 60))
+warmup = Warmup([
+    ("import_pipeline", import_pipeline, True),
+    ("http_client", http_client.get_client, True),
+    ("crews", build_crews, True),
+    ("gmail_client", build_gmail_client, False),
+])
+
+
+@asynccontextmanager
+async def lifespan(app):
+    job_store.prune()
+    warmup.start()
+    job_queue.start()
+    batch_queue.start()
+    if POST_DRIP_ENABLED:
+        drip_scheduler.start()
+    if GMAIL_WATCH_RENEWAL:
+        watch_renewer.start()
+    yield
+    watch_renewer.stop()
+    drip_scheduler.stop()
+    batch_queue.stop()
+    job_queue.stop()
+    await http_client.aclose()
+    http_client.close()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+def decode_pubsub_message(data):
+    """
+    Validate a Pub/Sub push body and decode the Gmail notification inside it
+
+    Returns:
+        dict: The decoded notification ({"emailAddress": ..., "historyId": ...})
+
+    Raises:
+        ValueError: If the body is not a well formed Gmail push notification
+    """
+    if not isinstance(data, dict) or not isinstance(data.get("message"), dict) or "data" not in data["message"]:
+        raise ValueError("Payload has no message.data field")
+    try:
+        # Pub/Sub sends 'data' base64 encoded
+        decoded_str = base64.b64decode(data["message"]["data"]).decode("utf-8")
+        notification = json.loads(decoded_str)
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Could not decode message data: {e}")
+    if not isinstance(notification, dict) or "historyId" not in notification:
+        raise ValueError("Decoded message has no historyId")
+    return notification
 
-app = FastAPI()
 
 @app.post("/mail_payload")
 async def mail_payload(request: Request):
     """
     This endpoint will receive POST requests from Pub/Sub push.
     The incoming request body will be JSON with a 'message' object.
+    The message is only validated and queued here, the post pipeline runs on the worker pool.
+    """
+    body = await request.body()
+    try:
+        notification = decode_pubsub_message(json.loads(body))
+    except ValueError as e:
+        # Acknowledged anyway: Pub/Sub redelivers anything answered with a non 2xx, and a malformed push
+        # would fail the same way until the retention period ends
+        print(f"Dropping malformed payload ({e}): {body[:1000]!r}")
+        return Response(status_code=204)
+
+    print("Decoded Pub/Sub message data:", notification)
+    try:
+        job_id = job_queue.submit(notification)
+    except QueueFullError as e:
+        print("Job queue full, asking Pub/Sub to retry later:", e)
+        # Pub/Sub will retry with backoff on a non 2xx response
+        return JSONResponse(content={"status": "busy"}, status_code=503, headers={"Retry-After": "30"})
+
+    # Return success so Pub/Sub knows we accepted it
+    return JSONResponse(content={"status": "queued", "job_id": job_id}, status_code=200)
+
+
+@app.post("/batch")
+async def batch(request: Request):
+    """
+    Queue a batch run that turns every story of the given (or all unprocessed) newsletters into scheduled posts.
+    Body: {"message_ids": [...]} and/or {"backlog": true}
     """
     try:
         data = await request.json()
-        print("Received payload:", data)
-
-        # ---- Example: decode Pub/Sub message if needed ----
-        
-        if "message" in data and "data" in data["message"]:
-            # Pub/Sub sends 'data' base64 encoded
-            decoded_bytes = base64.b64decode(data["message"]["data"])
-            decoded_str = decoded_bytes.decode("utf-8")
-            print("Decoded Pub/Sub message data:", decoded_str)
-
-        service = get_gmail_service()
-        label_id = get_label_id(service, LABEL_NAME)
-        topic_full_name = f'projects/{PROJECT_ID}/topics/{TOPIC_NAME}'
-        html_code = get_message_body(service, label_id)
-        title, article_link, img_src = get_top_news_data(html_code)
-        print(f"----------- Extracted Top News Data: Title: {title}, Link: {article_link}, Image Source: {img_src}")
-        image_path = download_image(img_src) if img_src else None
-        print(f"----------- Downloaded image path: {image_path}")
-        text_content = get_text_content(article_link)
-        print(f"----------- Extracted text content")
-        agent_output = kickoff_linkedin_post(content=text_content, link=article_link)
-        print(f"----------- Crew generated output successfully")
-        formatted_post = markdown_to_linkedin_unicode(agent_output)
-        print(f"----------- Formatted post for LinkedIn")
-        print(f"----------- Posting to LinkedIn")
-        linkedin_response = post_to_linkedin(access_token=linkedin_access_token, image_path=image_path, post_text=formatted_post, owner_urn=linkedin_owner_urn)
-        if linkedin_response:
-            print("Complete workflow successful!")
-        else:
-            print("Complete workflow failed")
-        # Return success so Pub/Sub knows we processed it
-        return JSONResponse(content={"status": "ok"}, status_code=200)
-
-    except Exception as e:
-        print("Error processing request:", e)
-        # Pub/Sub will retry if not 2xx
-        return JSONResponse(content={"status": "error"}, status_code=500)
+    except ValueError:
+        data = {}
+    if not isinstance(data, dict) or not (data.get("backlog") or data.get("message_ids")):
+        return JSONResponse(content={"status": "invalid", "detail": "Pass message_ids or backlog=true"}, status_code=400)
+    try:
+        job_id = batch_queue.submit(data)
+    except QueueFullError:
+        return JSONResponse(content={"status": "busy"}, status_code=503, headers={"Retry-After": "60"})
+    return JSONResponse(content={"status": "queued", "job_id": job_id}, status_code=200)
+
+
+@app.get("/schedule")
+async def schedule(status: str = None):
+    return JSONResponse(content={"posts": post_schedule.list(status)}, status_code=200)
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = job_queue.get(job_id) or batch_queue.get(job_id)
+    if job is None:
+        return JSONResponse(content={"status": "not_found"}, status_code=404)
+    return JSONResponse(content=job, status_code=200)
+
+
+@app.post("/jobs/{job_id}/retry")
+async def retry_job(job_id: str):
+    """Run a failed job again, it resumes from the last stage its earlier runs completed"""
+    try:
+        retried = job_queue.retry(job_id) or batch_queue.retry(job_id)
+    except QueueFullError:
+        return JSONResponse(content={"status": "busy"}, status_code=503, headers={"Retry-After": "30"})
+    if not retried:
+        return JSONResponse(content={"status": "not_retryable"}, status_code=409)
+    return JSONResponse(content={"status": "queued", "job_id": job_id}, status_code=200)
+
+
+@app.get("/stats")
+async def stats():
+    from image_prep import asset_store
+    return JSONResponse(content={"jobs": job_queue.stats(), "perplexity_cache": perplexity_cache.stats(), "images": asset_store.stats(),
+                                 "warmup": warmup.status(), "gmail_watch": watch_renewer.status(), "llm_providers": llm_provider_status()},
+                        status_code=200)
+
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 once the pipeline modules and clients are loaded, 503 while warming up"""
+    return JSONResponse(content=warmup.status(), status_code=200 if warmup.ready else 503)
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
 
 @app.post("/webhooks")
 async def dummy():
     return JSONResponse(content={"status": "ok"}, status_code=200)
 
 if __name__ == "__main__":
+    import uvicorn
     # Run app locally for testing
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,203 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from bs4 import BeautifulSoup
+import http_client
+from dedup_store import normalize_url
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ARTICLE_CACHE_DIR = os.getenv("ARTICLE_CACHE_DIR", "article_cache")
+ARTICLE_CACHE_MAX_BYTES = int(os.getenv("ARTICLE_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+# Pages bigger than this are cut off, article bodies are always near the top of the document
+ARTICLE_MAX_DOWNLOAD_BYTES = int(os.getenv("ARTICLE_MAX_DOWNLOAD_BYTES", str(2 * 1024 * 1024)))
+# Entries are served without a request for this long, then revalidated (ETag/Last-Modified) or fetched again
+ARTICLE_CACHE_TTL = int(os.getenv("ARTICLE_CACHE_TTL", "86400"))
+
+BOILERPLATE_TAGS = ["script", "style", "noscript", "template", "svg", "canvas", "iframe", "form", "button",
+                    "nav", "header", "footer", "aside", "menu", "dialog"]
+BOILERPLATE_HINTS = re.compile(r"nav|menu|footer|header|sidebar|cookie|consent|banner|subscribe|newsletter|share|social|"
+                               r"related|recommend|promo|advert|\bad\b|comment|breadcrumb|popup|modal", re.IGNORECASE)
+BLOCK_TAGS = ["h1", "h2", "h3", "h4", "p", "li", "blockquote", "pre", "td"]
+
+
+def _strip_boilerplate(soup):
+    for tag in soup.find_all(BOILERPLATE_TAGS):
+        tag.decompose()
+    for tag in soup.find_all(attrs={"role": ["navigation", "banner", "contentinfo", "complementary"]}):
+        tag.decompose()
+    for tag in soup.find_all(True):
+        if tag.decomposed or tag.name in ("html", "body", "article", "main"):
+            continue
+        hints = " ".join(tag.get("class", [])) + " " + (tag.get("id") or "")
+        if not hints.strip() or not BOILERPLATE_HINTS.search(hints):
+            continue
+        # Wrappers like "article-with-share-bar" still hold the body, only drop small blocks
+        if tag.find("article") or len(tag.find_all("p")) > 3:
+            continue
+        tag.decompose()
+
+
+def _main_container(soup):
+    """Pick the element holding the article body: <article>/<main> if present, else the densest text block"""
+    candidates = soup.find_all("article") or soup.find_all("main") or soup.find_all(attrs={"role": "main"})
+    if candidates:
+        return max(candidates, key=lambda tag: len(tag.get_text(" ", strip=True)))
+    best, best_score = soup.body or soup, 0
+    for tag in soup.find_all(["div", "section"]):
+        paragraphs = tag.find_all("p", recursive=False)
+        score = sum(len(p.get_text(" ", strip=True)) for p in paragraphs)
+        if score > best_score:
+            best, best_score = tag, score
+    return best
+
+
+def extract_main_text(html):
+    """
+    Extract the readable article body from a page, dropping navigation, footers, scripts and other boilerplate
+
+    Returns:
+        str: Article text, one block (heading, paragraph, list item) per line
+    """
+    soup = BeautifulSoup(html, 'lxml')
+    title = soup.title.get_text(strip=True) if soup.title else ""
+    _strip_boilerplate(soup)
+    container = _main_container(soup)
+    lines, seen = [], set()
+    if title:
+        lines.append(title)
+        seen.add(title)
+    for block in container.find_all(BLOCK_TAGS):
+        # Nested blocks (a <p> inside an <li>) are covered by their innermost element
+        if block.find(BLOCK_TAGS):
+            continue
+        text = block.get_text(" ", strip=True)
+        if text and text not in seen:
+            seen.add(text)
+            lines.append(text)
+    if len(lines) <= 1:
+        # Pages without semantic blocks, fall back to every text node of the container
+        return container.get_text(separator='\n', strip=True)
+    return "\n".join(lines)
+
+
+def fetch_limited(url, max_bytes=ARTICLE_MAX_DOWNLOAD_BYTES, headers=None):
+    """
+    Stream a page and stop reading after max_bytes
+
+    Only the download is bounded: the capped body is still collected in memory and parsed in one go by
+    extract_main_text, BeautifulSoup has no incremental parser.
+
+    Returns:
+        tuple: (status_code, response headers, body bytes)
+    """
+    with http_client.stream("GET", url, headers=headers or {}) as response:
+        if response.status_code == 304:
+            return response.status_code, response.headers, b""
+        response.raise_for_status()
+        chunks, size = [], 0
+        for chunk in response.iter_bytes():
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= max_bytes:
+                print(f"Article {url} truncated at {max_bytes} bytes")
+                break
+        return response.status_code, response.headers, b"".join(chunks)[:max_bytes]
+
+
+class ArticleCache:
+    """
+    Disk cache of extracted article text keyed by normalized url.
+
+    Each entry is a JSON file with the text plus the ETag/Last-Modified validators of the page. Entries are
+    served straight from disk for ARTICLE_CACHE_TTL seconds. Older entries are revalidated with a conditional
+    GET, a 304 answer reuses the stored text for another TTL, entries without validators are fetched again.
+    The total cache size is capped, least recently used entries are evicted first (file mtime is bumped on
+    every hit).
+    """
+
+    def __init__(self, cache_dir=ARTICLE_CACHE_DIR, max_bytes=ARTICLE_CACHE_MAX_BYTES, ttl=ARTICLE_CACHE_TTL):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, url):
+        key = hashlib.sha256(normalize_url(url).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _load(self, path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _store(self, path, entry):
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.cache_dir):
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+            total = sum(size for _, size, _ in entries)
+            for _, size, name in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    def get_text(self, url):
+        """
+        Return the main article text for url, from cache when the page has not changed
+
+        Returns:
+            str: Extracted article text
+        """
+        path = self._path(url)
+        entry = self._load(path)
+        headers = {}
+        if entry:
+            if time.time() - entry.get("fetched_at", 0) < self.ttl:
+                os.utime(path)
+                return entry["text"]
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        status_code, response_headers, body = fetch_limited(url, headers=headers)
+        if status_code == 304 and entry:
+            # Still current, trusted for another TTL
+            self._store(path, dict(entry, fetched_at=time.time()))
+            return entry["text"]
+        text = extract_main_text(body)
+        self._store(path, {
+            "url": url,
+            "text": text,
+            "etag": response_headers.get("ETag"),
+            "last_modified": response_headers.get("Last-Modified"),
+            "fetched_at": time.time(),
+        })
+        return text
+
+
+article_cache = ArticleCache()
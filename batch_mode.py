@@ -0,0 +1,170 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from watchreq_script import get_gmail_service, get_label_id, get_message_html, list_label_message_ids, get_text_content, LABEL_NAME
+from newsletter_parser import parse_newsletter, NewsletterParseError
+from my_crew import kickoff_linkedin_post
+from linkedin_post import markdown_to_linkedin_unicode, upload_image_asset, create_post
+from dedup_store import dedup_store, MESSAGE, ARTICLE, CONTENT
+from image_io import download_image, remove_file
+from image_prep import prepare_and_upload
+from post_schedule import post_schedule
+from crew_runner import CREW_POOL_SIZE
+from job_queue import current_job_id
+from dotenv import load_dotenv
+
+load_dotenv()
+
+linkedin_access_token = os.getenv("LINKEDIN_ACCESS_TOKEN")
+linkedin_owner_urn = os.getenv("LINKEDIN_OWNER_URN")
+
+BATCH_MAX_MESSAGES = int(os.getenv("BATCH_MAX_MESSAGES", "20"))
+BATCH_FETCH_CONCURRENCY = int(os.getenv("BATCH_FETCH_CONCURRENCY", "8"))
+
+
+def _collect_stories(service, message_ids, owner=None):
+    """
+    Parse every message once and claim each story's article url, returns [(message_id, story)]
+
+    If a message cannot be fetched, every claim taken by this call is released before the error propagates.
+    """
+    stories, claimed_messages = [], []
+    # Claims of one owner can be taken again by the same owner, repeats within this batch are skipped here
+    seen_links = set()
+    try:
+        for message_id in message_ids:
+            if not dedup_store.claim(MESSAGE, message_id, owner):
+                continue
+            claimed_messages.append(message_id)
+            try:
+                newsletter = parse_newsletter(get_message_html(service, message_id))
+            except NewsletterParseError as e:
+                print(f"----------- Skipping message {message_id}: {e}")
+                dedup_store.complete(MESSAGE, message_id)
+                claimed_messages.remove(message_id)
+                continue
+            claimed = text_only = 0
+            for story in newsletter.stories():
+                if story.link in seen_links:
+                    continue
+                seen_links.add(story.link)
+                if dedup_store.claim(ARTICLE, story.link, owner):
+                    stories.append((message_id, story))
+                    claimed += 1
+                    # Published as a text-only post
+                    text_only += not story.img_src
+            print(f"----------- Message {message_id}: {claimed} new stories, {text_only} without an image ({newsletter.rule})")
+            if not claimed:
+                dedup_store.complete(MESSAGE, message_id)
+                claimed_messages.remove(message_id)
+    except Exception:
+        for _, story in stories:
+            dedup_store.release(ARTICLE, story.link, owner)
+        for message_id in claimed_messages:
+            dedup_store.release(MESSAGE, message_id, owner)
+        raise
+    return stories
+
+
+def _generate(story, text_content, owner=None):
+    if not dedup_store.claim(CONTENT, text_content, owner):
+        return None
+    try:
+        post_text = markdown_to_linkedin_unicode(kickoff_linkedin_post(content=text_content, link=story.link))
+    except Exception:
+        dedup_store.release(CONTENT, text_content, owner)
+        raise
+    return post_text
+
+
+def run_batch(request):
+    """
+    Turn every story of a set of newsletters into scheduled posts.
+
+    Articles are fetched with BATCH_FETCH_CONCURRENCY parallel requests, generations run in parallel up to
+    the crew pool size, and the results are stored in the posting schedule for the DripScheduler to publish.
+
+    Args:
+        request (dict): {"message_ids": [...]} to process given emails, or {"backlog": true} to process every
+            unprocessed email under the label (at most BATCH_MAX_MESSAGES)
+
+    Returns:
+        dict: Counts of scheduled (of which text-only), duplicate and failed stories
+    """
+    service = get_gmail_service()
+    label_id = get_label_id(service, LABEL_NAME)
+    message_ids = request.get("message_ids") or []
+    if request.get("backlog"):
+        message_ids += [message_id for message_id in list_label_message_ids(service, label_id, BATCH_MAX_MESSAGES)
+                        if not dedup_store.is_processed(MESSAGE, message_id)]
+    # A resumed batch job takes over the claims its earlier run left pending
+    owner = current_job_id()
+    stories = _collect_stories(service, message_ids[:BATCH_MAX_MESSAGES], owner)
+    print(f"----------- Batch: {len(stories)} stories from {len(message_ids)} messages")
+
+    summary = {"scheduled": 0, "text_only": 0, "duplicates": 0, "failed": 0}
+    failed_messages = set()
+    with ThreadPoolExecutor(max_workers=BATCH_FETCH_CONCURRENCY, thread_name_prefix="batch-fetch") as fetchers, \
+            ThreadPoolExecutor(max_workers=CREW_POOL_SIZE, thread_name_prefix="batch-generate") as generators:
+        fetches = [(message_id, story, fetchers.submit(get_text_content, story.link)) for message_id, story in stories]
+        generations = []
+        # Generation for a story starts as soon as its article is fetched, in fetch order
+        for message_id, story, fetch in fetches:
+            try:
+                text_content = fetch.result()
+            except Exception as e:
+                print(f"----------- Fetching {story.link} failed: {e}")
+                dedup_store.release(ARTICLE, story.link, owner)
+                failed_messages.add(message_id)
+                summary["failed"] += 1
+                continue
+            generations.append((message_id, story, text_content,
+                                generators.submit(_generate, story, text_content, owner and f"{owner}:{story.link}")))
+
+        for message_id, story, text_content, generation in generations:
+            try:
+                post_text = generation.result()
+            except Exception as e:
+                print(f"----------- Generating a post for {story.link} failed: {e}")
+                dedup_store.release(ARTICLE, story.link, owner)
+                failed_messages.add(message_id)
+                summary["failed"] += 1
+                continue
+            if post_text is None:
+                summary["duplicates"] += 1
+            else:
+                post_schedule.add(story.link, story.title, story.img_src, post_text)
+                # Only once scheduled, the same text under another url must stay a duplicate for good
+                dedup_store.complete(CONTENT, text_content)
+                summary["scheduled"] += 1
+                summary["text_only"] += not story.img_src
+            dedup_store.complete(ARTICLE, story.link)
+
+    for message_id in {message_id for message_id, _ in stories}:
+        if message_id in failed_messages:
+            dedup_store.release(MESSAGE, message_id, owner)
+        else:
+            dedup_store.complete(MESSAGE, message_id)
+    print(f"----------- Batch done: {summary}")
+    return summary
+
+
+def publish_scheduled_post(row):
+    """Publish one row of the posting schedule, used by the DripScheduler"""
+    image_paths = []
+    asset_urn = None
+    try:
+        # Stories without an image go out as text-only posts
+        if row["img_src"]:
+            image_paths.append(download_image(row["img_src"]))
+            asset_urn, normalized_path = prepare_and_upload(
+                image_paths[0], linkedin_owner_urn, lambda path: upload_image_asset(linkedin_access_token, path, linkedin_owner_urn))
+            image_paths.append(normalized_path)
+            if not asset_urn:
+                raise RuntimeError("Uploading the image to LinkedIn failed")
+        response = create_post(linkedin_access_token, asset_urn, row["post_text"], "LinkedIn Post", "Posted via linkedin", linkedin_owner_urn)
+        if not response:
+            raise RuntimeError("Posting to LinkedIn failed")
+        return response
+    finally:
+        for image_path in image_paths:
+            remove_file(image_path)
@@ -0,0 +1,101 @@
+"""
+Micro-benchmark of the LinkedIn formatter against the previous markdown_to_linkedin_unicode implementation.
+
+Run from the repository root:
+    python benchmarks/bench_formatter.py [--repeat N]
+"""
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from linkedin_formatter import format_post, format_stream
+
+SAMPLE_POST = (
+    "<think>The user wants a LinkedIn post about a model release. Keep it short.</think>\n"
+    "**Woow crazy!** Have you seen the *latest* open model drop? \U0001F680\n\n"
+    "I have been exploring **Qwen3 32B** this week and here is what stood out:\n"
+    "* **Reasoning**: hybrid *thinking* mode on demand\n"
+    "* **Speed**: 2x faster decoding on the same GPUs\n"
+    "* **Context**: 128K tokens with *no* quality cliff\n"
+    "* **License**: Apache 2.0, ready for products\n"
+    "* Tool calling works *out of the box*\n\n"
+    "Would you swap your current model for it? Let me know below!\n\n"
+    "https://example.com/qwen3-release\n\n"
+    "#ai #llm #opensource #machinelearning #genai"
+)
+
+
+def legacy_markdown_to_linkedin_unicode(text):
+    """
+    Convert markdown-style formatting to LinkedIn-compatible Unicode characters
+    """
+    
+    # Unicode character mappings for bold sans-serif
+    bold_map = {
+        'A': '𝗔', 'B': '𝗕', 'C': '𝗖', 'D': '𝗗', 'E': '𝗘', 'F': '𝗙', 'G': '𝗚', 'H': '𝗛', 'I': '𝗜', 'J': '𝗝',
+        'K': '𝗞', 'L': '𝗟', 'M': '𝗠', 'N': '𝗡', 'O': '𝗢', 'P': '𝗣', 'Q': '𝗤', 'R': '𝗥', 'S': '𝗦', 'T': '𝗧',
+        'U': '𝗨', 'V': '𝗩', 'W': '𝗪', 'X': '𝗫', 'Y': '𝗬', 'Z': '𝗭',
+        'a': '𝗮', 'b': '𝗯', 'c': '𝗰', 'd': '𝗱', 'e': '𝗲', 'f': '𝗳', 'g': '𝗴', 'h': '𝗵', 'i': '𝗶', 'j': '𝗷',
+        'k': '𝗸', 'l': '𝗹', 'm': '𝗺', 'n': '𝗻', 'o': '𝗼', 'p': '𝗽', 'q': '𝗾', 'r': '𝗿', 's': '𝘀', 't': '𝘁',
+        'u': '𝘂', 'v': '𝘃', 'w': '𝘄', 'x': '𝘅', 'y': '𝘆', 'z': '𝘇',
+        '0': '𝟬', '1': '𝟭', '2': '𝟮', '3': '𝟯', '4': '𝟰', '5': '𝟱', '6': '𝟲', '7': '𝟳', '8': '𝟴', '9': '𝟵'
+    }
+    
+    # Unicode character mappings for italic sans-serif  
+    italic_map = {
+        'A': '𝘈', 'B': '𝘉', 'C': '𝘊', 'D': '𝘋', 'E': '𝘌', 'F': '𝘍', 'G': '𝘎', 'H': '𝘏', 'I': '𝘐', 'J': '𝘑',
+        'K': '𝘒', 'L': '𝘓', 'M': '𝘔', 'N': '𝘕', 'O': '𝘖', 'P': '𝘗', 'Q': '𝘘', 'R': '𝘙', 'S': '𝘚', 'T': '𝘛',
+        'U': '𝘜', 'V': '𝘝', 'W': '𝘞', 'X': '𝘟', 'Y': '𝘠', 'Z': '𝘡',
+        'a': '𝘢', 'b': '𝘣', 'c': '𝘤', 'd': '𝘥', 'e': '𝘦', 'f': '𝘧', 'g': '𝘨', 'h': '𝘩', 'i': '𝘪', 'j': '𝘫',
+        'k': '𝘬', 'l': '𝘭', 'm': '𝘮', 'n': '𝘯', 'o': '𝘰', 'p': '𝘱', 'q': '𝘲', 'r': '𝘳', 's': '𝘴', 't': '𝘵',
+        'u': '𝘶', 'v': '𝘷', 'w': '𝘸', 'x': '𝘹', 'y': '𝘺', 'z': '𝘻'
+    }
+    
+    def convert_to_bold(match):
+        text_inside = match.group(1)
+        return ''.join(bold_map.get(char, char) for char in text_inside)
+    
+    def convert_to_italic(match):
+        text_inside = match.group(1) 
+        return ''.join(italic_map.get(char, char) for char in text_inside)
+    
+    # Convert **bold** to Unicode bold
+    if "<think>" in text:
+        text = text.split("</think>")[-1]
+        
+    text = re.sub(r'\*\*(.*?)\*\*', convert_to_bold, text)
+    
+    # Convert *italic* to Unicode italic 
+    text = re.sub(r'(?<!\*)\*([^*]+?)\*(?!\*)', convert_to_italic, text)
+    
+    # Convert bullet points
+    text = re.sub(r'^\* ', '• ', text, flags=re.MULTILINE)
+    text = re.sub(r'\n\* ', '\n• ', text)
+    
+    # Handle line breaks
+    text = text.replace('\\n', '\n')
+    
+    return text
+
+
+def run(repeat):
+    long_post = SAMPLE_POST + "\n" + "\n".join([SAMPLE_POST.split("</think>")[-1]] * 19)
+    # Outputs are not compared: the legacy italic pass runs before bullet conversion and mangles "* " bullets
+    for name, text in (("short post", SAMPLE_POST), ("20x post", long_post)):
+        legacy = min(timeit.repeat(lambda: legacy_markdown_to_linkedin_unicode(text), number=repeat, repeat=5)) / repeat
+        current = min(timeit.repeat(lambda: format_post(text), number=repeat, repeat=5)) / repeat
+        chunks = [text[i:i + 8] for i in range(0, len(text), 8)]
+        streamed = min(timeit.repeat(lambda: "".join(format_stream(chunks)), number=repeat, repeat=5)) / repeat
+        print(f"{name:<11} legacy {legacy * 1e6:9.1f} us   format_post {current * 1e6:9.1f} us   "
+              f"speedup {legacy / current:5.2f}x   format_stream (8 char chunks) {streamed * 1e6:9.1f} us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+    run(args.repeat)
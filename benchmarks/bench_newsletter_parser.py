@@ -0,0 +1,93 @@
+"""
+Benchmark of the lxml newsletter parser against the previous BeautifulSoup based get_top_news_data,
+over the saved newsletter HTML in benchmarks/fixtures/newsletters.
+
+Run from the repository root:
+    python benchmarks/bench_newsletter_parser.py [--repeat N] [--scale ROWS]
+
+--scale appends ROWS filler table rows to every fixture to mimic large marketing emails. Fixtures no rule
+matches (other newsletter layouts) are timed too, the legacy parser must not find a Top News story in them either.
+"""
+import argparse
+import glob
+import os
+import sys
+import timeit
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bs4 import BeautifulSoup
+from newsletter_parser import get_top_story, NewsletterParseError
+
+FIXTURES = os.path.join(ROOT, "benchmarks", "fixtures", "newsletters", "*.html")
+FILLER_ROW = ('<tr><td style="padding:0 20px"><p>Filler paragraph {i} with <b>some</b> markup and an '
+              '<img src="https://cdn.example.com/pixel-{i}.gif" width="1"> tracking pixel.</p></td></tr>\n')
+
+
+def legacy_get_top_news_data(mail_html_content):
+    title, content_page_link, img_src = None, None, None
+    soup = BeautifulSoup(mail_html_content, 'lxml')
+    top_news_strong = soup.find('strong', string="Top News")
+    top_news_tr = top_news_strong.find_parent("tr") if top_news_strong else None
+    next_tr = top_news_tr.find_next_sibling() if top_news_tr else None
+    a_tag = next_tr.find('a') if next_tr else None
+    if a_tag:
+        content_page_link = a_tag.get('href')
+        title = a_tag.get_text(strip=True)
+    img_list = soup.find_all('img')
+    img_src = img_list[1].get('src') if len(img_list) > 1 else None
+    return title, content_page_link, img_src
+
+
+def lxml_get_top_news_data(mail_html_content):
+    try:
+        story = get_top_story(mail_html_content)
+    except NewsletterParseError:
+        return None
+    return story.title, story.link, story.img_src
+
+
+def inflate(html, rows):
+    if not rows:
+        return html
+    filler = "".join(FILLER_ROW.format(i=i) for i in range(rows))
+    index = html.rfind("</table>")
+    return html[:index] + filler + html[index:]
+
+
+def peak_memory(fn, html):
+    tracemalloc.start()
+    fn(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def run(repeat, scale):
+    paths = sorted(glob.glob(FIXTURES))
+    if not paths:
+        sys.exit(f"No fixtures found in {FIXTURES}")
+    print(f"{'fixture':<32} {'size':>9} {'bs4':>10} {'lxml':>10} {'speedup':>8} {'bs4 peak':>10} {'lxml peak':>10} {'match':>6}")
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            html = inflate(f.read(), scale)
+        expected, parsed = legacy_get_top_news_data(html), lxml_get_top_news_data(html)
+        if parsed is None:
+            assert expected[0] is None, f"no rule matches {path} but the legacy parser found {expected}"
+        else:
+            assert expected == parsed, f"parsers disagree on {path}"
+        legacy = min(timeit.repeat(lambda: legacy_get_top_news_data(html), number=repeat, repeat=3)) / repeat
+        current = min(timeit.repeat(lambda: lxml_get_top_news_data(html), number=repeat, repeat=3)) / repeat
+        print(f"{os.path.basename(path):<32} {len(html):>8}B {legacy * 1e3:>8.2f}ms {current * 1e3:>8.2f}ms "
+              f"{legacy / current:>7.1f}x {peak_memory(legacy_get_top_news_data, html) / 1024:>8.0f}KB "
+              f"{peak_memory(lxml_get_top_news_data, html) / 1024:>8.0f}KB {'yes' if parsed else 'no':>6}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--scale", type=int, default=0)
+    args = parser.parse_args()
+    run(args.repeat, args.scale)
@@ -0,0 +1,345 @@
+"""
+Offline end-to-end benchmark of the webhook pipeline.
+
+Starts local fakes for Gmail, Perplexity, Groq, the article/image host and LinkedIn (see benchmarks/fakes.py),
+runs app.py under uvicorn against them in a scratch directory, sends synthetic Pub/Sub pushes to /mail_payload
+and reports job latency, throughput and per-stage latency percentiles and peak RSS.
+Results are written as JSON to benchmarks/results so runs can be compared.
+
+Run from the repository root:
+    python benchmarks/bench_pipeline.py [--pushes N] [--concurrency C] [--latency SERVICE=SECONDS ...]
+                                        [--failure-rate SERVICE=RATE ...] [--compare results/previous.json]
+
+SERVICE is one of gmail, perplexity, groq, fallback, web, linkedin. With --llm-fallback the crew's LLM calls are
+hedged and failed over from groq to the fallback fake, e.g. --llm-fallback --latency groq=8 --failure-rate groq=0.2.
+"""
+import argparse
+import base64
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import httpx
+from prometheus_client.parser import text_string_to_metric_families
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from fakes import FakeWeb, FakeGmail, FakeLinkedIn, fake_perplexity, fake_groq
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+SERVICES = ("gmail", "perplexity", "groq", "fallback", "web", "linkedin")
+EMAIL_ADDRESS = "bench@example.com"
+
+
+def percentiles(values):
+    if not values:
+        return None
+    values = sorted(values)
+
+    def pick(q):
+        return round(values[min(len(values) - 1, int(q * len(values)))], 4)
+
+    return {"count": len(values), "p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": round(values[-1], 4)}
+
+
+def pubsub_push(history_id, n):
+    """Push request body in the shape Pub/Sub sends for a Gmail watch notification"""
+    data = json.dumps({"emailAddress": EMAIL_ADDRESS, "historyId": history_id}).encode("utf-8")
+    return {"message": {"data": base64.b64encode(data).decode("ascii"), "messageId": str(9000000 + n),
+                        "publishTime": datetime.utcnow().isoformat() + "Z"},
+            "subscription": "projects/bench/subscriptions/gmail-push"}
+
+
+class RSSSampler(threading.Thread):
+    """Samples a process's resident set size (Linux /proc) every interval seconds"""
+
+    def __init__(self, pid, interval=0.05):
+        super().__init__(name="rss-sampler", daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                with open(f"/proc/{self.pid}/status") as f:
+                    rss = next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+            except (OSError, StopIteration):
+                return
+            self.samples.append((time.time(), rss * 1024))
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def peak(self, start=None, end=None):
+        values = [rss for at, rss in self.samples if (start is None or at >= start) and (end is None or at <= end)]
+        return max(values) if values else None
+
+
+def start_fakes(latency, failure_rate):
+    def options(service):
+        return {"latency": latency.get(service, 0.0), "jitter": latency.get(service, 0.0) / 2,
+                "failure_rate": failure_rate.get(service, 0.0)}
+
+    web = FakeWeb(**options("web")).start()
+    return {
+        "web": web,
+        "gmail": FakeGmail(web.url, **options("gmail")).start(),
+        "perplexity": fake_perplexity(**options("perplexity")).start(),
+        "groq": fake_groq(**options("groq")).start(),
+        # Second OpenAI-compatible provider, only routed to with --llm-fallback
+        "fallback": fake_groq(**options("fallback")).start(),
+        "linkedin": FakeLinkedIn(**options("linkedin")).start(),
+    }
+
+
+def app_environment(fakes, workdir, workers, llm_fallback=False):
+    token_file = os.path.join(workdir, "token.json")
+    with open(token_file, "w") as f:
+        json.dump({"token": "bench", "refresh_token": "bench", "client_id": "bench", "client_secret": "bench",
+                   "token_uri": "http://127.0.0.1:9/token", "expiry": "2999-01-01T00:00:00Z"}, f)
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": ROOT + os.pathsep + env.get("PYTHONPATH", ""),
+        "GMAIL_SCOPE": "https://www.googleapis.com/auth/gmail.readonly",
+        "GMAIL_TOKEN_FILE": token_file,
+        "GMAIL_API_ENDPOINT": fakes["gmail"].url + "/",
+        "GMAIL_WATCH_RENEWAL": "false",
+        "TARGET_LABEL_NAME": fakes["gmail"].label_name,
+        "PERPLEXITY_BASE_URL": fakes["perplexity"].url,
+        "PERPLEXITY_API_KEY": "bench",
+        "GROQ_BASE_URL": fakes["groq"].url + "/openai/v1",
+        "GROQ_API_KEY": "bench",
+        "LLM_PROVIDERS": "groq,fallback" if llm_fallback else "groq",
+        "LLM_FALLBACK_BASE_URL": fakes["fallback"].url + "/openai/v1",
+        "LLM_FALLBACK_API_KEY": "bench",
+        "LINKEDIN_API_BASE": fakes["linkedin"].url + "/v2",
+        "LINKEDIN_ACCESS_TOKEN": "bench",
+        "LINKEDIN_OWNER_URN": "urn:li:person:bench",
+        "WORKER_CONCURRENCY": str(workers),
+        "JOB_QUEUE_SIZE": "10000",
+        "POST_DRIP_ENABLED": "false",
+        "HTTP2_ENABLED": "false",
+        # Keep the run offline
+        "CREWAI_DISABLE_TELEMETRY": "true",
+        "OTEL_SDK_DISABLED": "true",
+        "OTEL_EXPORTER_OTLP_ENDPOINT": "",
+    })
+    # Start the incremental sync at the current mailbox state, so every push finds exactly the messages delivered for it
+    with open(os.path.join(workdir, "history_state.json"), "w") as f:
+        json.dump({"historyId": str(fakes["gmail"].history_id)}, f)
+    return env
+
+
+def wait_until_up(base_url, process, timeout=120):
+    started = time.monotonic()
+    while time.monotonic() - started < timeout:
+        if process.poll() is not None:
+            sys.exit(f"app exited with code {process.returncode} during startup, see its log")
+        try:
+            # Wait for the warmup too, so import and crew construction time is not counted against the first jobs
+            if httpx.get(base_url + "/ready", timeout=1).status_code == 200:
+                return time.monotonic() - started
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    sys.exit("app did not come up in time")
+
+
+def send_pushes(base_url, gmail, pushes, concurrency):
+    """Deliver one newsletter per push and post the matching notification, returns [(job_id, sent_at)]"""
+    client = httpx.Client(timeout=30)
+
+    def push(n):
+        history_id = gmail.deliver()
+        body = pubsub_push(history_id, n)
+        while True:
+            sent_at = time.time()
+            response = client.post(base_url + "/mail_payload", json=body)
+            if response.status_code != 503:
+                response.raise_for_status()
+                return response.json()["job_id"], sent_at
+            # Like Pub/Sub, redeliver after the backoff the webhook asked for
+            time.sleep(min(float(response.headers.get("Retry-After", "1")), 1.0))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        jobs = list(executor.map(push, range(pushes)))
+    client.close()
+    return jobs
+
+
+def wait_for_jobs(base_url, jobs, timeout):
+    client = httpx.Client(timeout=10)
+    pending, finished = dict(jobs), {}
+    deadline = time.monotonic() + timeout
+    while pending and time.monotonic() < deadline:
+        for job_id in list(pending):
+            job = client.get(f"{base_url}/jobs/{job_id}").json()
+            if job.get("status") in ("succeeded", "failed"):
+                finished[job_id] = dict(job, sent_at=pending.pop(job_id))
+        time.sleep(0.2)
+    client.close()
+    return finished, list(pending)
+
+
+def stage_means(base_url):
+    """Mean stage durations from /metrics, this also covers the Gmail steps that run outside the stage graph"""
+    text = httpx.get(base_url + "/metrics", timeout=10).text
+    sums, counts = {}, {}
+    for family in text_string_to_metric_families(text):
+        if family.name != "pipeline_stage_seconds":
+            continue
+        for sample in family.samples:
+            stage = sample.labels.get("stage")
+            if sample.name.endswith("_sum"):
+                sums[stage] = sample.value
+            elif sample.name.endswith("_count"):
+                counts[stage] = sample.value
+    return {stage: round(sums[stage] / counts[stage], 4) for stage in sums if counts.get(stage)}
+
+
+def llm_routing(base_url):
+    """Routed LLM calls per provider and outcome, and the hedges and failovers sent, from /metrics"""
+    text = httpx.get(base_url + "/metrics", timeout=10).text
+    routing = {}
+    for family in text_string_to_metric_families(text):
+        if family.name not in ("llm_router_attempts", "llm_router_routes"):
+            continue
+        for sample in family.samples:
+            if sample.name.endswith("_total"):
+                labels = sample.labels
+                key = f"{labels['provider']}:{labels.get('outcome') or labels.get('reason')}"
+                routing[key] = int(sample.value)
+    return routing
+
+
+def summarize(jobs, sampler, elapsed, posted):
+    job_latency, queue_wait, stage_durations, stage_peaks = [], [], {}, {}
+    for job in jobs.values():
+        job_latency.append(job["finished_at"] - job["sent_at"])
+        if job.get("started_at"):
+            queue_wait.append(job["started_at"] - job["created_at"])
+        for summary in (job.get("result") or {}).values():
+            timings = summary.get("timings") or {}
+            started_at = timings.get("total", {}).get("started_at")
+            for stage, timing in timings.items():
+                stage_durations.setdefault(stage, []).append(timing["duration"])
+                if started_at is not None:
+                    peak = sampler.peak(started_at + timing["start"], started_at + timing["end"] + sampler.interval)
+                    if peak is not None:
+                        stage_peaks[stage] = max(stage_peaks.get(stage, 0), peak)
+    return {
+        "jobs": len(jobs),
+        "failed_jobs": sum(1 for job in jobs.values() if job["status"] == "failed"),
+        "posts": posted,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_posts_per_second": round(posted / elapsed, 4) if elapsed else None,
+        "job_latency": percentiles(job_latency),
+        "queue_wait": percentiles(queue_wait),
+        "stages": {stage: dict(percentiles(values), peak_rss_bytes=stage_peaks.get(stage))
+                   for stage, values in stage_durations.items()},
+        "peak_rss_bytes": sampler.peak(),
+    }
+
+
+def print_report(result, previous=None):
+    summary = result["summary"]
+    print(f"\n{summary['jobs']} jobs ({summary['failed_jobs']} failed), {summary['posts']} posts in {summary['elapsed_seconds']}s "
+          f"-> {summary['throughput_posts_per_second']} posts/s, peak RSS {(summary['peak_rss_bytes'] or 0) / 2 ** 20:.1f}MB")
+    rows = [("job", summary["job_latency"]), ("queue_wait", summary["queue_wait"])] + sorted(summary["stages"].items())
+    before = {}
+    if previous:
+        before = dict([("job", previous["summary"]["job_latency"]), ("queue_wait", previous["summary"]["queue_wait"])]
+                      + list(previous["summary"]["stages"].items()))
+    print(f"{'stage':<12} {'count':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'peak RSS':>10}" + (f" {'p95 vs prev':>12}" if previous else ""))
+    for name, stats in rows:
+        if not stats:
+            continue
+        rss = f"{stats['peak_rss_bytes'] / 2 ** 20:.1f}MB" if stats.get("peak_rss_bytes") else "-"
+        line = f"{name:<12} {stats['count']:>6} {stats['p50']:>8.3f}s {stats['p95']:>8.3f}s {stats['p99']:>8.3f}s {rss:>10}"
+        if previous and before.get(name):
+            line += f" {(stats['p95'] / before[name]['p95'] - 1) * 100 if before[name]['p95'] else 0:>+11.1f}%"
+        print(line)
+    if result.get("llm_routing"):
+        print("LLM routing: " + ", ".join(f"{key}={count}" for key, count in sorted(result["llm_routing"].items())))
+
+
+def run(args):
+    latency = {service: float(value) for service, value in (item.split("=") for item in args.latency)}
+    failure_rate = {service: float(value) for service, value in (item.split("=") for item in args.failure_rate)}
+    for service in list(latency) + list(failure_rate):
+        if service not in SERVICES:
+            sys.exit(f"Unknown service '{service}', expected one of {SERVICES}")
+
+    fakes = start_fakes(latency, failure_rate)
+    workdir = tempfile.mkdtemp(prefix="bench-pipeline-")
+    base_url = f"http://127.0.0.1:{args.port}"
+    log_path = os.path.join(workdir, "app.log")
+    with open(log_path, "w") as log:
+        process = subprocess.Popen([sys.executable, "-m", "uvicorn", "app:app", "--port", str(args.port), "--log-level", "warning"],
+                                   cwd=workdir, env=app_environment(fakes, workdir, args.workers, args.llm_fallback), stdout=log, stderr=subprocess.STDOUT)
+    sampler = RSSSampler(process.pid)
+    sampler.start()
+    try:
+        startup = wait_until_up(base_url, process)
+        started = time.time()
+        jobs = send_pushes(base_url, fakes["gmail"], args.pushes, args.concurrency)
+        finished, unfinished = wait_for_jobs(base_url, jobs, args.timeout)
+        elapsed = max((job["finished_at"] for job in finished.values()), default=time.time()) - started
+        means = stage_means(base_url)
+        routing = llm_routing(base_url)
+    finally:
+        process.terminate()
+        process.wait(10)
+        sampler.stop()
+        for fake in fakes.values():
+            fake.stop()
+
+    result = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {"pushes": args.pushes, "concurrency": args.concurrency, "workers": args.workers,
+                   "latency": latency, "failure_rate": failure_rate, "llm_fallback": args.llm_fallback},
+        "startup_seconds": round(startup, 3),
+        "unfinished_jobs": unfinished,
+        "summary": summarize(finished, sampler, elapsed, len(fakes["linkedin"].posts)),
+        "stage_means": means,
+        "llm_routing": routing,
+        "fakes": {name: fake.stats() for name, fake in fakes.items()},
+        "app_log": log_path,
+    }
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    out = args.out or os.path.join(RESULTS_DIR, f"pipeline-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(out, "w") as f:
+        json.dump(result, f, indent=2)
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    print_report(result, previous)
+    print(f"\nResults written to {out}, app log in {log_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pushes", type=int, default=50, help="Synthetic Pub/Sub pushes, one new newsletter each")
+    parser.add_argument("--concurrency", type=int, default=10, help="Pushes in flight at once")
+    parser.add_argument("--workers", type=int, default=2, help="WORKER_CONCURRENCY of the app")
+    parser.add_argument("--latency", nargs="*", default=[], metavar="SERVICE=SECONDS")
+    parser.add_argument("--failure-rate", nargs="*", default=[], metavar="SERVICE=RATE")
+    parser.add_argument("--llm-fallback", action="store_true", help="Route LLM calls to groq, then the fallback fake")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds to wait for all jobs")
+    parser.add_argument("--out", help="Result file, defaults to benchmarks/results/pipeline-<timestamp>.json")
+    parser.add_argument("--compare", help="Earlier result file to compare p95 latencies against")
+    run(parser.parse_args())
@@ -0,0 +1,348 @@
+"""
+Local stand-ins for the services the pipeline talks to, used by benchmarks/bench_pipeline.py.
+
+Every fake is a threaded HTTP server on 127.0.0.1 with configurable latency (fixed + uniform jitter) and
+failure injection (a share of requests answered with failure_status and Retry-After: 0). Only the
+endpoints and response fields the pipeline actually reads are implemented.
+
+    web = FakeWeb().start()
+    gmail = FakeGmail(web.url, latency=0.05).start()
+    history_id = gmail.deliver()
+    ...
+    gmail.stop()
+"""
+import base64
+import json
+import random
+import re
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+POST_TEXT = ("Ever wondered how small labs keep up with frontier models? \U0001F914\n\n"
+             "I came across this today and it is a big one:\n\n"
+             "- **Open weights** with a permissive license\n"
+             "- *Hybrid thinking* mode you can switch off\n"
+             "- 128K context window\n"
+             "- Beats larger closed models on math\n\n"
+             "Would you try it in production? \U0001F447\n\n{link}\n\n"
+             "#ai #llm #opensource #machinelearning #reasoning")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _dispatch(self):
+        fake = self.server.fake
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        parts = urlsplit(self.path)
+        fake.requests += 1
+        fake.delay()
+        if fake.failure_rate and random.random() < fake.failure_rate:
+            fake.failures += 1
+            self._send(fake.failure_status, {"error": "injected failure"}, {"Retry-After": "0"})
+            return
+        try:
+            status, payload, headers = fake.handle(self.command, parts.path, parse_qs(parts.query), self.headers, body)
+        except KeyError:
+            status, payload, headers = 404, {"error": {"code": 404, "message": "Not found"}}, {}
+        self._send(status, payload, headers)
+
+    def _send(self, status, payload, headers=None):
+        headers = dict(headers or {})
+        if isinstance(payload, (dict, list)):
+            payload = json.dumps(payload).encode("utf-8")
+            headers.setdefault("Content-Type", "application/json")
+        elif isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        if callable(getattr(payload, "__next__", None)):
+            # Server-sent events, streamed with chunked transfer encoding
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for chunk in payload:
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+            return
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(payload or b"")))
+        self.end_headers()
+        self.wfile.write(payload or b"")
+
+    do_GET = do_POST = do_PUT = do_DELETE = _dispatch
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeService:
+    """
+    Base class of the fakes, subclasses implement handle()
+
+    Args:
+        latency (float): Seconds added to every response
+        jitter (float): Extra uniformly random seconds, up to this value
+        failure_rate (float): Share of requests (0-1) answered with failure_status
+        failure_status (int): Status code of injected failures
+        port (int): Port to bind, 0 picks a free one
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, failure_rate=0.0, failure_status=503, port=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.requests = 0
+        self.failures = 0
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def delay(self):
+        seconds = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if seconds:
+            time.sleep(seconds)
+
+    def stats(self):
+        return {"requests": self.requests, "injected_failures": self.failures}
+
+    def handle(self, method, path, query, headers, body):
+        """Returns: (status, payload, headers), raise KeyError for a 404"""
+        raise NotImplementedError
+
+
+class FakeWeb(FakeService):
+    """Article pages under /articles/<n> and PNG images under /images/<n>.png"""
+
+    def __init__(self, paragraphs=30, image_size=256, **kwargs):
+        super().__init__(**kwargs)
+        self.paragraphs = paragraphs
+        self.image_size = image_size
+
+    def handle(self, method, path, query, headers, body):
+        match = re.fullmatch(r"/articles/(\d+)", path)
+        if match:
+            return 200, self.article(int(match.group(1))), {"Content-Type": "text/html; charset=utf-8"}
+        match = re.fullmatch(r"/images/(\d+)\.png", path)
+        if match:
+            return 200, make_png(int(match.group(1)), self.image_size), {"Content-Type": "image/png"}
+        raise KeyError(path)
+
+    def article(self, n):
+        paragraphs = "".join(
+            f"<p>Story {n}, paragraph {i}: the open-weights model was trained on {i + 1} trillion tokens and "
+            f"evaluated on reasoning, coding and long context benchmarks against larger closed models.</p>"
+            for i in range(self.paragraphs))
+        return (f"<html><head><title>Story {n}</title></head><body><nav><a href='/'>Home</a></nav>"
+                f"<article><h1>Lab releases model {n}</h1>{paragraphs}</article>"
+                f"<footer>Subscribe to our newsletter</footer></body></html>")
+
+
+def make_png(seed, size):
+    """Small RGB PNG with a pattern unique to seed, so perceptual hashes of different seeds differ"""
+    rows = []
+    for y in range(size):
+        row = bytearray(b"\x00")
+        for x in range(size):
+            row += bytes((((x * (seed + 3)) ^ (y * 7)) & 255, ((x + y) * (seed + 1)) & 255, ((x * y) >> 4) & 255))
+        rows.append(bytes(row))
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(b"".join(rows), 6)) + chunk(b"IEND", b""))
+
+
+class FakeGmail(FakeService):
+    """
+    The Gmail API calls the pipeline makes (labels.list, messages.list/get, history.list, watch), for one label.
+    deliver() adds a newsletter whose Top News story points at a FakeWeb article and image.
+    """
+
+    LABEL_ID = "Label_1"
+
+    def __init__(self, web_url, label_name="Alpha Signal", **kwargs):
+        super().__init__(**kwargs)
+        self.web_url = web_url
+        self.label_name = label_name
+        self.history_id = 1000
+        self.messages = []
+        self._by_id = {}
+        self._lock = threading.Lock()
+
+    def deliver(self):
+        """Add one newsletter to the label, returns the historyId to announce in a push notification"""
+        with self._lock:
+            n = len(self.messages) + 1
+            self.history_id += 1
+            message = {"id": f"msg{n:06d}", "n": n, "history_id": self.history_id}
+            self.messages.append(message)
+            self._by_id[message["id"]] = message
+            return self.history_id
+
+    def newsletter(self, n):
+        return (f"<html><body><table><tr><td><img src='{self.web_url}/images/logo.png'></td></tr>"
+                f"<tr><td><strong>Top News</strong></td></tr>"
+                f"<tr><td><a href='{self.web_url}/articles/{n}?utm_source=newsletter'>Lab releases model {n}</a>"
+                f"<p><img src='{self.web_url}/images/{n}.png'></p><p>Summary of story {n}.</p></td></tr>"
+                f"<tr><td><strong>Trending Signals</strong></td></tr>"
+                f"<tr><td><a href='https://example.com/unsubscribe'>Unsubscribe</a></td></tr></table></body></html>")
+
+    def handle(self, method, path, query, headers, body):
+        prefix = "/gmail/v1/users/me"
+        if not path.startswith(prefix):
+            raise KeyError(path)
+        path = path[len(prefix):]
+        if path == "/labels":
+            return 200, {"labels": [{"id": "INBOX", "name": "INBOX"}, {"id": self.LABEL_ID, "name": self.label_name}]}, {}
+        if path == "/watch":
+            return 200, {"historyId": str(self.history_id), "expiration": str(int((time.time() + 7 * 86400) * 1000))}, {}
+        if path == "/messages":
+            limit = int(query.get("maxResults", ["100"])[0])
+            with self._lock:
+                newest = self.messages[::-1][:limit]
+            return 200, {"messages": [{"id": m["id"], "threadId": m["id"]} for m in newest], "resultSizeEstimate": len(newest)}, {}
+        if path.startswith("/messages/"):
+            with self._lock:
+                message = self._by_id.get(path.rsplit("/", 1)[1])
+            if message is None:
+                raise KeyError(path)
+            data = base64.urlsafe_b64encode(self.newsletter(message["n"]).encode("utf-8")).decode("ascii")
+            return 200, {"id": message["id"], "historyId": str(message["history_id"]), "labelIds": [self.LABEL_ID],
+                         "payload": {"mimeType": "text/html", "body": {"data": data}}}, {}
+        if path == "/history":
+            start = int(query["startHistoryId"][0])
+            with self._lock:
+                added = [m for m in self.messages if m["history_id"] > start]
+                current = self.history_id
+            history = [{"id": str(m["history_id"]), "messagesAdded": [{"message": {"id": m["id"], "labelIds": [self.LABEL_ID]}}]}
+                       for m in added]
+            return 200, {"history": history, "historyId": str(current)}, {}
+        raise KeyError(path)
+
+
+class FakeChatCompletions(FakeService):
+    """
+    OpenAI-compatible /chat/completions endpoint (Perplexity, Groq and other providers), with stream=true support.
+
+    Args:
+        answer (str): Reply text, "{link}" is replaced by the first url found in the prompt
+        think (str): Reasoning emitted in a <think> block before the answer, like qwen3 does
+        output_delay (float): Extra seconds per 100 output characters, to model generation speed
+    """
+
+    def __init__(self, answer="Final answer", think="", output_delay=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.answer = answer
+        self.think = think
+        self.output_delay = output_delay
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def handle(self, method, path, query, headers, body):
+        if method != "POST" or not path.endswith("/chat/completions"):
+            raise KeyError(path)
+        request = json.loads(body or b"{}")
+        prompt = " ".join(str(message.get("content", "")) for message in request.get("messages", []))
+        link = re.search(r"https?://[^\s,'\"]+", prompt)
+        text = self.reply(request).replace("{link}", link.group(0) if link else "")
+        usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(text) // 4, "total_tokens": (len(prompt) + len(text)) // 4}
+        self.prompt_tokens += usage["prompt_tokens"]
+        self.completion_tokens += usage["completion_tokens"]
+        model = request.get("model", "fake")
+        if request.get("stream"):
+            return 200, self._stream(model, text, usage), {"Content-Type": "text/event-stream"}
+        if self.output_delay:
+            time.sleep(self.output_delay * len(text) / 100)
+        return 200, {"id": f"chatcmpl-{random.getrandbits(32):x}", "object": "chat.completion", "created": int(time.time()),
+                     "model": model, "usage": usage,
+                     "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}]}, {}
+
+    def reply(self, request):
+        # Groq's qwen3 options: reasoning_effort "none" skips the reasoning, reasoning_format "hidden" drops it
+        if not self.think or request.get("reasoning_effort") == "none":
+            return self.answer
+        if self.output_delay:
+            time.sleep(self.output_delay * len(self.think) / 100)
+        if request.get("reasoning_format") == "hidden":
+            return self.answer
+        return f"<think>\n{self.think}\n</think>\n" + self.answer
+
+    def _stream(self, model, text, usage):
+        for i in range(0, len(text), 40):
+            if self.output_delay:
+                time.sleep(self.output_delay * 0.4)
+            delta = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "model": model,
+                     "choices": [{"index": 0, "delta": {"content": text[i:i + 40]}, "finish_reason": None}]}
+            yield b"data: " + json.dumps(delta).encode("utf-8") + b"\n\n"
+        done = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "model": model, "usage": usage,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        yield b"data: " + json.dumps(done).encode("utf-8") + b"\n\n"
+        yield b"data: [DONE]\n\n"
+
+
+def fake_perplexity(**kwargs):
+    return FakeChatCompletions(answer="Trending hashtags: #ai #llm #opensource #machinelearning #reasoning. "
+                                      "Source: {link}", **kwargs)
+
+
+def fake_groq(**kwargs):
+    # CrewAI agents finish when the reply carries a "Final Answer:" section
+    return FakeChatCompletions(answer="Thought: I now know the final answer\nFinal Answer: " + POST_TEXT, **kwargs)
+
+
+class FakeLinkedIn(FakeService):
+    """registerUpload, the image upload url it hands out, and ugcPosts"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.assets = 0
+        self.uploaded_bytes = 0
+        self.posts = []
+        self._lock = threading.Lock()
+
+    def handle(self, method, path, query, headers, body):
+        if method == "POST" and path == "/v2/assets" and query.get("action") == ["registerUpload"]:
+            with self._lock:
+                self.assets += 1
+                n = self.assets
+            return 200, {"value": {"asset": f"urn:li:digitalmediaAsset:FAKE{n}", "uploadMechanism": {
+                "com.linkedin.digitalmedia.uploading.MediaUploadHttpRequest": {"uploadUrl": f"{self.url}/upload/{n}"}}}}, {}
+        if method == "PUT" and path.startswith("/upload/"):
+            with self._lock:
+                self.uploaded_bytes += len(body)
+            return 201, b"", {}
+        if method == "POST" and path == "/v2/ugcPosts":
+            with self._lock:
+                self.posts.append(json.loads(body))
+                post_id = f"urn:li:share:{len(self.posts)}"
+            return 201, {"id": post_id}, {"X-RestLi-Id": post_id}
+        raise KeyError(path)
+
+    def stats(self):
+        return dict(super().stats(), assets=self.assets, uploaded_bytes=self.uploaded_bytes, posts=len(self.posts))
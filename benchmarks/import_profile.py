@@ -0,0 +1,98 @@
+"""
+Import time profile of the app, to track cold start time across releases.
+
+Imports the given modules in a fresh interpreter with -X importtime and reports the cumulative import time
+per top-level package, the slowest individual modules and the total. Results are written as JSON to
+benchmarks/results so releases can be compared.
+
+Run from the repository root:
+    python benchmarks/import_profile.py [--module app] [--module pipeline] [--top 25] [--compare results/previous.json]
+
+"app" is what a cold start pays before the server listens, "pipeline" is what the warmup (or the first job) pays.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+
+def profile(module):
+    """Returns: (wall seconds, [(module, self us, cumulative us, depth)])"""
+    started = time.perf_counter()
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                               cwd=ROOT, capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    if completed.returncode != 0:
+        sys.exit(f"import {module} failed:\n{completed.stderr[-2000:]}")
+    entries = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return wall, entries
+
+
+def summarize(module, wall, entries, top):
+    # Top-level entries carry the cumulative time of everything they imported
+    packages = {}
+    for name, _, cumulative_us, depth in entries:
+        if depth == 0:
+            package = name.split(".")[0]
+            packages[package] = packages.get(package, 0) + cumulative_us
+    slowest = sorted(entries, key=lambda entry: entry[1], reverse=True)[:top]
+    return {
+        "module": module,
+        "wall_seconds": round(wall, 3),
+        "import_seconds": round(sum(us for us in packages.values()) / 1e6, 3),
+        "modules_imported": len(entries),
+        "packages": {name: round(us / 1e6, 4) for name, us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]},
+        "slowest_modules": [{"module": name, "self_seconds": round(self_us / 1e6, 4), "cumulative_seconds": round(cumulative_us / 1e6, 4)}
+                            for name, self_us, cumulative_us, _ in slowest],
+    }
+
+
+def print_report(report, previous=None):
+    before = previous["packages"] if previous else {}
+    print(f"\nimport {report['module']}: {report['import_seconds']}s in imports, {report['modules_imported']} modules, "
+          f"{report['wall_seconds']}s interpreter wall time" + (f" (was {previous['import_seconds']}s)" if previous else ""))
+    print(f"{'package':<32} {'cumulative':>10}" + (f" {'before':>10}" if previous else ""))
+    for name, seconds in report["packages"].items():
+        line = f"{name:<32} {seconds * 1e3:>8.1f}ms"
+        if previous:
+            line += f" {before[name] * 1e3:>8.1f}ms" if name in before else f" {'-':>10}"
+        print(line)
+
+
+def run(args):
+    previous = {}
+    if args.compare:
+        with open(args.compare) as f:
+            previous = {report["module"]: report for report in json.load(f)["reports"]}
+    reports = []
+    for module in args.module or ["app"]:
+        wall, entries = profile(module)
+        report = summarize(module, wall, entries, args.top)
+        reports.append(report)
+        print_report(report, previous.get(module))
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    out = args.out or os.path.join(RESULTS_DIR, f"imports-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(out, "w") as f:
+        json.dump({"timestamp": datetime.now().isoformat(timespec="seconds"), "python": sys.version.split()[0], "reports": reports}, f, indent=2)
+    print(f"\nResults written to {out}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", action="append", help="Module to import, repeatable (default: app)")
+    parser.add_argument("--top", type=int, default=20, help="Packages and modules listed")
+    parser.add_argument("--out", help="Result file, defaults to benchmarks/results/imports-<timestamp>.json")
+    parser.add_argument("--compare", help="Earlier result file to compare against")
+    run(parser.parse_args())
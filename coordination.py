@@ -0,0 +1,172 @@
+import importlib
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from sqlite_store import SQLiteStore
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# "sqlite" uses the shared state.db, which covers several workers or containers on one host (same volume).
+# Replicas on different hosts need a shared backend, given as "module:ClassName" implementing CoordinationBackend.
+COORDINATION_BACKEND = os.getenv("COORDINATION_BACKEND", "sqlite")
+LOCK_POLL_INTERVAL = 0.2
+
+# Lease holder id of this process
+INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class LockTimeout(Exception):
+    pass
+
+
+class CoordinationBackend:
+    """
+    What replicas coordinate through: named leases that expire unless renewed, and a small shared key-value map.
+    Expiry uses wall clock time, so replicas on different hosts need synchronized clocks.
+    """
+
+    def try_acquire(self, name, holder, ttl):
+        """Take or renew a lease for ttl seconds, returns True if holder now holds it"""
+        raise NotImplementedError
+
+    def release(self, name, holder):
+        raise NotImplementedError
+
+    def holder(self, name):
+        """Returns: (holder, expires_at) of an unexpired lease, or None"""
+        raise NotImplementedError
+
+    def get(self, key):
+        """Returns: The JSON value stored under key, or None"""
+        raise NotImplementedError
+
+    def set(self, key, value):
+        raise NotImplementedError
+
+
+class SQLiteCoordination(SQLiteStore, CoordinationBackend):
+    """
+    CoordinationBackend on the shared SQLite file. Taking a lease is a single conditional upsert, SQLite's
+    file lock makes it atomic across threads and processes.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS leases (
+        name TEXT PRIMARY KEY,
+        holder TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS shared_state (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL,
+        updated_at REAL NOT NULL
+    );
+    """
+
+    def try_acquire(self, name, holder, ttl):
+        now = time.time()
+        conn = self.connection()
+        with conn:
+            conn.execute(
+                "INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at "
+                "WHERE leases.holder = excluded.holder OR leases.expires_at <= ?",
+                (name, holder, now + ttl, now),
+            )
+            row = conn.execute("SELECT holder FROM leases WHERE name = ?", (name,)).fetchone()
+        return row["holder"] == holder
+
+    def release(self, name, holder):
+        conn = self.connection()
+        with conn:
+            conn.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, holder))
+
+    def holder(self, name):
+        row = self.connection().execute("SELECT holder, expires_at FROM leases WHERE name = ? AND expires_at > ?",
+                                        (name, time.time())).fetchone()
+        return (row["holder"], row["expires_at"]) if row else None
+
+    def get(self, key):
+        row = self.connection().execute("SELECT value FROM shared_state WHERE key = ?", (key,)).fetchone()
+        return json.loads(row["value"]) if row else None
+
+    def set(self, key, value):
+        conn = self.connection()
+        with conn:
+            conn.execute(
+                "INSERT INTO shared_state (key, value, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at",
+                (key, json.dumps(value), time.time()),
+            )
+
+
+def load_backend(spec=COORDINATION_BACKEND):
+    if spec == "sqlite":
+        return SQLiteCoordination()
+    module_name, _, class_name = spec.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+coordination = load_backend()
+
+
+@contextmanager
+def lock(name, ttl=60, timeout=60, backend=None):
+    """
+    Mutual exclusion across threads, workers and replicas.
+
+    The lease expires after ttl seconds so a crashed holder cannot block everyone, the block must finish
+    well within it.
+
+    Raises:
+        LockTimeout: If the lock could not be taken within timeout seconds
+    """
+    backend = backend or coordination
+    holder = f"{INSTANCE_ID}:{threading.get_ident()}"
+    deadline = time.monotonic() + timeout
+    while not backend.try_acquire(name, holder, ttl):
+        if time.monotonic() >= deadline:
+            raise LockTimeout(f"Lock '{name}' still held by {backend.holder(name)} after {timeout}s")
+        time.sleep(LOCK_POLL_INTERVAL)
+    try:
+        yield
+    finally:
+        backend.release(name, holder)
+
+
+class Leadership:
+    """
+    Leader election through a lease, for work that must run on one replica only (watch renewal, drip publishing).
+
+    Every replica calls check() periodically (more often than ttl), the one holding the lease keeps renewing it.
+    A leader that stops renewing is replaced once its lease expires.
+
+    Args:
+        name (str): Lease name, one per kind of singleton work
+        ttl (float): Seconds the lease lasts without a renewal
+    """
+
+    def __init__(self, name, ttl, backend=None):
+        self.name = name
+        self.ttl = ttl
+        self.backend = backend or coordination
+        self.leader = False
+
+    def check(self):
+        """Take or renew the lease, returns True while this process is the leader"""
+        self.leader = self.backend.try_acquire(self.name, INSTANCE_ID, self.ttl)
+        return self.leader
+
+    def resign(self):
+        if self.leader:
+            self.backend.release(self.name, INSTANCE_ID)
+            self.leader = False
+
+    def status(self):
+        current = self.backend.holder(self.name)
+        return {"leader": current[0] if current else None, "is_leader": bool(current) and current[0] == INSTANCE_ID}
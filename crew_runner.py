@@ -0,0 +1,102 @@
+import asyncio
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CREW_POOL_SIZE = int(os.getenv("CREW_POOL_SIZE", "2"))
+CREW_TIMEOUT = float(os.getenv("CREW_TIMEOUT", "300"))
+
+
+class CrewTimeoutError(Exception):
+    """Raised when a crew run (or waiting for a free crew) takes longer than the configured timeout"""
+
+
+class CrewRunner:
+    """
+    Pool of isolated, prebuilt crews with a bounded number of concurrent kickoffs.
+
+    Each kickoff takes a crew out of the pool and runs it on a dedicated thread, so it never blocks the
+    event loop and never shares agent or task state with another run. A crew goes back to the pool only
+    once its run has really finished, even when the caller already gave up on it after a timeout.
+
+    Args:
+        factory (callable): Returns a new crewai Crew
+        size (int): Number of crews, i.e. maximum concurrent kickoffs
+        timeout (float): Seconds a caller waits for a free crew plus its run
+    """
+
+    def __init__(self, factory, size=CREW_POOL_SIZE, timeout=CREW_TIMEOUT):
+        self.factory = factory
+        self.size = max(1, size)
+        self.timeout = timeout
+        self._pool = queue.Queue()
+        self._built = 0
+        self._build_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="crew")
+
+    def warm(self):
+        """Build every crew up front instead of on first use"""
+        while self._try_build():
+            pass
+
+    def _try_build(self):
+        with self._build_lock:
+            if self._built >= self.size:
+                return False
+            self._built += 1
+        try:
+            self._pool.put(self.factory())
+        except Exception:
+            with self._build_lock:
+                self._built -= 1
+            raise
+        return True
+
+    def _acquire(self, timeout):
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+        if self._try_build():
+            return self._pool.get_nowait()
+        try:
+            return self._pool.get(timeout=timeout)
+        except queue.Empty:
+            raise CrewTimeoutError(f"No crew became free within {timeout}s ({self.size} runs in progress)")
+
+    def _submit(self, inputs, timeout):
+        crew = self._acquire(timeout)
+        try:
+            future = self._executor.submit(crew.kickoff, inputs=inputs)
+        except Exception:
+            self._pool.put(crew)
+            raise
+        future.add_done_callback(lambda _: self._pool.put(crew))
+        return future
+
+    def kickoff(self, inputs, timeout=None):
+        """
+        Run a crew with the given inputs and wait for its output
+
+        Raises:
+            CrewTimeoutError: If no crew is free or the run does not finish in time
+        """
+        timeout = timeout or self.timeout
+        future = self._submit(inputs, timeout)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            raise CrewTimeoutError(f"Crew run did not finish within {timeout}s")
+
+    async def akickoff(self, inputs, timeout=None):
+        """Async version of kickoff(), waiting for a crew and its run happens off the event loop"""
+        timeout = timeout or self.timeout
+        future = await asyncio.to_thread(self._submit, inputs, timeout)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            raise CrewTimeoutError(f"Crew run did not finish within {timeout}s")
@@ -0,0 +1,137 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from sqlite_store import SQLiteStore
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# A pending claim older than this is treated as abandoned (e.g. the worker crashed) and can be taken again
+DEDUP_CLAIM_TIMEOUT = int(os.getenv("DEDUP_CLAIM_TIMEOUT", "1800"))
+
+TRACKING_PARAMS = re.compile(r"^(utm_\w+|ref|ref_src|fbclid|gclid|mc_cid|mc_eid|_hsenc|_hsmi|mkt_tok)$", re.IGNORECASE)
+
+MESSAGE = "message"
+ARTICLE = "article"
+CONTENT = "content"
+
+
+def normalize_url(url):
+    """
+    Normalize an article url so the same page reached through different newsletters maps to one key:
+    drops the scheme, "www.", default ports, fragments, tracking parameters and trailing slashes.
+    """
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not TRACKING_PARAMS.match(k)))
+    path = parts.path.rstrip("/") or "/"
+    # http and https copies of a page are the same article
+    return urlunsplit(("https", host, path, query, ""))
+
+
+def content_hash(text):
+    # Whitespace and case differences should not make two copies of an article look different
+    normalized = " ".join(text.split()).lower()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class DedupStore(SQLiteStore):
+    """
+    Persistent index of processed Gmail message ids, article urls and article content hashes.
+
+    Keys go through claim() -> complete() / release(). A claimed key is reported as a duplicate to every
+    other caller, so overlapping pushes and Pub/Sub redeliveries short-circuit before any expensive stage.
+    A claim records its owner (the job id, see job_queue.current_job_id): a later run of the same job, e.g.
+    one resumed after a crash, takes its pending claims over, anybody else only once they went stale.
+    Completed keys are also kept in memory so repeated checks never touch the database.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS dedup (
+        kind TEXT NOT NULL,
+        key TEXT NOT NULL,
+        status TEXT NOT NULL,
+        updated_at REAL NOT NULL,
+        owner TEXT,
+        PRIMARY KEY (kind, key)
+    );
+    """
+
+    def __init__(self, path=None, claim_timeout=DEDUP_CLAIM_TIMEOUT):
+        super().__init__(path)
+        self.add_column("dedup", "owner", "TEXT")
+        self.claim_timeout = claim_timeout
+        self._done = set()
+        self._done_lock = threading.Lock()
+
+    @staticmethod
+    def make_key(kind, value):
+        if kind == ARTICLE:
+            return normalize_url(value)
+        if kind == CONTENT:
+            return content_hash(value)
+        return value
+
+    def is_processed(self, kind, value):
+        key = self.make_key(kind, value)
+        if (kind, key) in self._done:
+            return True
+        row = self.connection().execute("SELECT status FROM dedup WHERE kind = ? AND key = ?", (kind, key)).fetchone()
+        if row and row["status"] == "done":
+            with self._done_lock:
+                self._done.add((kind, key))
+            return True
+        return False
+
+    def claim(self, kind, value, owner=None):
+        """
+        Reserve a key for processing
+
+        Args:
+            owner (str): Job id of the caller, a pending claim with the same owner is taken over
+
+        Returns:
+            bool: True if the caller now owns the key, False if it is done or being processed elsewhere
+        """
+        key = self.make_key(kind, value)
+        if (kind, key) in self._done:
+            return False
+        now = time.time()
+        conn = self.connection()
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO dedup (kind, key, status, updated_at, owner) VALUES (?, ?, 'pending', ?, ?) "
+                "ON CONFLICT (kind, key) DO UPDATE SET updated_at = excluded.updated_at, owner = excluded.owner "
+                "WHERE dedup.status = 'pending' AND (dedup.updated_at < ? OR (excluded.owner IS NOT NULL AND dedup.owner = excluded.owner))",
+                (kind, key, now, owner, now - self.claim_timeout),
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, kind, value):
+        key = self.make_key(kind, value)
+        conn = self.connection()
+        with conn:
+            conn.execute(
+                "INSERT INTO dedup (kind, key, status, updated_at) VALUES (?, ?, 'done', ?) "
+                "ON CONFLICT (kind, key) DO UPDATE SET status = 'done', updated_at = excluded.updated_at",
+                (kind, key, time.time()),
+            )
+        with self._done_lock:
+            self._done.add((kind, key))
+
+    def release(self, kind, value, owner=None):
+        # A claim taken over by someone else (after it went stale) stays theirs
+        key = self.make_key(kind, value)
+        conn = self.connection()
+        with conn:
+            conn.execute("DELETE FROM dedup WHERE kind = ? AND key = ? AND status = 'pending' AND owner IS ?", (kind, key, owner))
+
+
+dedup_store = DedupStore()
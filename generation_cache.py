@@ -0,0 +1,151 @@
+import hashlib
+import os
+import re
+import time
+from sqlite_store import SQLiteStore
+from dotenv import load_dotenv
+
+load_dotenv()
+
+GENERATION_CACHE_MAX_ENTRIES = int(os.getenv("GENERATION_CACHE_MAX_ENTRIES", "1000"))
+GENERATION_NEAR_DUPLICATES = os.getenv("GENERATION_NEAR_DUPLICATES", "true").lower() == "true"
+# Maximum number of differing SimHash bits for two articles to count as the same story
+GENERATION_SIMHASH_DISTANCE = int(os.getenv("GENERATION_SIMHASH_DISTANCE", "3"))
+
+SHINGLE_SIZE = 3
+SIMHASH_BITS = 64
+BAND_BITS = 16
+WORD_RE = re.compile(r"\w+")
+
+
+def simhash(text):
+    """64 bit SimHash over word 3-shingles, similar texts differ in only a few bits"""
+    words = WORD_RE.findall(text.lower())
+    shingles = [" ".join(words[i:i + SHINGLE_SIZE]) for i in range(max(1, len(words) - SHINGLE_SIZE + 1))]
+    weights = [0] * SIMHASH_BITS
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(SIMHASH_BITS) if weights[bit] > 0)
+
+
+def _bands(fingerprint):
+    # Two fingerprints within 3 bits of each other share at least one of the four 16 bit bands exactly
+    mask = (1 << BAND_BITS) - 1
+    return [fingerprint >> (i * BAND_BITS) & mask for i in range(SIMHASH_BITS // BAND_BITS)]
+
+
+def _to_signed(value):
+    # SQLite integers are signed 64 bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+class GenerationCache(SQLiteStore):
+    """
+    Persistent cache of generated posts.
+
+    Exact hits are keyed on (content, link, prompt version, model, temperature). With near-duplicate lookup
+    enabled, a post generated for an article whose SimHash is within GENERATION_SIMHASH_DISTANCE bits is
+    reused too, with its link swapped for the new one. Entries from another prompt version, model or
+    temperature never match, so editing the task prompt invalidates the cache.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS generation_cache (
+        key TEXT PRIMARY KEY,
+        scope TEXT NOT NULL,
+        link TEXT NOT NULL,
+        simhash INTEGER NOT NULL,
+        band0 INTEGER NOT NULL,
+        band1 INTEGER NOT NULL,
+        band2 INTEGER NOT NULL,
+        band3 INTEGER NOT NULL,
+        output TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        last_used REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS generation_cache_band0 ON generation_cache (scope, band0);
+    CREATE INDEX IF NOT EXISTS generation_cache_band1 ON generation_cache (scope, band1);
+    CREATE INDEX IF NOT EXISTS generation_cache_band2 ON generation_cache (scope, band2);
+    CREATE INDEX IF NOT EXISTS generation_cache_band3 ON generation_cache (scope, band3);
+    """
+
+    def __init__(self, path=None, max_entries=GENERATION_CACHE_MAX_ENTRIES, near_duplicates=GENERATION_NEAR_DUPLICATES,
+                 max_distance=GENERATION_SIMHASH_DISTANCE):
+        super().__init__(path)
+        self.max_entries = max_entries
+        self.near_duplicates = near_duplicates
+        self.max_distance = min(max_distance, SIMHASH_BITS // BAND_BITS - 1)
+
+    @staticmethod
+    def make_scope(prompt_version, model, temperature):
+        return f"{prompt_version}|{model}|{temperature}"
+
+    @staticmethod
+    def make_key(content, link, scope):
+        return hashlib.sha256("\x00".join([content, link, scope]).encode("utf-8")).hexdigest()
+
+    def get(self, content, link, prompt_version, model, temperature):
+        """
+        Look up a generated post
+
+        Returns:
+            tuple: (output, "exact" or "near") on a hit, (None, None) on a miss
+        """
+        scope = self.make_scope(prompt_version, model, temperature)
+        conn = self.connection()
+        key = self.make_key(content, link, scope)
+        row = conn.execute("SELECT output FROM generation_cache WHERE key = ?", (key,)).fetchone()
+        if row:
+            self._touch(key)
+            return row["output"], "exact"
+        if not self.near_duplicates:
+            return None, None
+
+        fingerprint = simhash(content)
+        bands = _bands(fingerprint)
+        rows = conn.execute(
+            "SELECT key, link, simhash, output FROM generation_cache WHERE scope = ? AND "
+            "(band0 = ? OR band1 = ? OR band2 = ? OR band3 = ?)",
+            (scope, *bands),
+        ).fetchall()
+        best = None
+        for candidate in rows:
+            distance = bin(fingerprint ^ (candidate["simhash"] & ((1 << 64) - 1))).count("1")
+            if distance <= self.max_distance and (best is None or distance < best[0]):
+                best = (distance, candidate)
+        if best is None:
+            return None, None
+        candidate = best[1]
+        self._touch(candidate["key"])
+        output = candidate["output"]
+        if candidate["link"] and candidate["link"] != link:
+            output = output.replace(candidate["link"], link)
+        return output, "near"
+
+    def set(self, content, link, prompt_version, model, temperature, output):
+        scope = self.make_scope(prompt_version, model, temperature)
+        fingerprint = simhash(content)
+        now = time.time()
+        conn = self.connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO generation_cache (key, scope, link, simhash, band0, band1, band2, band3, output, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.make_key(content, link, scope), scope, link, _to_signed(fingerprint), *_bands(fingerprint), output, now, now),
+            )
+            # Entries of older prompt versions can never match again
+            conn.execute("DELETE FROM generation_cache WHERE scope != ?", (scope,))
+            conn.execute(
+                "DELETE FROM generation_cache WHERE key IN (SELECT key FROM generation_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def _touch(self, key):
+        conn = self.connection()
+        with conn:
+            conn.execute("UPDATE generation_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+
+
+generation_cache = GenerationCache()
@@ -0,0 +1,143 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+import httplib2
+import google_auth_httplib2
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build
+from coordination import coordination, lock
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SCOPES = [os.getenv('GMAIL_SCOPE')]
+TOKEN_FILE = os.getenv("GMAIL_TOKEN_FILE", "token.json")
+# Refresh the access token this many seconds before it actually expires
+CREDENTIAL_REFRESH_MARGIN = int(os.getenv("GMAIL_CREDENTIAL_REFRESH_MARGIN", "300"))
+LABEL_CACHE_TTL = int(os.getenv("GMAIL_LABEL_CACHE_TTL", "3600"))
+# Alternative API root (e.g. a local fake server for benchmarks), the bundled discovery document is used either way
+GMAIL_API_ENDPOINT = os.getenv("GMAIL_API_ENDPOINT")
+# Shared state key of the latest refreshed credentials, see coordination.py
+CREDENTIALS_KEY = "gmail_credentials"
+
+
+class GmailClient:
+    """
+    Process-wide holder for Gmail credentials, API clients and label ids.
+
+    Credentials are loaded once and refreshed only when close to expiry. The discovery client is built
+    once per thread because the underlying httplib2 transport is not thread-safe.
+    """
+
+    def __init__(self, token_file=TOKEN_FILE, scopes=SCOPES, refresh_margin=CREDENTIAL_REFRESH_MARGIN, label_ttl=LABEL_CACHE_TTL):
+        self.token_file = token_file
+        self.scopes = scopes
+        self.refresh_margin = refresh_margin
+        self.label_ttl = label_ttl
+        self._creds = None
+        self._creds_lock = threading.Lock()
+        self._local = threading.local()
+        self._labels = {}
+        self._labels_lock = threading.Lock()
+
+    def get_credentials(self):
+        with self._creds_lock:
+            if self._creds is None:
+                self._creds = self._stored_credentials()
+                if self._creds is None:
+                    raise Exception("You must authorize the app and have a valid token.json file.")
+            if self._needs_refresh(self._creds):
+                self._refresh(self._creds)
+            return self._creds
+
+    def _stored_credentials(self):
+        """The newest of token.json and the credentials another worker or replica refreshed, or None"""
+        candidates = []
+        shared = coordination.get(CREDENTIALS_KEY)
+        if shared:
+            candidates.append(Credentials.from_authorized_user_info(shared, self.scopes))
+        if os.path.exists(self.token_file):
+            candidates.append(Credentials.from_authorized_user_file(self.token_file, self.scopes))
+        if not candidates:
+            return None
+        # A re-authorized token.json wins over an older shared token and vice versa
+        return max(candidates, key=lambda creds: creds.expiry or datetime.min)
+
+    def _refresh(self, creds):
+        """
+        Refresh under a lock shared by all workers and replicas. Whoever takes it first refreshes and publishes
+        the new token, the others adopt it instead of refreshing again.
+        """
+        with lock("gmail-credentials"):
+            latest = self._stored_credentials()
+            if latest is not None and not self._needs_refresh(latest):
+                # Updated in place, the per-thread clients hold on to this credentials object
+                creds.token, creds.expiry = latest.token, latest.expiry
+                return
+            if not creds.refresh_token:
+                raise Exception("You must authorize the app and have a valid token.json file.")
+            creds.refresh(Request())
+            coordination.set(CREDENTIALS_KEY, json.loads(creds.to_json()))
+            self._save_token_file(creds)
+
+    def _save_token_file(self, creds):
+        tmp_path = self.token_file + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                f.write(creds.to_json())
+            os.replace(tmp_path, self.token_file)
+        except OSError as e:
+            # The shared copy is what other workers read, a read-only token.json is not fatal
+            print(f"Could not write {self.token_file}: {e}")
+
+    def _needs_refresh(self, creds):
+        if not creds.token or creds.expiry is None:
+            return not creds.valid
+        # google-auth keeps expiry as a naive UTC datetime
+        return creds.expiry - timedelta(seconds=self.refresh_margin) <= datetime.utcnow()
+
+    def get_service(self):
+        creds = self.get_credentials()
+        service = getattr(self._local, "service", None)
+        if service is None:
+            http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http())
+            client_options = {"api_endpoint": GMAIL_API_ENDPOINT} if GMAIL_API_ENDPOINT else None
+            service = build('gmail', 'v1', http=http, cache_discovery=False, static_discovery=True, client_options=client_options)
+            self._local.service = service
+        return service
+
+    def get_label_id(self, label_name, service=None):
+        now = time.monotonic()
+        with self._labels_lock:
+            cached = self._labels.get(label_name)
+            if cached and cached[1] > now:
+                return cached[0]
+        service = service or self.get_service()
+        results = service.users().labels().list(userId='me').execute()
+        labels = {label['name']: label['id'] for label in results.get('labels', [])}
+        with self._labels_lock:
+            expires = now + self.label_ttl
+            self._labels = {name: (label_id, expires) for name, label_id in labels.items()}
+        if label_name not in labels:
+            raise Exception(f"Label '{label_name}' not found. Please check spelling or create it in Gmail.")
+        return labels[label_name]
+
+    def invalidate_label(self, label_name=None):
+        with self._labels_lock:
+            if label_name is None:
+                self._labels.clear()
+            else:
+                self._labels.pop(label_name, None)
+
+    def reset(self):
+        """Drop cached credentials, clients and labels, e.g. after token.json was replaced"""
+        with self._creds_lock:
+            self._creds = None
+        self._local = threading.local()
+        self.invalidate_label()
+
+
+gmail_client = GmailClient()
@@ -0,0 +1,102 @@
+import os
+import threading
+import time
+import traceback
+from coordination import coordination, Leadership
+from dotenv import load_dotenv
+
+load_dotenv()
+
+GMAIL_WATCH_RENEWAL = os.getenv("GMAIL_WATCH_RENEWAL", "true").lower() == "true"
+GMAIL_WATCH_CHECK_INTERVAL = int(os.getenv("GMAIL_WATCH_CHECK_INTERVAL", "600"))
+# Gmail watches expire after 7 days, renew this many seconds before the recorded expiration
+GMAIL_WATCH_RENEW_BEFORE = int(os.getenv("GMAIL_WATCH_RENEW_BEFORE", str(86400)))
+WATCH_STATE_KEY = "gmail_watch"
+WATCH_TOPIC = f"projects/{os.getenv('GOOGLE_PROJECT_ID')}/topics/{os.getenv('GMAIL_TOPIC_NAME')}"
+WATCH_LABEL = os.getenv("TARGET_LABEL_NAME")
+
+
+def watch_label():
+    # Pulls in the Gmail client, only needed once a renewal is due
+    from watchreq_script import watch_label
+    return watch_label()
+
+
+class WatchRenewer:
+    """
+    Background thread keeping the Gmail watch alive.
+
+    Every replica runs one, only the leader (see coordination.Leadership) renews. The last watch response is kept
+    in the shared state, a renewal is due when it is missing, close to its expiration or for another topic or label.
+
+    Args:
+        watch (callable): watch() -> watch response with "expiration" (ms), "topic" and "label"
+        interval (int): Seconds between two checks
+        renew_before (int): Seconds before the expiration the watch is renewed
+    """
+
+    def __init__(self, watch=watch_label, backend=coordination, interval=GMAIL_WATCH_CHECK_INTERVAL, renew_before=GMAIL_WATCH_RENEW_BEFORE):
+        self.watch = watch
+        self.backend = backend
+        self.interval = interval
+        self.renew_before = renew_before
+        # Outlives a missed check or two, a dead leader is replaced within a few intervals
+        self.leadership = Leadership("gmail-watch", ttl=3 * interval, backend=backend)
+        self.error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="gmail-watch", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        # Lets another replica take over right away instead of after the lease expired
+        self.leadership.resign()
+
+    def state(self):
+        return self.backend.get(WATCH_STATE_KEY)
+
+    def is_due(self, state, topic, label):
+        if not state or state.get("topic") != topic or state.get("label") != label:
+            return True
+        return int(state["expiration"]) / 1000 - time.time() <= self.renew_before
+
+    def renew(self):
+        response = self.watch()
+        state = {**response, "renewed_at": time.time()}
+        self.backend.set(WATCH_STATE_KEY, state)
+        print(f"----------- Gmail watch renewed until {time.ctime(int(response['expiration']) / 1000)}")
+        return state
+
+    def check(self):
+        """Renew the watch if this replica leads and it is due, returns True if it was renewed"""
+        if not self.leadership.check():
+            return False
+        if not self.is_due(self.state(), WATCH_TOPIC, WATCH_LABEL):
+            return False
+        self.renew()
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.check()
+                self.error = None
+            except Exception as e:
+                # Retried on the next check, there are hours of margin before the watch lapses
+                traceback.print_exc()
+                self.error = str(e)
+            self._stop.wait(self.interval)
+
+    def status(self):
+        state = self.state() or {}
+        return {**self.leadership.status(), "expiration": state.get("expiration"), "renewed_at": state.get("renewed_at"), "error": self.error}
+
+
+watch_renewer = WatchRenewer()
@@ -0,0 +1,246 @@
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+import httpx
+import metrics
+import rate_limiter
+from dotenv import load_dotenv
+
+load_dotenv()
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "60"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "50"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.5"))
+HTTP_BACKOFF_CAP = float(os.getenv("HTTP_BACKOFF_CAP", "10"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}
+
+# Callers catch this instead of the httpx exception types directly
+HTTPError = httpx.HTTPError
+
+try:
+    import h2  # noqa: F401
+    HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+except ImportError:
+    HTTP2_ENABLED = False
+
+_client = None
+_client_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _on_request(request):
+    request.extensions["metrics_start"] = time.perf_counter()
+
+
+def _on_response(response):
+    # Time to response headers, streamed bodies are still being read when this runs
+    start = response.request.extensions.get("metrics_start")
+    metrics.observe_http(rate_limiter.service_for(response.request.url), response.status_code, time.perf_counter() - start if start else None)
+
+
+async def _aon_request(request):
+    _on_request(request)
+
+
+async def _aon_response(response):
+    _on_response(response)
+
+
+def _client_options(is_async=False):
+    return {
+        "event_hooks": {"request": [_aon_request if is_async else _on_request],
+                        "response": [_aon_response if is_async else _on_response]},
+        "http2": HTTP2_ENABLED,
+        "follow_redirects": True,
+        "timeout": httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        "limits": httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE),
+    }
+
+
+def get_client():
+    """Shared sync client, connections are pooled and kept alive per host"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = httpx.Client(**_client_options())
+    return _client
+
+
+def get_async_client():
+    """Shared async client for the running event loop"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(**_client_options(is_async=True))
+        _async_clients[loop] = client
+    return client
+
+
+def close():
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+async def aclose():
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def _should_retry(method, idempotent, response=None, error=None):
+    if idempotent is None:
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+    if error is not None:
+        # A failed connect never reached the server, so even a POST is safe to send again
+        return idempotent or isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+    if response.status_code == 429 or response.status_code == 503:
+        return True
+    return idempotent and response.status_code in RETRY_STATUSES
+
+
+def _retry_delay(attempt, response=None):
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return min(float(retry_after), HTTP_BACKOFF_CAP)
+            except ValueError:
+                try:
+                    return min(max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0), HTTP_BACKOFF_CAP)
+                except (TypeError, ValueError):
+                    pass
+    # Full jitter keeps concurrent workers from retrying in lockstep
+    return random.uniform(0, min(HTTP_BACKOFF_CAP, HTTP_BACKOFF_BASE * (2 ** attempt)))
+
+
+def request(method, url, max_retries=HTTP_MAX_RETRIES, idempotent=None, **kwargs):
+    """
+    Send a request through the shared client, retrying 429/5xx responses and transport errors with jittered backoff.
+    Requests to hosts registered with rate_limiter wait for a slot first, and their 429s are queued again
+    (for up to RATE_LIMIT_MAX_WAIT) instead of counting as retries.
+
+    Args:
+        method (str): HTTP method
+        url (str): Request url
+        max_retries (int): Retries after the first attempt
+        idempotent (bool): Whether any 5xx may be retried, defaults to True for GET/HEAD/PUT/DELETE/OPTIONS
+        **kwargs: Passed to httpx.Client.request (headers, json, data, content, params, timeout...)
+
+    Returns:
+        httpx.Response: The last response received
+
+    Raises:
+        rate_limiter.RateLimitTimeout: If no rate limit slot frees up within RATE_LIMIT_MAX_WAIT
+    """
+    return _send(method, url, max_retries, idempotent, False, kwargs)
+
+
+@contextmanager
+def stream(method, url, max_retries=HTTP_MAX_RETRIES, idempotent=None, **kwargs):
+    """
+    Streaming version of request(), the body is read by the caller (response.iter_bytes()) and the response is
+    closed on exit. Retries and rate limits apply until the response headers arrive, a transfer that breaks off
+    while the body is read raises to the caller.
+    """
+    response = _send(method, url, max_retries, idempotent, True, kwargs)
+    try:
+        yield response
+    finally:
+        response.close()
+
+
+def _send(method, url, max_retries, idempotent, stream, kwargs):
+    client = get_client()
+    limiter = rate_limiter.limiter_for_request(url, kwargs.get("headers"))
+    deadline = time.monotonic() + rate_limiter.RATE_LIMIT_MAX_WAIT
+    attempt = 0
+    while True:
+        if limiter:
+            limiter.acquire(max(0.0, deadline - time.monotonic()))
+        try:
+            if stream:
+                response = client.send(client.build_request(method, url, **kwargs), stream=True)
+            else:
+                response = client.request(method, url, **kwargs)
+        except httpx.TransportError as e:
+            metrics.observe_http(rate_limiter.service_for(url), type(e).__name__, None)
+            if attempt >= max_retries or not _should_retry(method, idempotent, error=e):
+                raise
+            delay = _retry_delay(attempt)
+        else:
+            if limiter and limiter.observe(response.status_code, response.headers) and time.monotonic() < deadline:
+                # The limiter already paused for Retry-After, queue the call again without using up a retry
+                response.close()
+                continue
+            if attempt >= max_retries or not _should_retry(method, idempotent, response=response):
+                return response
+            delay = _retry_delay(attempt, response)
+            response.close()
+        attempt += 1
+        time.sleep(delay)
+
+
+async def arequest(method, url, max_retries=HTTP_MAX_RETRIES, idempotent=None, **kwargs):
+    """Async version of request(), awaits I/O and backoff without blocking the event loop"""
+    client = get_async_client()
+    limiter = rate_limiter.limiter_for_request(url, kwargs.get("headers"))
+    deadline = time.monotonic() + rate_limiter.RATE_LIMIT_MAX_WAIT
+    attempt = 0
+    while True:
+        if limiter:
+            await limiter.aacquire(max(0.0, deadline - time.monotonic()))
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.TransportError as e:
+            metrics.observe_http(rate_limiter.service_for(url), type(e).__name__, None)
+            if attempt >= max_retries or not _should_retry(method, idempotent, error=e):
+                raise
+            delay = _retry_delay(attempt)
+        else:
+            if limiter and limiter.observe(response.status_code, response.headers) and time.monotonic() < deadline:
+                await response.aclose()
+                continue
+            if attempt >= max_retries or not _should_retry(method, idempotent, response=response):
+                return response
+            delay = _retry_delay(attempt, response)
+            await response.aclose()
+        attempt += 1
+        await asyncio.sleep(delay)
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+
+def put(url, **kwargs):
+    return request("PUT", url, **kwargs)
+
+
+async def aget(url, **kwargs):
+    return await arequest("GET", url, **kwargs)
+
+
+async def apost(url, **kwargs):
+    return await arequest("POST", url, **kwargs)
+
+
+async def aput(url, **kwargs):
+    return await arequest("PUT", url, **kwargs)
@@ -0,0 +1,104 @@
+import os
+import tempfile
+import http_client
+from dotenv import load_dotenv
+
+load_dotenv()
+
+IMAGE_TMP_DIR = os.getenv("IMAGE_TMP_DIR") or tempfile.gettempdir()
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(20 * 1024 * 1024)))
+CHUNK_SIZE = 64 * 1024
+
+# (magic prefix, content type, extension), WEBP is special cased because its magic is split
+MAGIC_NUMBERS = [
+    (b"\xff\xd8\xff", "image/jpeg", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png", ".png"),
+    (b"GIF87a", "image/gif", ".gif"),
+    (b"GIF89a", "image/gif", ".gif"),
+    (b"BM", "image/bmp", ".bmp"),
+]
+
+
+def sniff_image_type(header):
+    """
+    Detect the image type from its first bytes
+
+    Returns:
+        tuple: (content type, extension), ("application/octet-stream", ".bin") if unknown
+    """
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp", ".webp"
+    for magic, content_type, extension in MAGIC_NUMBERS:
+        if header.startswith(magic):
+            return content_type, extension
+    return "application/octet-stream", ".bin"
+
+
+def sniff_file_type(file_path):
+    with open(file_path, "rb") as f:
+        return sniff_image_type(f.read(16))
+
+
+def download_image(img_url, max_bytes=IMAGE_MAX_BYTES, tmp_dir=IMAGE_TMP_DIR):
+    """
+    Stream an image to a uniquely named temp file, so memory stays flat and concurrent jobs never collide
+
+    Args:
+        img_url (str): Image url
+        max_bytes (int): Abort when the image is bigger than this
+
+    Returns:
+        str: Path of the downloaded image, the extension matches the sniffed type. The caller deletes it.
+    """
+    fd, tmp_path = tempfile.mkstemp(prefix="post_image_", suffix=".part", dir=tmp_dir)
+    size, header = 0, b""
+    try:
+        with os.fdopen(fd, "wb") as f, http_client.stream("GET", img_url) as response:
+            response.raise_for_status()
+            for chunk in response.iter_bytes(CHUNK_SIZE):
+                if len(header) < 16:
+                    header += chunk[:16 - len(header)]
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ValueError(f"Image {img_url} is larger than {max_bytes} bytes")
+                f.write(chunk)
+        content_type, extension = sniff_image_type(header)
+        if not content_type.startswith("image/"):
+            raise ValueError(f"Url {img_url} did not return a supported image")
+        image_path = tmp_path[:-len(".part")] + extension
+        os.replace(tmp_path, image_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    print(f"Image saved in path {image_path} ({size} bytes)")
+    return image_path
+
+
+class FileStream:
+    """
+    Re-iterable chunked reader for request bodies. Every iteration reopens the file,
+    so a retried request streams the whole file again instead of failing on a consumed generator.
+    """
+
+    def __init__(self, file_path, chunk_size=CHUNK_SIZE):
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+
+    def __len__(self):
+        return os.path.getsize(self.file_path)
+
+    def __iter__(self):
+        with open(self.file_path, "rb") as f:
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+
+def remove_file(file_path):
+    if file_path and os.path.exists(file_path):
+        try:
+            os.remove(file_path)
+        except OSError as e:
+            print(f"Could not remove {file_path}: {e}")
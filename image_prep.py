@@ -0,0 +1,194 @@
+import hashlib
+import os
+import threading
+import time
+from sqlite_store import SQLiteStore
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Pillow is optional, without it images are uploaded as downloaded and deduplicated by their raw bytes
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+# LinkedIn recommends 1200 x 627 for shared images, larger ones are downscaled by LinkedIn anyway
+IMAGE_MAX_WIDTH = int(os.getenv("IMAGE_MAX_WIDTH", "1200"))
+IMAGE_MAX_HEIGHT = int(os.getenv("IMAGE_MAX_HEIGHT", "1200"))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+# Perceptual hashes within this many bits are reported as near-duplicates. Assets are only reused on an exact
+# content hash match: different pictures with a similar layout can be this close.
+IMAGE_PHASH_DISTANCE = int(os.getenv("IMAGE_PHASH_DISTANCE", "4"))
+LINKEDIN_ASSET_TTL = int(os.getenv("LINKEDIN_ASSET_TTL", str(30 * 86400)))
+
+
+def normalize_image(image_path):
+    """
+    Downsize and recompress an image for LinkedIn. Animated GIFs are reduced to their first frame,
+    images with transparency stay PNG, everything else becomes a progressive JPEG.
+
+    Returns:
+        str: Path of the normalized image (image_path itself when it was already small enough or Pillow
+        is not installed). A new file is written next to the original, the caller deletes both.
+    """
+    if Image is None:
+        return image_path
+    with Image.open(image_path) as img:
+        img.seek(0)
+        frame = ImageOps.exif_transpose(img.copy())
+        source_format = img.format
+        animated = getattr(img, "is_animated", False)
+    has_alpha = frame.mode in ("RGBA", "LA") or (frame.mode == "P" and "transparency" in frame.info)
+    too_big = frame.width > IMAGE_MAX_WIDTH or frame.height > IMAGE_MAX_HEIGHT
+    if not too_big and not animated and source_format in ("JPEG", "PNG") and os.path.getsize(image_path) < 1024 * 1024:
+        return image_path
+    frame.thumbnail((IMAGE_MAX_WIDTH, IMAGE_MAX_HEIGHT), Image.LANCZOS)
+    base = os.path.splitext(image_path)[0]
+    if has_alpha:
+        output_path = f"{base}.normalized.png"
+        frame.convert("RGBA").save(output_path, "PNG", optimize=True)
+    else:
+        output_path = f"{base}.normalized.jpg"
+        frame.convert("RGB").save(output_path, "JPEG", quality=IMAGE_JPEG_QUALITY, optimize=True, progressive=True)
+    if os.path.getsize(output_path) >= os.path.getsize(image_path) and not too_big and not animated:
+        # Recompressing made it bigger, keep the original
+        os.remove(output_path)
+        return image_path
+    return output_path
+
+
+def perceptual_hash(image_path):
+    """64 bit difference hash (dHash), resized or recompressed copies of a picture hash to nearly the same value"""
+    if Image is None:
+        return None
+    with Image.open(image_path) as img:
+        img.seek(0)
+        pixels = list(img.convert("L").resize((9, 8), Image.LANCZOS).getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = value << 1 | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return value
+
+
+def content_hash(image_path):
+    digest = hashlib.sha256()
+    with open(image_path, "rb") as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _to_signed(value):
+    # SQLite integers are signed 64 bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+class AssetStore(SQLiteStore):
+    """
+    Maps image content hashes to LinkedIn asset URNs that were already uploaded, so a repeated hero image
+    skips both register_Image and upload_Image. Perceptual hashes are kept to count near-duplicate uploads.
+    Also keeps running totals of bytes saved by normalization and uploads avoided.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS linkedin_assets (
+        content_hash TEXT PRIMARY KEY,
+        phash INTEGER,
+        owner_urn TEXT NOT NULL,
+        asset_urn TEXT NOT NULL,
+        created_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS linkedin_assets_owner ON linkedin_assets (owner_urn);
+    CREATE TABLE IF NOT EXISTS image_stats (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    );
+    """
+
+    def __init__(self, path=None, max_distance=IMAGE_PHASH_DISTANCE, ttl=LINKEDIN_ASSET_TTL):
+        super().__init__(path)
+        self.max_distance = max_distance
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+    def find(self, image_hash, owner_urn):
+        row = self.connection().execute(
+            "SELECT asset_urn FROM linkedin_assets WHERE content_hash = ? AND owner_urn = ? AND created_at > ?",
+            (image_hash, owner_urn, time.time() - self.ttl),
+        ).fetchone()
+        return row["asset_urn"] if row else None
+
+    def find_similar(self, phash, owner_urn):
+        """Asset URN of a perceptually similar picture, for reporting only: it may well be a different image"""
+        if phash is None:
+            return None
+        for candidate in self.connection().execute(
+            "SELECT phash, asset_urn FROM linkedin_assets WHERE owner_urn = ? AND phash IS NOT NULL AND created_at > ?",
+            (owner_urn, time.time() - self.ttl),
+        ):
+            if bin(phash ^ (candidate["phash"] & ((1 << 64) - 1))).count("1") <= self.max_distance:
+                return candidate["asset_urn"]
+        return None
+
+    def add(self, image_hash, phash, owner_urn, asset_urn):
+        conn = self.connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO linkedin_assets (content_hash, phash, owner_urn, asset_urn, created_at) VALUES (?, ?, ?, ?, ?)",
+                (image_hash, None if phash is None else _to_signed(phash), owner_urn, asset_urn, time.time()),
+            )
+
+    def record(self, **increments):
+        conn = self.connection()
+        with conn:
+            for name, value in increments.items():
+                conn.execute(
+                    "INSERT INTO image_stats (name, value) VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET value = value + excluded.value",
+                    (name, value),
+                )
+
+    def stats(self):
+        return {row["name"]: row["value"] for row in self.connection().execute("SELECT name, value FROM image_stats")}
+
+
+asset_store = AssetStore()
+
+
+def prepare_and_upload(image_path, owner_urn, upload):
+    """
+    Normalize an image and return a LinkedIn asset URN for it, reusing a previous upload of the same picture
+
+    Args:
+        image_path (str): Downloaded image
+        owner_urn (str): LinkedIn owner URN, assets are only reused for the same owner
+        upload (callable): upload(path) -> asset URN or None, e.g. linkedin_post.upload_image_asset
+
+    Returns:
+        tuple: (asset URN or None, path of the normalized image)
+    """
+    original_size = os.path.getsize(image_path)
+    normalized_path = normalize_image(image_path)
+    normalized_size = os.path.getsize(normalized_path)
+    image_hash = content_hash(normalized_path)
+    phash = perceptual_hash(normalized_path)
+    if original_size > normalized_size:
+        asset_store.record(bytes_saved=original_size - normalized_size)
+        print(f"----------- Normalized image from {original_size} to {normalized_size} bytes")
+
+    asset_urn = asset_store.find(image_hash, owner_urn)
+    if asset_urn:
+        asset_store.record(uploads_avoided=1, upload_bytes_avoided=normalized_size)
+        print(f"----------- Reusing uploaded LinkedIn asset {asset_urn}")
+        return asset_urn, normalized_path
+    similar_urn = asset_store.find_similar(phash, owner_urn)
+    if similar_urn:
+        asset_store.record(near_duplicates=1)
+        print(f"----------- Image looks like LinkedIn asset {similar_urn}, uploading it anyway")
+
+    asset_urn = upload(normalized_path)
+    if asset_urn:
+        asset_store.add(image_hash, phash, owner_urn, asset_urn)
+        asset_store.record(uploads=1)
+    return asset_urn, normalized_path
@@ -0,0 +1,342 @@
+import os
+import threading
+import time
+import traceback
+import uuid
+import queue
+from collections import OrderedDict
+from coordination import coordination, INSTANCE_ID
+from dotenv import load_dotenv
+
+load_dotenv()
+
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "2"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "20"))
+JOB_HISTORY_SIZE = int(os.getenv("JOB_HISTORY_SIZE", "500"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_DELAY = float(os.getenv("JOB_RETRY_DELAY", "60"))
+# A replica that stops renewing its lease for this long is considered dead, its unfinished jobs are taken over
+JOB_LEASE_TTL = float(os.getenv("JOB_LEASE_TTL", "60"))
+
+
+_current = threading.local()
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while every queue slot is taken."""
+
+
+def current_job_id():
+    """Id of the job the calling worker thread is running, None outside of a job"""
+    return getattr(_current, "job_id", None)
+
+
+class JobQueue:
+    """
+    Bounded in-process job queue backed by a fixed pool of worker threads.
+
+    With a store (see job_store.py) every job is persisted under the process that owns it, and failed jobs
+    are retried after retry_delay up to max_attempts times. Each process holds a lease per queue (see
+    coordination.py) and renews it every lease_ttl / 3 seconds. Unfinished jobs whose owner's lease expired
+    (a crashed or stopped replica, or this host before a restart) are taken over atomically and queued again,
+    jobs of a replica that is still alive are left alone.
+
+    Args:
+        handler (callable): Function called with the job payload, its return value is stored as the job result
+        concurrency (int): Number of worker threads
+        max_size (int): Maximum number of jobs waiting to be picked up
+        history_size (int): Number of finished jobs kept for status lookups
+        name (str): Queue name the jobs are stored under
+        store (JobStore): Optional durable job store
+        max_attempts (int): Runs of a job before it is left failed
+        retry_delay (float): Seconds before a failed job runs again
+        lease_ttl (float): Seconds before the jobs of a replica that stopped renewing its lease are taken over
+    """
+
+    def __init__(self, handler, concurrency=WORKER_CONCURRENCY, max_size=JOB_QUEUE_SIZE, history_size=JOB_HISTORY_SIZE,
+                 name="jobs", store=None, max_attempts=JOB_MAX_ATTEMPTS, retry_delay=JOB_RETRY_DELAY,
+                 lease_ttl=JOB_LEASE_TTL):
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+        self.history_size = history_size
+        self.name = name
+        self.store = store
+        self.max_attempts = max(1, max_attempts)
+        self.retry_delay = retry_delay
+        self.lease_ttl = lease_ttl
+        self.owner = INSTANCE_ID
+        self._queue = queue.Queue(maxsize=max(1, max_size))
+        self._jobs = OrderedDict()
+        self._payloads = {}
+        self._lock = threading.Lock()
+        self._workers = []
+        self._timers = []
+        self._stop = threading.Event()
+        self._maintainer = None
+
+    def start(self):
+        if self._workers:
+            return
+        self._stop.clear()
+        for i in range(self.concurrency):
+            worker = threading.Thread(target=self._worker, name=f"{self.name}-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        if self.store is not None:
+            self._maintainer = threading.Thread(target=self._maintain, name=f"{self.name}-lease", daemon=True)
+            self._maintainer.start()
+
+    def _lease_name(self, owner):
+        return f"jobs:{self.name}:{owner}"
+
+    def _maintain(self):
+        while not self._stop.is_set():
+            try:
+                coordination.try_acquire(self._lease_name(self.owner), self.owner, self.lease_ttl)
+                self._recover()
+            except Exception as e:
+                print(f"Job lease renewal for {self.name} failed: {e}")
+            self._stop.wait(self.lease_ttl / 3)
+
+    def _recover(self):
+        """Take over the unfinished jobs of owners whose lease expired and queue them, as long as there is room"""
+        for job in self.store.unfinished(self.name):
+            previous_owner = job.pop("owner", None)
+            if previous_owner == self.owner:
+                continue
+            if previous_owner and coordination.holder(self._lease_name(previous_owner)):
+                continue
+            if self._queue.full():
+                # The rest is picked up by a later round, or by another replica
+                return
+            if not self.store.take_over(job["id"], previous_owner, self.owner):
+                continue
+            print(f"----------- Taking over {self.name} job {job['id']} from {previous_owner} ({job['status']}, {job['attempts']} attempts)")
+            payload = job.pop("payload")
+            job.update(status="queued", result=None, error=None)
+            with self._lock:
+                self._jobs[job["id"]] = job
+                self._payloads[job["id"]] = payload
+            try:
+                self._queue.put_nowait((job["id"], payload))
+            except queue.Full:
+                # Filled up by submit() meanwhile, left ownerless for whoever has room first
+                with self._lock:
+                    self._jobs.pop(job["id"], None)
+                    self._payloads.pop(job["id"], None)
+                self.store.update(job["id"], owner=None)
+                return
+
+    def stop(self, timeout=5):
+        """
+        Stop the workers after the jobs they are running, without waiting for the queued ones
+
+        Queued jobs and pending retries stay in the store, the lease is released once the workers are done
+        so other replicas take them over right away.
+        """
+        self._stop.set()
+        if self._maintainer is not None:
+            self._maintainer.join(timeout)
+            self._maintainer = None
+        for timer in self._timers:
+            timer.cancel()
+        self._timers = []
+        # Waiting jobs are not run here, they stay queued in the store for the other replicas (or the next start)
+        self._drain()
+        try:
+            # One wake-up is enough, every worker passes it on before it exits
+            self._queue.put_nowait(None)
+        except queue.Full:
+            # Refilled by a late submit, the workers wake up on those jobs instead
+            pass
+        for worker in self._workers:
+            worker.join(timeout)
+        self._drain()
+        if self.store is not None and not any(worker.is_alive() for worker in self._workers):
+            # Nothing runs here anymore, the jobs left queued or retrying are taken over by the other replicas right away
+            coordination.release(self._lease_name(self.owner), self.owner)
+        self._workers = []
+
+    def _drain(self):
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                return
+            self._queue.task_done()
+
+    def submit(self, payload, job_id=None):
+        """
+        Queue a payload for processing without waiting for it to run
+
+        Submitting a job_id that already exists does not run it twice: a queued, running or succeeded job is
+        left as it is and a failed one is retried (see retry()).
+
+        Returns:
+            str: The job id, usable with get()
+
+        Raises:
+            QueueFullError: If the queue has no free slot
+        """
+        if job_id is None:
+            job_id = uuid.uuid4().hex
+        else:
+            existing = self.get(job_id)
+            if existing is not None:
+                if existing["status"] == "failed":
+                    self.retry(job_id)
+                return job_id
+        job = {
+            "id": job_id,
+            "status": "queued",
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+            "attempts": 0,
+        }
+        with self._lock:
+            if job_id in self._jobs:
+                # Submitted by another thread meanwhile
+                return job_id
+            self._jobs[job_id] = job
+            self._payloads[job_id] = payload
+            self._trim_history()
+        if self.store is not None and not self.store.add(self.name, dict(job, payload=payload), self.owner):
+            # Submitted by another replica meanwhile, it owns the job
+            with self._lock:
+                self._jobs.pop(job_id, None)
+                self._payloads.pop(job_id, None)
+            return job_id
+        try:
+            self._queue.put_nowait((job_id, payload))
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(job_id, None)
+                self._payloads.pop(job_id, None)
+            if self.store is not None:
+                # The row was inserted above, never one of an earlier submit
+                self.store.delete(job_id)
+            raise QueueFullError(f"Job queue is full ({self._queue.maxsize} jobs waiting)")
+        return job_id
+
+    def retry(self, job_id):
+        """
+        Queue a failed job again, it resumes from the checkpoints its earlier runs left and gets max_attempts
+        runs (with automatic retries) of its own
+
+        Returns:
+            bool: False if the job is unknown or not failed
+
+        Raises:
+            QueueFullError: If the queue has no free slot
+        """
+        job = self.get(job_id)
+        if job is None or job["status"] != "failed":
+            return False
+        with self._lock:
+            payload = self._payloads.get(job_id)
+        if payload is None and self.store is not None:
+            payload = self.store.get(job_id, self.name)["payload"]
+        if payload is None:
+            return False
+        with self._lock:
+            self._jobs.setdefault(job_id, job)
+            self._payloads[job_id] = payload
+        self._update(job_id, status="queued", error=None, finished_at=None, attempts=0)
+        if self.store is not None:
+            self.store.update(job_id, owner=self.owner)
+        try:
+            self._queue.put_nowait((job_id, payload))
+        except queue.Full:
+            self._update(job_id, status="failed", error=job["error"], finished_at=job["finished_at"], attempts=job["attempts"])
+            raise QueueFullError(f"Job queue is full ({self._queue.maxsize} jobs waiting)")
+        return True
+
+    def free_slots(self):
+        """Number of jobs that can be submitted right now without a QueueFullError (racy, a hint for batching)"""
+        return self._queue.maxsize - self._queue.qsize()
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                return dict(job)
+        # Jobs from before a restart, or trimmed from the in-memory history
+        if self.store is not None:
+            job = self.store.get(job_id, self.name)
+            if job:
+                job.pop("payload")
+                job.pop("queue")
+                return job
+        return None
+
+    def stats(self):
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if job["status"] == "running")
+            retrying = sum(1 for job in self._jobs.values() if job["status"] == "retrying")
+        return {
+            "queued": self._queue.qsize(),
+            "running": running,
+            "retrying": retrying,
+            "capacity": self._queue.maxsize,
+            "workers": len(self._workers),
+        }
+
+    def _trim_history(self):
+        # Only finished jobs are dropped, queued and running ones must stay visible
+        excess = len(self._jobs) - self.history_size
+        if excess <= 0:
+            return
+        for job_id in [k for k, v in self._jobs.items() if v["finished_at"] is not None][:excess]:
+            del self._jobs[job_id]
+            self._payloads.pop(job_id, None)
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+        if self.store is not None:
+            self.store.update(job_id, **fields)
+
+    def _requeue(self, job_id, payload):
+        if self._stop.is_set():
+            return
+        self._update(job_id, status="queued")
+        self._queue.put((job_id, payload))
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None or self._stop.is_set():
+                # A job taken after stop() stays queued in the store like the ones stop() drained
+                self._queue.task_done()
+                try:
+                    self._queue.put_nowait(None)
+                except queue.Full:
+                    # Jobs submitted meanwhile wake the remaining workers instead
+                    pass
+                return
+            job_id, payload = item
+            with self._lock:
+                attempts = self._jobs[job_id]["attempts"] + 1 if job_id in self._jobs else 1
+            self._update(job_id, status="running", started_at=time.time(), attempts=attempts)
+            _current.job_id = job_id
+            try:
+                result = self.handler(payload)
+                self._update(job_id, status="succeeded", result=result, error=None, finished_at=time.time())
+            except Exception as e:
+                traceback.print_exc()
+                if self.store is not None and attempts < self.max_attempts:
+                    print(f"----------- Job {job_id} failed (attempt {attempts}/{self.max_attempts}), retrying in {self.retry_delay}s")
+                    self._update(job_id, status="retrying", error=str(e))
+                    timer = threading.Timer(self.retry_delay, self._requeue, (job_id, payload))
+                    timer.daemon = True
+                    timer.start()
+                    self._timers = [t for t in self._timers if t.is_alive()] + [timer]
+                else:
+                    self._update(job_id, status="failed", error=str(e), finished_at=time.time())
+            finally:
+                _current.job_id = None
+                self._queue.task_done()
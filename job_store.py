@@ -0,0 +1,173 @@
+import json
+import os
+import time
+from sqlite_store import SQLiteStore
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Finished jobs and their checkpoints are pruned after this many seconds
+JOB_RETENTION = int(os.getenv("JOB_RETENTION", str(7 * 86400)))
+
+UNFINISHED = ("queued", "running", "retrying")
+
+
+class JobStore(SQLiteStore):
+    """
+    Durable record of queued jobs and of the stage outputs (checkpoints) of the work they do.
+
+    JobQueue writes every job and status change here, so jobs that were queued or running when the process
+    died are picked up again. Every job records the process that owns it (coordination.INSTANCE_ID), another
+    process only takes it over once that owner's lease has expired, see JobQueue. Checkpoints are keyed by a scope (e.g. "message:<gmail id>")
+    and a stage name, a retried or resumed run reads them to skip the stages that already completed.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        queue TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        status TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        created_at REAL NOT NULL,
+        started_at REAL,
+        finished_at REAL,
+        result TEXT,
+        error TEXT,
+        owner TEXT
+    );
+    CREATE INDEX IF NOT EXISTS jobs_queue_status ON jobs (queue, status, created_at);
+    CREATE TABLE IF NOT EXISTS checkpoints (
+        scope TEXT NOT NULL,
+        stage TEXT NOT NULL,
+        value TEXT NOT NULL,
+        updated_at REAL NOT NULL,
+        PRIMARY KEY (scope, stage)
+    );
+    """
+
+    def __init__(self, path=None):
+        super().__init__(path)
+        self.add_column("jobs", "owner", "TEXT")
+
+    def add(self, queue_name, job, owner=None):
+        """
+        Insert a new job, an existing job with the same id is left untouched
+
+        Returns:
+            bool: False if the id was already taken
+        """
+        conn = self.connection()
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO jobs (id, queue, payload, status, created_at, owner) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (id) DO NOTHING",
+                (job["id"], queue_name, json.dumps(job["payload"]), job["status"], job["created_at"], owner),
+            )
+        return cursor.rowcount == 1
+
+    def take_over(self, job_id, previous_owner, owner):
+        """
+        Move an unfinished job from previous_owner to owner and mark it queued
+
+        Returns:
+            bool: False if the job finished or changed hands since previous_owner was read
+        """
+        conn = self.connection()
+        with conn:
+            cursor = conn.execute(
+                f"UPDATE jobs SET owner = ?, status = 'queued' WHERE id = ? AND owner IS ? "
+                f"AND status IN ({', '.join('?' * len(UNFINISHED))})",
+                (owner, job_id, previous_owner, *UNFINISHED),
+            )
+        return cursor.rowcount == 1
+
+    def update(self, job_id, **fields):
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"])
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        conn = self.connection()
+        with conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def delete(self, job_id):
+        conn = self.connection()
+        with conn:
+            conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def get(self, job_id, queue_name=None):
+        row = self.connection().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None or (queue_name and row["queue"] != queue_name):
+            return None
+        return self._to_job(row)
+
+    def unfinished(self, queue_name):
+        """Jobs of a queue that never finished (queued, running or waiting for a retry by any owner), oldest first"""
+        rows = self.connection().execute(
+            f"SELECT * FROM jobs WHERE queue = ? AND status IN ({', '.join('?' * len(UNFINISHED))}) ORDER BY created_at",
+            (queue_name, *UNFINISHED),
+        )
+        return [self._to_job(row) for row in rows]
+
+    @staticmethod
+    def _to_job(row):
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def checkpoint(self, scope, stage):
+        row = self.connection().execute("SELECT value FROM checkpoints WHERE scope = ? AND stage = ?", (scope, stage)).fetchone()
+        return json.loads(row["value"]) if row else None
+
+    def save_checkpoint(self, scope, stage, value):
+        conn = self.connection()
+        with conn:
+            conn.execute(
+                "INSERT INTO checkpoints (scope, stage, value, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (scope, stage) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at",
+                (scope, stage, json.dumps(value), time.time()),
+            )
+
+    def stages(self, scope):
+        return [row["stage"] for row in self.connection().execute("SELECT stage FROM checkpoints WHERE scope = ?", (scope,))]
+
+    def clear_checkpoints(self, scope):
+        conn = self.connection()
+        with conn:
+            conn.execute("DELETE FROM checkpoints WHERE scope = ?", (scope,))
+
+    def checkpoints(self, scope):
+        return Checkpoints(self, scope)
+
+    def prune(self, older_than=JOB_RETENTION):
+        cutoff = time.time() - older_than
+        conn = self.connection()
+        with conn:
+            conn.execute(f"DELETE FROM jobs WHERE finished_at < ? AND status NOT IN ({', '.join('?' * len(UNFINISHED))})",
+                         (cutoff, *UNFINISHED))
+            conn.execute("DELETE FROM checkpoints WHERE updated_at < ?", (cutoff,))
+
+
+class Checkpoints:
+    """Stage outputs of one scope, see JobStore"""
+
+    def __init__(self, store, scope):
+        self.store = store
+        self.scope = scope
+
+    def get(self, stage):
+        return self.store.checkpoint(self.scope, stage)
+
+    def set(self, stage, value):
+        self.store.save_checkpoint(self.scope, stage, value)
+        return value
+
+    def stages(self):
+        return self.store.stages(self.scope)
+
+    def clear(self):
+        self.store.clear_checkpoints(self.scope)
+
+
+job_store = JobStore()
@@ -0,0 +1,150 @@
+import re
+
+# LinkedIn has no markdown, emphasis is faked with the Mathematical Sans-Serif Unicode blocks.
+# The translate tables are built once at import.
+UPPER = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+LOWER = "abcdefghijklmnopqrstuvwxyz"
+DIGITS = "0123456789"
+
+
+def _table(upper_start, lower_start, digit_start=None):
+    mapping = {}
+    for i, char in enumerate(UPPER):
+        mapping[char] = chr(upper_start + i)
+    for i, char in enumerate(LOWER):
+        mapping[char] = chr(lower_start + i)
+    if digit_start is not None:
+        for i, char in enumerate(DIGITS):
+            mapping[char] = chr(digit_start + i)
+    return str.maketrans(mapping)
+
+
+BOLD = _table(0x1D5D4, 0x1D5EE, 0x1D7EC)
+ITALIC = _table(0x1D608, 0x1D622)
+BOLD_ITALIC = _table(0x1D63C, 0x1D656, 0x1D7EC)
+
+# Every alternative starts with a literal character (the lookbehinds come after it), which lets the regex
+# engine jump straight to candidate positions instead of trying every alternative at every character.
+INLINE_PATTERN = (
+    r"\*\*\*(?P<bold_italic>[^\n]+?)\*\*\*"
+    r"|\*\*(?P<bold>[^\n]+?)\*\*"
+    r"|__(?<!\w__)(?P<bold_u>[^\n]+?)__(?!\w)"
+    r"|\*(?<![*\w]\*)(?![\s*])(?P<italic>[^*\n]+?)(?<!\s)\*(?!\*)"
+    r"|_(?<![_\w]_)(?![\s_])(?P<italic_u>[^_\n]+?)(?<!\s)_(?![_\w])"
+    r"|\[(?P<link_text>[^\]\n]+)\]\((?P<link_url>[^)\s]+)\)"
+)
+# Block markers match the newline in front of a line (format_text() prepends one for the first line),
+# so headings, bullets, numbered items and inline emphasis are all tokenized by a single sub() call
+TOKEN_RE = re.compile(
+    r"\n[ ]{0,3}#{1,6}[ \t]+(?P<heading>[^\n]*?)[ \t]*#*[ \t]*(?=\n|$)"
+    r"|\n(?P<bullet>[ \t]*)[*\-+][ \t]+"
+    r"|\n(?P<number_indent>[ \t]*)(?P<number>\d{1,3})[.)][ \t]+"
+    r"|" + INLINE_PATTERN
+)
+INLINE_RE = re.compile(INLINE_PATTERN)
+THINK_END = "</think>"
+
+
+def _emphasis(text, table):
+    # Emphasis nested inside emphasis (e.g. *italic* inside **bold**) is upgraded to bold italic
+    def nested(match):
+        if match.lastgroup == "link_url":
+            return _token(match)
+        return match.group(match.lastgroup).translate(BOLD_ITALIC)
+    return INLINE_RE.sub(nested, text).translate(table)
+
+
+def _token(match):
+    kind = match.lastgroup
+    if kind == "bold_italic":
+        return match.group(kind).translate(BOLD_ITALIC)
+    if kind == "heading":
+        return "\n" + _emphasis(match.group(kind), BOLD)
+    if kind in ("bold", "bold_u"):
+        return _emphasis(match.group(kind), BOLD)
+    if kind in ("italic", "italic_u"):
+        return _emphasis(match.group(kind), ITALIC)
+    if kind == "bullet":
+        return "\n" + match.group(kind) + "• "
+    if kind == "number":
+        return "\n" + match.group("number_indent") + match.group(kind).translate(BOLD) + ". "
+    # Links cannot be clickable inside a post, keep the text and show the url after it
+    text, url = match.group("link_text"), match.group("link_url")
+    return url if text == url else f"{text} ({url})"
+
+
+def format_text(text):
+    """Convert complete lines of markdown to LinkedIn text"""
+    return TOKEN_RE.sub(_token, "\n" + text)[1:]
+
+
+def strip_reasoning(text):
+    """Drop a leading <think>...</think> block emitted by reasoning models"""
+    if "<think>" in text:
+        text = text.split(THINK_END)[-1]
+    return text
+
+
+def format_post(text):
+    """
+    Convert markdown-style formatting to LinkedIn-compatible Unicode characters in a single tokenizer pass:
+    **bold** / __bold__, *italic* / _italic_, ***bold italic*** and nested emphasis, # headings,
+    [links](url), "*"/"-" bullets and numbered lists.
+    """
+    return format_text(strip_reasoning(text).replace('\\n', '\n'))
+
+
+def strip_reasoning_stream(chunks):
+    """
+    Drop a leading <think>...</think> block from streamed LLM output as it arrives, even when a tag is split
+    across chunks. Only the tail of the reasoning is buffered, so a long think block never piles up in memory.
+
+    Yields:
+        str: Answer text chunks
+    """
+    buffer = ""
+    in_reasoning = None
+    after_reasoning = False
+    for chunk in chunks:
+        buffer += chunk
+        if in_reasoning is None:
+            stripped = buffer.lstrip()
+            if len(stripped) < len("<think>") and "<think>".startswith(stripped):
+                continue
+            in_reasoning = stripped.startswith("<think>")
+        if in_reasoning:
+            if THINK_END not in buffer:
+                buffer = buffer[-len(THINK_END):]
+                continue
+            buffer = buffer.split(THINK_END, 1)[1]
+            in_reasoning = False
+            after_reasoning = True
+        if after_reasoning:
+            # The blank lines between the reasoning and the answer may arrive in separate chunks
+            buffer = buffer.lstrip("\n")
+            after_reasoning = not buffer
+        if buffer:
+            yield buffer
+            buffer = ""
+    if buffer and not in_reasoning:
+        yield buffer
+
+
+def format_stream(chunks):
+    """
+    Format streamed LLM output incrementally, reasoning is dropped by strip_reasoning_stream() first.
+
+    Args:
+        chunks (iterable): Text chunks as they arrive from the model
+
+    Yields:
+        str: Formatted text, one or more complete lines at a time (the last line when the stream ends)
+    """
+    buffer = ""
+    for chunk in strip_reasoning_stream(chunks):
+        buffer = (buffer + chunk).replace('\\n', '\n')
+        if "\n" in buffer:
+            complete, buffer = buffer.rsplit("\n", 1)
+            yield format_text(complete) + "\n"
+    if buffer:
+        yield format_text(buffer)
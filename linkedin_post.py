@@ -1,13 +1,18 @@
-import requests
 import json
+import http_client
+import rate_limiter
+from http_client import HTTPError
 from dotenv import load_dotenv
 import os
-import re
+from linkedin_formatter import format_post
+from image_io import FileStream, sniff_file_type
 
 load_dotenv()
 
 linkedin_access_token = os.getenv("LINKEDIN_ACCESS_TOKEN")
 linkedin_owner_urn = os.getenv("LINKEDIN_OWNER_URN")
+LINKEDIN_API_BASE = os.getenv("LINKEDIN_API_BASE", "https://api.linkedin.com/v2")
+rate_limiter.register_host(LINKEDIN_API_BASE, "linkedin")
 
 
 def register_Image(access_token, owner_urn=linkedin_owner_urn):
@@ -22,7 +27,7 @@ def register_Image(access_token, owner_urn=linkedin_owner_urn):
         tuple: (asset, upload_url) if successful, (None, None) if failed
     """
     
-    url = "https://api.linkedin.com/v2/assets?action=registerUpload"
+    url = f"{LINKEDIN_API_BASE}/assets?action=registerUpload"
     
     headers = {
         "Authorization": f"Bearer {access_token}",
@@ -45,7 +50,7 @@ def register_Image(access_token, owner_urn=linkedin_owner_urn):
     }
     
     try:
-        response = requests.post(url, headers=headers, json=body)
+        response = http_client.post(url, headers=headers, json=body)
         response.raise_for_status()  # Raises an HTTPError for bad responses
         
         response_data = response.json()
@@ -56,7 +61,7 @@ def register_Image(access_token, owner_urn=linkedin_owner_urn):
         
         return asset, upload_url
         
-    except requests.exceptions.RequestException as e:
+    except HTTPError as e:
         print(f"Request failed: {e}")
         return None, None
     except KeyError as e:
@@ -84,7 +89,7 @@ def upload_Image(upload_url, access_token, file_path):
         print(f"Error: File not found at path: {file_path}")
         return None
     
-    # Determine content type based on file extension
+    # Determine content type from the file's magic bytes, the extension is only a fallback
     file_extension = os.path.splitext(file_path)[1].lower()
     content_type_map = {
         '.jpg': 'image/jpeg',
@@ -95,20 +100,20 @@ def upload_Image(upload_url, access_token, file_path):
         '.webp': 'image/webp'
     }
     
-    content_type = content_type_map.get(file_extension, 'application/octet-stream')
-    
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": content_type
-    }
-    
     try:
-        # Read the image file in binary mode
-        with open(file_path, 'rb') as image_file:
-            image_data = image_file.read()
+        content_type, _ = sniff_file_type(file_path)
+        if content_type == 'application/octet-stream':
+            content_type = content_type_map.get(file_extension, content_type)
+        
+        body = FileStream(file_path)
+        headers = {
+            "Authorization": f"Bearer {access_token}",
+            "Content-Type": content_type,
+            "Content-Length": str(len(body))
+        }
         
-        # Make PUT request to upload the image
-        response = requests.put(upload_url, headers=headers, data=image_data)
+        # Stream the file in chunks instead of reading it into memory
+        response = http_client.put(upload_url, headers=headers, content=body)
         
         # Return the status code
         return response.status_code
@@ -119,7 +124,7 @@ def upload_Image(upload_url, access_token, file_path):
     except PermissionError:
         print(f"Error: Permission denied accessing file: {file_path}")
         return None
-    except requests.exceptions.RequestException as e:
+    except HTTPError as e:
         print(f"Upload request failed: {e}")
         return None
     except Exception as e:
@@ -128,11 +133,11 @@ def upload_Image(upload_url, access_token, file_path):
 
 def create_post(access_token, asset_urn, post_text, media_title, media_description, owner_urn=linkedin_owner_urn):
     """
-    Create a LinkedIn UGC post with an image
+    Create a LinkedIn UGC post with an image, or a text-only post when asset_urn is None
     
     Args:
         access_token (str): LinkedIn API access token
-        asset_urn (str): The asset URN from register_Image() function
+        asset_urn (str): The asset URN from register_Image() function, None for a text-only post
         post_text (str): The text content of the post
         media_title (str): Title for the media (optional)
         media_description (str): Description for the media (optional)
@@ -142,7 +147,7 @@ def create_post(access_token, asset_urn, post_text, media_title, media_descripti
         dict: Full response from LinkedIn API, or None if failed
     """
     
-    url = "https://api.linkedin.com/v2/ugcPosts"
+    url = f"{LINKEDIN_API_BASE}/ugcPosts"
     
     headers = {
         "Authorization": f"Bearer {access_token}",
@@ -177,15 +182,19 @@ def create_post(access_token, asset_urn, post_text, media_title, media_descripti
             "com.linkedin.ugc.MemberNetworkVisibility": "PUBLIC"
         }
     }
+    if asset_urn is None:
+        share_content = body["specificContent"]["com.linkedin.ugc.ShareContent"]
+        share_content["shareMediaCategory"] = "NONE"
+        del share_content["media"]
     
     try:
-        response = requests.post(url, headers=headers, json=body)
+        response = http_client.post(url, headers=headers, json=body)
         response.raise_for_status()  # Raises an HTTPError for bad responses
         
         response_data = response.json()
         return response_data
         
-    except requests.exceptions.RequestException as e:
+    except HTTPError as e:
         print(f"Request failed: {e}")
         if hasattr(e, 'response') and e.response is not None:
             print(f"Response status code: {e.response.status_code}")
@@ -195,21 +204,17 @@ def create_post(access_token, asset_urn, post_text, media_title, media_descripti
         print(f"Failed to parse JSON response: {e}")
         return None
 
-# Complete workflow function that combines all three steps
-def post_to_linkedin(access_token, image_path, post_text, media_title="LinkedIn Post", media_description="Posted via linkedin", owner_urn=linkedin_owner_urn):
+def upload_image_asset(access_token, image_path, owner_urn=linkedin_owner_urn):
     """
-    Complete workflow to post an image to LinkedIn
+    Register an image upload and upload the image, i.e. everything needed before create_post()
     
     Args:
         access_token (str): LinkedIn API access token
         image_path (str): Path to the image file
-        post_text (str): Text content for the post
-        media_title (str): Title for the image
-        media_description (str): Description for the image
-        author_urn (str): Author URN
+        owner_urn (str): Owner URN
     
     Returns:
-        dict: Response from the post creation, or None if any step failed
+        str: The asset URN, or None if any step failed
     """
     
     print("Step 1: Registering image upload...")
@@ -226,6 +231,30 @@ def post_to_linkedin(access_token, image_path, post_text, media_title="LinkedIn
         print(f"Failed to upload image. Status code: {status_code}")
         return None
     
+    return asset_urn
+
+# Complete workflow function that combines all three steps
+def post_to_linkedin(access_token, image_path, post_text, media_title="LinkedIn Post", media_description="Posted via linkedin", owner_urn=linkedin_owner_urn):
+    """
+    Complete workflow to post an image to LinkedIn
+    
+    Args:
+        access_token (str): LinkedIn API access token
+        image_path (str): Path to the image file
+        post_text (str): Text content for the post
+        media_title (str): Title for the image
+        media_description (str): Description for the image
+        author_urn (str): Author URN
+    
+    Returns:
+        dict: Response from the post creation, or None if any step failed
+    """
+    
+    asset_urn = upload_image_asset(access_token, image_path, owner_urn)
+    
+    if not asset_urn:
+        return None
+    
     print("Step 3: Creating LinkedIn post...")
     response = create_post(access_token, asset_urn, post_text, media_title, media_description, owner_urn)
     
@@ -240,50 +269,4 @@ def markdown_to_linkedin_unicode(text):
     """
     Convert markdown-style formatting to LinkedIn-compatible Unicode characters
     """
-    
-    # Unicode character mappings for bold sans-serif
-    bold_map = {
-        'A': '𝗔', 'B': '𝗕', 'C': '𝗖', 'D': '𝗗', 'E': '𝗘', 'F': '𝗙', 'G': '𝗚', 'H': '𝗛', 'I': '𝗜', 'J': '𝗝',
-        'K': '𝗞', 'L': '𝗟', 'M': '𝗠', 'N': '𝗡', 'O': '𝗢', 'P': '𝗣', 'Q': '𝗤', 'R': '𝗥', 'S': '𝗦', 'T': '𝗧',
-        'U': '𝗨', 'V': '𝗩', 'W': '𝗪', 'X': '𝗫', 'Y': '𝗬', 'Z': '𝗭',
-        'a': '𝗮', 'b': '𝗯', 'c': '𝗰', 'd': '𝗱', 'e': '𝗲', 'f': '𝗳', 'g': '𝗴', 'h': '𝗵', 'i': '𝗶', 'j': '𝗷',
-        'k': '𝗸', 'l': '𝗹', 'm': '𝗺', 'n': '𝗻', 'o': '𝗼', 'p': '𝗽', 'q': '𝗾', 'r': '𝗿', 's': '𝘀', 't': '𝘁',
-        'u': '𝘂', 'v': '𝘃', 'w': '𝘄', 'x': '𝘅', 'y': '𝘆', 'z': '𝘇',
-        '0': '𝟬', '1': '𝟭', '2': '𝟮', '3': '𝟯', '4': '𝟰', '5': '𝟱', '6': '𝟲', '7': '𝟳', '8': '𝟴', '9': '𝟵'
-    }
-    
-    # Unicode character mappings for italic sans-serif  
-    italic_map = {
-        'A': '𝘈', 'B': '𝘉', 'C': '𝘊', 'D': '𝘋', 'E': '𝘌', 'F': '𝘍', 'G': '𝘎', 'H': '𝘏', 'I': '𝘐', 'J': '𝘑',
-        'K': '𝘒', 'L': '𝘓', 'M': '𝘔', 'N': '𝘕', 'O': '𝘖', 'P': '𝘗', 'Q': '𝘘', 'R': '𝘙', 'S': '𝘚', 'T': '𝘛',
-        'U': '𝘜', 'V': '𝘝', 'W': '𝘞', 'X': '𝘟', 'Y': '𝘠', 'Z': '𝘡',
-        'a': '𝘢', 'b': '𝘣', 'c': '𝘤', 'd': '𝘥', 'e': '𝘦', 'f': '𝘧', 'g': '𝘨', 'h': '𝘩', 'i': '𝘪', 'j': '𝘫',
-        'k': '𝘬', 'l': '𝘭', 'm': '𝘮', 'n': '𝘯', 'o': '𝘰', 'p': '𝘱', 'q': '𝘲', 'r': '𝘳', 's': '𝘴', 't': '𝘵',
-        'u': '𝘶', 'v': '𝘷', 'w': '𝘸', 'x': '𝘹', 'y': '𝘺', 'z': '𝘻'
-    }
-    
-    def convert_to_bold(match):
-        text_inside = match.group(1)
-        return ''.join(bold_map.get(char, char) for char in text_inside)
-    
-    def convert_to_italic(match):
-        text_inside = match.group(1) 
-        return ''.join(italic_map.get(char, char) for char in text_inside)
-    
-    # Convert **bold** to Unicode bold
-    if "<think>" in text:
-        text = text.split("</think>")[-1]
-        
-    text = re.sub(r'\*\*(.*?)\*\*', convert_to_bold, text)
-    
-    # Convert *italic* to Unicode italic 
-    text = re.sub(r'(?<!\*)\*([^*]+?)\*(?!\*)', convert_to_italic, text)
-    
-    # Convert bullet points
-    text = re.sub(r'^\* ', '• ', text, flags=re.MULTILINE)
-    text = re.sub(r'\n\* ', '\n• ', text)
-    
-    # Handle line breaks
-    text = text.replace('\\n', '\n')
-    
-    return text
\ No newline at end of file
+    return format_post(text)
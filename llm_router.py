@@ -0,0 +1,234 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import metrics
+import rate_limiter
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Ordered OpenAI-compatible providers, the first one is the primary. Each reads LLM_<NAME>_BASE_URL, _API_KEY,
+# _MODEL and _REASONING (see my_crew.REASONING_PARAMS), groq defaults to the GROQ_* settings.
+LLM_PROVIDERS = [name.strip() for name in os.getenv("LLM_PROVIDERS", "groq").split(",") if name.strip()]
+LLM_HEDGING = os.getenv("LLM_HEDGING", "true").lower() == "true"
+# A hedge goes to the next provider once a call took longer than the provider's recent p95 latency,
+# clamped to these bounds. Until a provider has LLM_HEDGE_MIN_SAMPLES latencies the default delay applies.
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "2"))
+LLM_HEDGE_MAX_DELAY = float(os.getenv("LLM_HEDGE_MAX_DELAY", "60"))
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "20"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+# A call that takes longer counts as failed and fails over to the next provider
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "120"))
+# A provider that failed is tried after the healthy ones for this many seconds
+LLM_FAILOVER_COOLDOWN = float(os.getenv("LLM_FAILOVER_COOLDOWN", "60"))
+LLM_ROUTER_THREADS = int(os.getenv("LLM_ROUTER_THREADS", "16"))
+
+
+class CallCancelled(Exception):
+    """Raised inside a hedged call whose race was already decided before it got a rate limit slot"""
+
+
+class LatencyTracker:
+    """Latencies of a provider's recent successful calls"""
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def __len__(self):
+        return len(self._samples)
+
+
+class Provider:
+    """
+    One OpenAI-compatible endpoint the router can send a call to, with its latency and health shared by all callers.
+
+    Args:
+        name (str): Provider name, used for rate limits, metrics and LLM_<NAME>_* settings
+        settings (dict): base_url, api_key, model and reasoning, see provider_settings
+    """
+
+    def __init__(self, name, settings):
+        self.name = name
+        self.settings = settings
+        self.api_key = settings.get("api_key")
+        self.latencies = LatencyTracker()
+        self.failed_until = 0.0
+
+    def hedge_delay(self):
+        if len(self.latencies) < LLM_HEDGE_MIN_SAMPLES:
+            delay = LLM_HEDGE_DEFAULT_DELAY
+        else:
+            delay = min(LLM_HEDGE_MAX_DELAY, max(LLM_HEDGE_MIN_DELAY, self.latencies.quantile(0.95)))
+        return delay
+
+    @property
+    def healthy(self):
+        return time.monotonic() >= self.failed_until
+
+
+def provider_settings(name, defaults=None):
+    """
+    Returns:
+        dict: base_url, api_key, model and reasoning of a provider, from LLM_<NAME>_* falling back to defaults
+    """
+    settings = dict(defaults or {})
+    for field in ("base_url", "api_key", "model", "reasoning"):
+        value = os.getenv(f"LLM_{name.upper()}_{field.upper()}")
+        if value:
+            settings[field] = value
+    return settings
+
+
+def load_providers(names=LLM_PROVIDERS, defaults=None):
+    """
+    Args:
+        defaults (dict): Provider name -> settings used where no LLM_<NAME>_* variable is set,
+            the "*" entry applies to every provider
+
+    Returns:
+        list: Provider objects in order, each base_url rate limited under the provider's name
+    """
+    defaults = defaults or {}
+    providers = []
+    for name in names:
+        settings = provider_settings(name, {**defaults.get("*", {}), **defaults.get(name, {})})
+        if settings.get("base_url"):
+            rate_limiter.register_host(settings["base_url"], name)
+        providers.append(Provider(name, settings))
+    return providers
+
+
+class LLMRouter:
+    """
+    Sends a call to an ordered list of providers with hedging and failover.
+
+    Callers bring their own client per provider (the crew's LLMs are not shared between crews), the router
+    only decides where and when a call goes.
+
+    The call goes to the first healthy provider. If it has not answered after that provider's hedge delay
+    (its recent p95 latency), the same call is also sent to the next provider and the first answer wins.
+    A provider that errors or times out is marked unhealthy for LLM_FAILOVER_COOLDOWN and the call moves on
+    to the next one right away. The loser of a race is cancelled if it is still waiting for a rate limit
+    slot, a request already in flight cannot be interrupted and its answer is dropped.
+
+    Args:
+        providers (list): Provider objects in order of preference
+        hedging (bool): Whether to hedge, failover on errors happens either way
+    """
+
+    def __init__(self, providers, hedging=LLM_HEDGING, timeout=LLM_REQUEST_TIMEOUT, cooldown=LLM_FAILOVER_COOLDOWN):
+        self.providers = providers
+        self.hedging = hedging and len(providers) > 1
+        self.timeout = timeout
+        self.cooldown = cooldown
+        self._executor = ThreadPoolExecutor(max_workers=LLM_ROUTER_THREADS, thread_name_prefix="llm")
+
+    def _order(self):
+        # Stable sort, healthy providers first in their configured order
+        return sorted(self.providers, key=lambda provider: not provider.healthy)
+
+    def _attempt(self, provider, client, cancelled, args, kwargs):
+        def send():
+            if cancelled.is_set():
+                raise CallCancelled(provider.name)
+            # Timed from here, the wait for a rate limit slot is not the provider's latency
+            started = time.perf_counter()
+            result = client.call(*args, **kwargs)
+            return result, time.perf_counter() - started
+
+        return rate_limiter.limiter_for(provider.name, provider.api_key).call(send)
+
+    def call(self, clients, *args, hedge=True, **kwargs):
+        """
+        Call the providers' clients with args and kwargs until one succeeds
+
+        Args:
+            clients (dict): Provider name -> object whose call(*args, **kwargs) talks to that provider
+            hedge (bool): False for calls that must not run twice (e.g. ones executing tools)
+
+        Raises:
+            Exception: The last provider's error when every provider failed
+        """
+        pending = list(self._order())
+        cancelled = threading.Event()
+        in_flight = {}
+        last_error = None
+        hedge_at = None
+
+        def launch(reason):
+            nonlocal hedge_at
+            provider = pending.pop(0)
+            if reason != "primary":
+                metrics.observe_llm_route(provider.name, reason)
+            future = self._executor.submit(self._attempt, provider, clients[provider.name], cancelled, args, kwargs)
+            in_flight[future] = (provider, time.monotonic())
+            # Decided once per launch: a hedge only follows a lone attempt while another provider is left
+            hedge_at = None
+            if self.hedging and hedge and pending and len(in_flight) == 1:
+                delay = provider.hedge_delay()
+                metrics.observe_llm_hedge_delay(provider.name, delay)
+                hedge_at = in_flight[future][1] + delay
+            return provider
+
+        launch("primary")
+        try:
+            while in_flight:
+                now = time.monotonic()
+                # Wake up for the earliest attempt timeout and, while hedging is possible, the hedge delay
+                wake_at = min(started + self.timeout for _, started in in_flight.values())
+                if hedge_at is not None and pending and len(in_flight) == 1:
+                    wake_at = min(wake_at, hedge_at)
+                done, _ = wait(in_flight, timeout=max(0.0, wake_at - now), return_when=FIRST_COMPLETED)
+                for future in done:
+                    provider, _ = in_flight.pop(future)
+                    try:
+                        result, seconds = future.result()
+                    except CallCancelled:
+                        continue
+                    except Exception as e:
+                        last_error = e
+                        self._failed(provider, "error")
+                        if pending:
+                            launch("failover")
+                        continue
+                    provider.latencies.record(seconds)
+                    metrics.observe_llm_attempt(provider.name, "won", seconds)
+                    return result
+                now = time.monotonic()
+                for future, (provider, started) in list(in_flight.items()):
+                    if now - started >= self.timeout:
+                        # Abandoned, whatever it returns later is dropped
+                        del in_flight[future]
+                        last_error = TimeoutError(f"{provider.name} did not answer within {self.timeout}s")
+                        self._failed(provider, "timeout")
+                        if pending:
+                            launch("failover")
+                if hedge_at is not None and now >= hedge_at and pending and len(in_flight) == 1:
+                    launch("hedge")
+        finally:
+            cancelled.set()
+            for provider, _ in in_flight.values():
+                metrics.observe_llm_attempt(provider.name, "lost")
+        raise last_error
+
+    def _failed(self, provider, outcome):
+        provider.failed_until = time.monotonic() + self.cooldown
+        metrics.observe_llm_attempt(provider.name, outcome)
+
+    def status(self):
+        return [{"provider": provider.name, "healthy": provider.healthy, "samples": len(provider.latencies),
+                 "p95_seconds": provider.latencies.quantile(0.95)} for provider in self.providers]
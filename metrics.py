@@ -0,0 +1,143 @@
+import functools
+import os
+import time
+from contextlib import contextmanager, nullcontext
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+STAGE_SECONDS = Histogram("pipeline_stage_seconds", "Duration of pipeline stages", ["stage"], buckets=LATENCY_BUCKETS)
+STAGE_FAILURES = Counter("pipeline_stage_failures_total", "Pipeline stages that raised", ["stage"])
+# Labelled by the service registered for the host (rate_limiter.register_host), article and image hosts are
+# arbitrary newsletter domains and all count as "other"
+HTTP_SECONDS = Histogram("http_client_request_seconds", "Outbound HTTP time to response headers", ["service"], buckets=LATENCY_BUCKETS)
+HTTP_REQUESTS = Counter("http_client_requests_total", "Outbound HTTP responses", ["service", "status"])
+LLM_TOKENS = Counter("crew_llm_tokens_total", "Tokens used by crew runs", ["kind"])
+CREW_RUN_SECONDS = Histogram("crew_run_seconds", "Duration of crew runs", ["reasoning"], buckets=LATENCY_BUCKETS)
+CREW_OUTPUT_TOKENS = Histogram("crew_run_output_tokens", "Output tokens of crew runs", ["reasoning"],
+                               buckets=(100, 250, 500, 1000, 2000, 4000, 8000, 16000))
+TIME_TO_POST = Histogram("time_to_post_seconds", "Time from picking up a message to its published post", buckets=LATENCY_BUCKETS)
+LLM_REQUESTS = Counter("crew_llm_requests_total", "LLM requests made by crew runs")
+RATE_LIMIT_WAIT = Histogram("rate_limit_wait_seconds", "Time callers were queued by a rate limiter", ["provider"], buckets=LATENCY_BUCKETS)
+RATE_LIMIT_THROTTLES = Counter("rate_limit_throttles_total", "429 responses that slowed a rate limiter down", ["provider"])
+TOOL_CALLS = Counter("crew_tool_calls_total", "Agent tool calls", ["tool", "result"])
+LLM_ATTEMPTS = Counter("llm_router_attempts_total", "Routed LLM calls per provider by outcome (won, lost, error, timeout)", ["provider", "outcome"])
+LLM_ROUTES = Counter("llm_router_routes_total", "Extra calls sent to a provider, as a hedge or a failover", ["provider", "reason"])
+LLM_PROVIDER_SECONDS = Histogram("llm_router_provider_seconds", "Duration of winning LLM calls per provider", ["provider"], buckets=LATENCY_BUCKETS)
+LLM_HEDGE_DELAY = Gauge("llm_router_hedge_delay_seconds", "Current hedge delay per provider", ["provider"])
+
+# Optional OpenTelemetry export, enabled when the SDK is installed and an OTLP endpoint is configured
+_tracer = None
+if os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+    try:
+        from opentelemetry import trace
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+        _provider = TracerProvider(resource=Resource.create({"service.name": os.getenv("OTEL_SERVICE_NAME", "linkedin-post-automation")}))
+        _provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+        trace.set_tracer_provider(_provider)
+        _tracer = trace.get_tracer(__name__)
+    except ImportError:
+        print("OTEL_EXPORTER_OTLP_ENDPOINT is set but opentelemetry-sdk / opentelemetry-exporter-otlp are not installed")
+
+
+def observe_stage(stage, seconds, error=None):
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    if error is not None:
+        STAGE_FAILURES.labels(stage).inc()
+
+
+@contextmanager
+def stage_timer(stage):
+    """Time a block as a pipeline stage, and export it as a span when OpenTelemetry is enabled"""
+    start = time.perf_counter()
+    error = None
+    with _tracer.start_as_current_span(stage) if _tracer else nullcontext():
+        try:
+            yield
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            observe_stage(stage, time.perf_counter() - start, error)
+
+
+def timed_stage(stage):
+    """Decorator version of stage_timer"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage_timer(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def observe_http(service, status, seconds):
+    HTTP_REQUESTS.labels(service, str(status)).inc()
+    if seconds is not None:
+        HTTP_SECONDS.labels(service).observe(seconds)
+
+
+def observe_rate_limit_wait(provider, seconds):
+    RATE_LIMIT_WAIT.labels(provider).observe(seconds)
+
+
+def observe_throttle(provider):
+    RATE_LIMIT_THROTTLES.labels(provider).inc()
+
+
+def observe_crew_usage(crew_output):
+    """
+    Record token counts of a finished crew run (crewai's UsageMetrics)
+
+    Returns:
+        int: Output (completion) tokens of the run
+    """
+    usage = getattr(crew_output, "token_usage", None)
+    if usage is None:
+        return 0
+    for kind in ("prompt_tokens", "completion_tokens", "cached_prompt_tokens"):
+        value = getattr(usage, kind, 0) or 0
+        if value:
+            LLM_TOKENS.labels(kind.replace("_tokens", "")).inc(value)
+    LLM_REQUESTS.inc(getattr(usage, "successful_requests", 0) or 0)
+    return getattr(usage, "completion_tokens", 0) or 0
+
+
+def observe_crew_run(seconds, output_tokens, reasoning):
+    CREW_RUN_SECONDS.labels(reasoning).observe(seconds)
+    CREW_OUTPUT_TOKENS.labels(reasoning).observe(output_tokens)
+
+
+def observe_time_to_post(seconds):
+    TIME_TO_POST.observe(seconds)
+
+
+def observe_tool_call(tool, result):
+    TOOL_CALLS.labels(tool, result).inc()
+
+
+def observe_llm_attempt(provider, outcome, seconds=None):
+    LLM_ATTEMPTS.labels(provider, outcome).inc()
+    if seconds is not None:
+        LLM_PROVIDER_SECONDS.labels(provider).observe(seconds)
+
+
+def observe_llm_route(provider, reason):
+    LLM_ROUTES.labels(provider, reason).inc()
+
+
+def observe_llm_hedge_delay(provider, seconds):
+    LLM_HEDGE_DELAY.labels(provider).set(seconds)
+
+
+def render():
+    """Returns: (body, content type) for the /metrics endpoint"""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -1,18 +1,32 @@
 from crewai import Agent, Task, Crew, LLM
 from crewai.tools import BaseTool, tool
 from pydantic import BaseModel, Field
-import requests
+import http_client
+import metrics
+import rate_limiter
+from llm_router import LLMRouter, load_providers
+from prompt_budget import fit_content_to_budget
+from perplexity_cache import perplexity_cache
+from crew_runner import CrewRunner
+from generation_cache import generation_cache
 import os
+import hashlib
+import inspect
+import time
 from dotenv import load_dotenv
 load_dotenv()
 
 PERPLEXITY_API_KEY = os.getenv("PERPLEXITY_API_KEY")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY") 
+# Overridable so benchmarks/bench_pipeline.py can point the crew at local fake servers
+PERPLEXITY_BASE_URL = os.getenv("PERPLEXITY_BASE_URL", "https://api.perplexity.ai")
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1")
+rate_limiter.register_host(PERPLEXITY_BASE_URL, "perplexity")
 
-@tool("perplexity tool")
-def perplexity_tool(query: str) -> str:
-    """Useful for searching a specific link, SEO keywords for posts, trending hashtags, latest information on the web to create relevant posts. For getting additional knowledge on certain content aspects. Input should be a single string with your query. The input must contain the link too if required."""
-    
+class PerplexityError(Exception):
+    pass
+
+def search_perplexity(query):
     headers = {
             "Authorization": f"Bearer {PERPLEXITY_API_KEY}",
             "Content-Type": "application/json",
@@ -33,79 +47,175 @@ def perplexity_tool(query: str) -> str:
         "return_images": False,
         "return_related_questions": False
     }
-    response = requests.post(
-        "https://api.perplexity.ai/chat/completions", 
+    # Chat completions have no side effects, so 5xx responses are safe to retry
+    response = http_client.post(
+        f"{PERPLEXITY_BASE_URL}/chat/completions", 
         headers=headers, 
-        json=payload
+        json=payload,
+        idempotent=True
     )
-    if response.status_code == 200:
-        output = response.json()
-        return output
-    else:
-        return f"Error: {response.status_code}, {response.text}"
-
-llm = LLM(model="qwen/qwen3-32b", 
-          api_key=GROQ_API_KEY,
-          base_url="https://api.groq.com/openai/v1",
-          temperature=0.1)
-
-
-post_generator_agent = Agent(
-              role="You are a human, a skillful content creator,a AI researcher, a freelancer, who creates best Linkedin posts in a friendly with professional tone based on the content provided to you. Your content is about latest updates in AI feild which you always want to share with your network, who are researchers, founders, AI folks, to build engagment, attraction and connections",
-              goal="Create a Linkedin post based on the content provided. The post should be human written like natural, engaging and relevant to your professional network with SEO optimization for a vast reachability and you utilize very relevant and trending hashtags to the post.",
-              backstory=("You are an expert AI researcher, AI Freelancer, avid reader and content creator."
-                        "You love to do research and follow latest trends in the feild of AI."
-                        "You love to share the same knowledge with your network to gain attraction of researchers, Founders, AI folks. You have a deep understanding of what makes"
-                        "a post engaging on LinkedIn and how to tailor content to different audiences"
-                        "You utilize the Perplexity_tool to get latest information on the web to create relevant posts using real time information. And also search the best hashtags & SEO keywords to suite the post."
-                        "You are also given the information original link to the post that can be used over the perplexity_tool to get more context on the post along with keywords, hashtags etc. "),
-              allow_delegation=False,
-              tools=[perplexity_tool], 
-              llm=llm, verbose=True,
-              max_iter=2)
-
-task = Task(name="Create Linkedin Post", 
-            description=("Create an engaging Linkedin post based on the post content & link provided here, POST CONTENT: {content} , LINK: {link}. Follow the Dos and Donts strictly to create the post."
-                         
-            "### Dos:"
-            "1. The post should be natural and relevant to my professional network with SEO optimization for a vast reachability."
-            "2. You utilize top trending hashtags that align with most discussions on LinkedIn about this particular topic, Find using the perplexity_tool, With a max of 5 hastags that suite the SEO optimized post for better reachability."
-            "3. The post must start with a engaging lines or questions, compelling hooks to grab the attention of the readers" "4. Use max of 5 to 6 bullet points to highlight key takeaways. Keep sentences short and to the point. Make use of whitespace for readability" 
-            "5. Use appropriate emojis to make the post visually appealing and relatable."
-            "6. Use Funny jokes, questions, narrating experiences to build emotional connections with the readers. You can start with lines like I have come across, I love to share, lately, I have been exploring, How I manage, this is Awesome, Woow crazy!, Today I read this.. etc"
-            "7. The post should be like very easily consumanlble and information should seem like quick bites of large information."
-            "8. The post should sound like human written."
-            "9. Use the perplexity_tool to get latest information on the web to create latest facts and real time information that is requried to create realistic posts."
-            ""
-            "### Donts:"
-            "1. Avoid large blocks of text and hard vocabulary."
-            "2. Avoid excessive usage of emojis and all caps"
-            "3. The post should not be too long, ideally between 100-130 words."
-            "4. Do not use more than 5 hashtags and do not use hashtags in between the post. Mention all the hashtags directly at the end of post."
-            "5. Do not promote any products, services and pricing structures in the post."
-            "6. Do not make up any information if you dont know."
-            "7. The post should not sound like AI or machine generated."
-            ""
-            "### Information about Tools:"
-            "tool name: perplexity_tool"
-            "tool input format: a single string with your query or better designed prompt. The input must contain the link too if required."
-            "tool description: This tool is useful for searching latest information about the content in the web. It is also useful for finding trending hashtags on most discussion on linkedin on specific topic, SEO keywords for the linkedin post for the specific topic, find the latest information and gain more context on the web, when link is provided."
-            "How to use tool: Give a better designed prompt to the tool with the link if required to get more context on the post and when you want to find the trending hashtags, SEO keywords on specific topic. example prompt: Find top 5 trending hashtags used in most discussions on linkedin related to topic called Image generation, Find top SEO keywords for the linkedin post used in top discussions on linkedin on topic: Grok-2, find latest information on the web about topic: Grok-2, link:www.examplelink.com, etc."
-            ),
-
-            expected_output="An engaging and eye-catchy Linkedin post with SEO optimized content and relevant hashtags. Do not respond with anything else other than the post content. The output post must be of short points and emojis, in short bullet points. Each point must be very consise with a max of 5 to 10 words. Mention the hashtags directly at the end of post and see to that all the hashtags are in lowercase and without any spaces. The output must contain the link '{link}' at the end of the post wherever relevant.",
-
-            agent=post_generator_agent)  
-
-crew = Crew(agents=[post_generator_agent], 
-            tasks=[task],
-            verbose=True) 
+    if response.status_code != 200:
+        raise PerplexityError(f"Error: {response.status_code}, {response.text}")
+    # Only the answer text goes back to the agent, the full response JSON just inflates its context
+    return response.json()["choices"][0]["message"]["content"]
 
-def kickoff_linkedin_post(content, link):
-    crew_output = crew.kickoff(inputs={"content": content, "link": link})
-    result = crew_output.raw
+@tool("perplexity tool")
+def perplexity_tool(query: str) -> str:
+    """Useful for searching a specific link, SEO keywords for posts, trending hashtags, latest information on the web to create relevant posts. For getting additional knowledge on certain content aspects. Input should be a single string with your query. The input must contain the link too if required."""
+    try:
+        result = perplexity_cache.get_or_fetch(query, search_perplexity)
+    except (PerplexityError, rate_limiter.RateLimitTimeout) as e:
+        metrics.observe_tool_call("perplexity", "error")
+        return str(e)
+    metrics.observe_tool_call("perplexity", "ok")
     return result
 
+LLM_MODEL = "qwen/qwen3-32b"
+LLM_TEMPERATURE = 0.1
+# qwen3 thinks before every answer by default. "none" asks Groq to skip the reasoning (reasoning_effort),
+# "hidden" lets the model reason but keeps the reasoning out of the response (reasoning_format), "raw" returns
+# the <think> block inline, to be stripped by the formatter. Providers without these options use "raw".
+LLM_REASONING_MODE = os.getenv("LLM_REASONING_MODE", "none")
+REASONING_PARAMS = {
+    "none": {"reasoning_effort": "none"},
+    "hidden": {"reasoning_format": "hidden"},
+    "raw": {},
+}
+
+# Groq is configured through the GROQ_* settings, other providers through LLM_<NAME>_* (see llm_router.py)
+llm_router = LLMRouter(load_providers(defaults={
+    "*": {"model": LLM_MODEL, "reasoning": "raw"},
+    "groq": {"base_url": GROQ_BASE_URL, "api_key": GROQ_API_KEY, "reasoning": LLM_REASONING_MODE},
+}))
+
+def _provider_llm(settings):
+    return LLM(model=settings["model"],
+               api_key=settings.get("api_key"),
+               base_url=settings.get("base_url"),
+               temperature=LLM_TEMPERATURE,
+               extra_body=REASONING_PARAMS[settings["reasoning"]] or None)
+
+class RoutedLLM(LLM):
+    """
+    The crew's LLM. Calls go through llm_router (rate limits, hedging and failover across LLM_PROVIDERS) to one
+    LLM per provider owned by this crew, everything crewai reads locally comes from the primary provider's settings.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.provider_llms = {provider.name: _provider_llm(provider.settings) for provider in llm_router.providers}
+
+    def call(self, *args, **kwargs):
+        # The agent sets its stop words on this LLM, the providers' LLMs need them too
+        for provider_llm in self.provider_llms.values():
+            provider_llm.stop = self.stop
+        # A call that executes tools must not run twice
+        return llm_router.call(self.provider_llms, *args, hedge=not kwargs.get("available_functions"), **kwargs)
+
+def build_crew():
+    """
+    Build a fresh LLM, agent, task and crew. Every crew_runner pool slot owns one of these,
+    so concurrent kickoffs never share agent or task state.
+    """
+    primary = llm_router.providers[0].settings
+    llm = RoutedLLM(model=primary["model"],
+              api_key=primary.get("api_key"),
+              base_url=primary.get("base_url"),
+              temperature=LLM_TEMPERATURE,
+              extra_body=REASONING_PARAMS[primary["reasoning"]] or None)
 
 
+    post_generator_agent = Agent(
+                  role="You are a human, a skillful content creator,a AI researcher, a freelancer, who creates best Linkedin posts in a friendly with professional tone based on the content provided to you. Your content is about latest updates in AI feild which you always want to share with your network, who are researchers, founders, AI folks, to build engagment, attraction and connections",
+                  goal="Create a Linkedin post based on the content provided. The post should be human written like natural, engaging and relevant to your professional network with SEO optimization for a vast reachability and you utilize very relevant and trending hashtags to the post.",
+                  backstory=("You are an expert AI researcher, AI Freelancer, avid reader and content creator."
+                            "You love to do research and follow latest trends in the feild of AI."
+                            "You love to share the same knowledge with your network to gain attraction of researchers, Founders, AI folks. You have a deep understanding of what makes"
+                            "a post engaging on LinkedIn and how to tailor content to different audiences"
+                            "You utilize the Perplexity_tool to get latest information on the web to create relevant posts using real time information. And also search the best hashtags & SEO keywords to suite the post."
+                            "You are also given the information original link to the post that can be used over the perplexity_tool to get more context on the post along with keywords, hashtags etc. "),
+                  allow_delegation=False,
+                  tools=[perplexity_tool], 
+                  llm=llm, verbose=True,
+                  max_iter=2)
 
+    task = Task(name="Create Linkedin Post", 
+                description=("Create an engaging Linkedin post based on the post content & link provided here, POST CONTENT: {content} , LINK: {link}. Follow the Dos and Donts strictly to create the post."
+
+                "### Dos:"
+                "1. The post should be natural and relevant to my professional network with SEO optimization for a vast reachability."
+                "2. You utilize top trending hashtags that align with most discussions on LinkedIn about this particular topic, Find using the perplexity_tool, With a max of 5 hastags that suite the SEO optimized post for better reachability."
+                "3. The post must start with a engaging lines or questions, compelling hooks to grab the attention of the readers" "4. Use max of 5 to 6 bullet points to highlight key takeaways. Keep sentences short and to the point. Make use of whitespace for readability" 
+                "5. Use appropriate emojis to make the post visually appealing and relatable."
+                "6. Use Funny jokes, questions, narrating experiences to build emotional connections with the readers. You can start with lines like I have come across, I love to share, lately, I have been exploring, How I manage, this is Awesome, Woow crazy!, Today I read this.. etc"
+                "7. The post should be like very easily consumanlble and information should seem like quick bites of large information."
+                "8. The post should sound like human written."
+                "9. Use the perplexity_tool to get latest information on the web to create latest facts and real time information that is requried to create realistic posts."
+                ""
+                "### Donts:"
+                "1. Avoid large blocks of text and hard vocabulary."
+                "2. Avoid excessive usage of emojis and all caps"
+                "3. The post should not be too long, ideally between 100-130 words."
+                "4. Do not use more than 5 hashtags and do not use hashtags in between the post. Mention all the hashtags directly at the end of post."
+                "5. Do not promote any products, services and pricing structures in the post."
+                "6. Do not make up any information if you dont know."
+                "7. The post should not sound like AI or machine generated."
+                ""
+                "### Information about Tools:"
+                "tool name: perplexity_tool"
+                "tool input format: a single string with your query or better designed prompt. The input must contain the link too if required."
+                "tool description: This tool is useful for searching latest information about the content in the web. It is also useful for finding trending hashtags on most discussion on linkedin on specific topic, SEO keywords for the linkedin post for the specific topic, find the latest information and gain more context on the web, when link is provided."
+                "How to use tool: Give a better designed prompt to the tool with the link if required to get more context on the post and when you want to find the trending hashtags, SEO keywords on specific topic. example prompt: Find top 5 trending hashtags used in most discussions on linkedin related to topic called Image generation, Find top SEO keywords for the linkedin post used in top discussions on linkedin on topic: Grok-2, find latest information on the web about topic: Grok-2, link:www.examplelink.com, etc."
+                ),
+
+                expected_output="An engaging and eye-catchy Linkedin post with SEO optimized content and relevant hashtags. Do not respond with anything else other than the post content. The output post must be of short points and emojis, in short bullet points. Each point must be very consise with a max of 5 to 10 words. Mention the hashtags directly at the end of post and see to that all the hashtags are in lowercase and without any spaces. The output must contain the link '{link}' at the end of the post wherever relevant.",
+
+                agent=post_generator_agent)  
+
+    crew = Crew(agents=[post_generator_agent], 
+                tasks=[task],
+                verbose=True)
+    return crew
+
+crew_runner = CrewRunner(build_crew)
+
+# Any edit to the agent or task prompts changes this, which invalidates cached generations
+PROMPT_VERSION = hashlib.sha256(inspect.getsource(build_crew).encode("utf-8")).hexdigest()[:16]
+
+def _prepare_content(content):
+    content, original_tokens, prompt_tokens = fit_content_to_budget(content, LLM_MODEL)
+    print(f"----------- Prompt content: {prompt_tokens} tokens (article had {original_tokens}, saved {original_tokens - prompt_tokens})")
+    return content
+
+def _cached_generation(content, link):
+    output, match = generation_cache.get(content, link, PROMPT_VERSION, LLM_MODEL, LLM_TEMPERATURE)
+    if output is not None:
+        print(f"----------- Reusing cached generation ({match} match)")
+    return output
+
+def _report_run(crew_output, seconds):
+    output_tokens = metrics.observe_crew_usage(crew_output)
+    metrics.observe_crew_run(seconds, output_tokens, LLM_REASONING_MODE)
+    print(f"----------- Crew run took {seconds:.1f}s, {output_tokens} output tokens (reasoning: {LLM_REASONING_MODE})")
+
+def kickoff_linkedin_post(content, link):
+    content = _prepare_content(content)
+    result = _cached_generation(content, link)
+    if result is None:
+        started = time.perf_counter()
+        crew_output = crew_runner.kickoff(inputs={"content": content, "link": link})
+        _report_run(crew_output, time.perf_counter() - started)
+        result = crew_output.raw
+        generation_cache.set(content, link, PROMPT_VERSION, LLM_MODEL, LLM_TEMPERATURE, result)
+    return result
+
+async def akickoff_linkedin_post(content, link):
+    content = _prepare_content(content)
+    result = _cached_generation(content, link)
+    if result is None:
+        started = time.perf_counter()
+        crew_output = await crew_runner.akickoff(inputs={"content": content, "link": link})
+        _report_run(crew_output, time.perf_counter() - started)
+        result = crew_output.raw
+        generation_cache.set(content, link, PROMPT_VERSION, LLM_MODEL, LLM_TEMPERATURE, result)
+    return result
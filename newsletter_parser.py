@@ -0,0 +1,198 @@
+import os
+import re
+from urllib.parse import urlsplit, parse_qsl
+from dataclasses import dataclass, field
+from lxml import etree, html as lxml_html
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Section headings the default rule extracts, in order, the first one is the top section
+NEWSLETTER_SECTIONS = tuple(name.strip() for name in os.getenv("NEWSLETTER_SECTIONS", "Top News").split(",") if name.strip())
+
+
+@dataclass
+class Story:
+    title: str
+    link: str
+    img_src: str = None
+
+
+@dataclass
+class Section:
+    name: str
+    stories: list = field(default_factory=list)
+
+
+@dataclass
+class Newsletter:
+    rule: str
+    sections: list = field(default_factory=list)
+
+    def section(self, name):
+        return next((section for section in self.sections if section.name.lower() == name.lower()), None)
+
+    def stories(self):
+        return [story for section in self.sections for story in section.stories]
+
+
+class NewsletterParseError(ValueError):
+    """Raised when no rule finds the expected content in a newsletter"""
+
+
+@dataclass
+class ExtractionRule:
+    """
+    How to pull sections out of one newsletter layout.
+
+    The default layout is a table based email (AlphaSignal style): a section starts at a row whose
+    heading element text equals the section name, and every link in the following rows, up to the
+    next heading row (a row with a heading element and no links), is one story.
+
+    Args:
+        name: Rule name, reported in the parse result
+        sections: Section headings to extract, the first one is the "top" section
+        heading_xpath: XPath (relative to the document) matching section heading elements
+        row_xpath: XPath from a heading to the element whose following siblings hold the stories
+        hero_image_index: Image (index among all <img>) used for the top story, other stories use the first
+            image in their own rows
+        detect: Optional callable(document) -> bool deciding whether the rule applies
+        skip_schemes: Link schemes that are never stories (mailto...)
+        skip_domains: Hosts (and their subdomains) whose links are never stories, e.g. social networks
+        skip_paths: (domain, path prefixes) pairs, for hosts where only some links are stories
+            (LinkedIn articles under /pulse/ are, profiles and share links are not)
+        skip_segments: Regex matched against whole path segments and query parameter names
+            (unsubscribe, preferences, sponsor...), never against the host
+    """
+    name: str
+    sections: tuple = NEWSLETTER_SECTIONS
+    heading_xpath: str = "//strong"
+    row_xpath: str = "ancestor::tr[1]"
+    hero_image_index: int = 1
+    detect: object = None
+    skip_schemes: tuple = ("mailto", "tel")
+    skip_domains: tuple = ("twitter.com", "x.com", "facebook.com", "list-manage.com")
+    skip_paths: tuple = (("linkedin.com", ("/in/", "/company/", "/share", "/sharing/", "/feed/", "/comm/")),)
+    skip_segments: str = r"unsubscribe|preferences|manage-preferences|sponsor|sponsors|sponsored"
+
+    def __post_init__(self):
+        self._skip_segment = re.compile(rf"(?:{self.skip_segments})(?:\.\w+)?", re.IGNORECASE)
+        # Only the wanted headings are selected by the XPath itself, the rest of the document is never walked in Python
+        names = " or ".join(f"normalize-space(.)={_xpath_literal(name)}" for name in self.sections)
+        self._headings = etree.XPath(f"{self.heading_xpath}[{names}]")
+        self._row = etree.XPath(self.row_xpath)
+        self._heading_row = etree.XPath("." + self.heading_xpath + "[not(ancestor::a)]")
+
+    def skips(self, link):
+        """True for links that are never stories: unsubscribe/preferences/sponsor links and social profiles"""
+        parts = urlsplit(link)
+        if parts.scheme.lower() in self.skip_schemes:
+            return True
+        host = (parts.hostname or "").lower()
+
+        def on(domain):
+            return host == domain or host.endswith("." + domain)
+
+        if any(on(domain) for domain in self.skip_domains):
+            return True
+        path = parts.path.lower()
+        if any(on(domain) and path.startswith(prefixes) for domain, prefixes in self.skip_paths):
+            return True
+        segments = [segment for segment in parts.path.split("/") if segment]
+        segments += [name for name, _ in parse_qsl(parts.query, keep_blank_values=True)]
+        return any(self._skip_segment.fullmatch(segment) for segment in segments)
+
+    def applies_to(self, document):
+        return self.detect(document) if self.detect else True
+
+    def extract(self, document):
+        images = document.xpath("//img/@src")
+        hero = images[self.hero_image_index] if len(images) > self.hero_image_index else None
+        sections = []
+        for heading in self._headings(document):
+            rows = self._row(heading)
+            if not rows:
+                continue
+            section = Section(name=_text(heading))
+            for row in rows[0].itersiblings():
+                if self._heading_row(row) and not row.xpath(".//a[@href]"):
+                    break
+                self._collect_stories(row, section)
+            if section.stories:
+                sections.append(section)
+        order = {name: i for i, name in enumerate(self.sections)}
+        sections.sort(key=lambda section: order.get(section.name, len(order)))
+        if sections and hero:
+            # The top story is illustrated by the newsletter's hero image (the second <img>, after the logo)
+            sections[0].stories[0].img_src = hero
+        return sections
+
+    def _collect_stories(self, row, section):
+        row_images = row.xpath(".//img/@src")
+        seen = {story.link for story in section.stories}
+        for a_tag in row.iter("a"):
+            link = (a_tag.get("href") or "").strip()
+            title = _text(a_tag)
+            if not link or not title or link in seen or self.skips(link):
+                continue
+            seen.add(link)
+            section.stories.append(Story(title=title, link=link, img_src=row_images[0] if row_images else None))
+
+
+def _xpath_literal(value):
+    if "'" not in value:
+        return f"'{value}'"
+    return '"' + value + '"'
+
+
+def _text(element):
+    return " ".join("".join(element.itertext()).split())
+
+
+RULES = []
+_PARSER = lxml_html.HTMLParser(encoding="utf-8", remove_comments=True)
+
+
+def register_rule(rule, first=False):
+    """Add a per-newsletter rule, rules are tried in order and the first one that finds sections wins"""
+    if first:
+        RULES.insert(0, rule)
+    else:
+        RULES.append(rule)
+    return rule
+
+
+register_rule(ExtractionRule(name="table_sections"))
+
+
+def parse_newsletter(mail_html_content, rules=None):
+    """
+    Parse a newsletter email into sections of stories without building a full BeautifulSoup tree
+
+    Raises:
+        NewsletterParseError: If no rule finds any section
+    """
+    if not mail_html_content:
+        raise NewsletterParseError("Newsletter has no HTML body")
+    if isinstance(mail_html_content, str):
+        mail_html_content = mail_html_content.encode("utf-8")
+    try:
+        document = lxml_html.document_fromstring(mail_html_content, parser=_PARSER)
+    except (etree.ParserError, ValueError) as e:
+        raise NewsletterParseError(f"Newsletter HTML could not be parsed: {e}")
+    for rule in rules or RULES:
+        if not rule.applies_to(document):
+            continue
+        sections = rule.extract(document)
+        if sections:
+            return Newsletter(rule=rule.name, sections=sections)
+    raise NewsletterParseError("No extraction rule matched the newsletter")
+
+
+def get_top_story(mail_html_content, rules=None):
+    """
+    Returns:
+        Story: First story of the first section (the "Top News" item for the default rule)
+    """
+    newsletter = parse_newsletter(mail_html_content, rules)
+    return newsletter.sections[0].stories[0]
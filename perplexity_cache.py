@@ -0,0 +1,121 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from sqlite_store import SQLiteStore
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PERPLEXITY_CACHE_MAX_ENTRIES = int(os.getenv("PERPLEXITY_CACHE_MAX_ENTRIES", "2000"))
+
+# (category, pattern, ttl seconds), the first matching pattern decides the category
+CATEGORY_RULES = [
+    ("hashtags", re.compile(r"hash\s*tags?|#\w", re.IGNORECASE), int(os.getenv("PERPLEXITY_TTL_HASHTAGS", str(3 * 86400)))),
+    ("keywords", re.compile(r"\bseo\b|key\s*words?", re.IGNORECASE), int(os.getenv("PERPLEXITY_TTL_KEYWORDS", str(7 * 86400)))),
+    ("latest", re.compile(r"latest|recent|today|current|breaking|news|this week|right now", re.IGNORECASE), int(os.getenv("PERPLEXITY_TTL_LATEST", "3600"))),
+    ("link", re.compile(r"https?://|www\.", re.IGNORECASE), int(os.getenv("PERPLEXITY_TTL_LINK", "86400"))),
+]
+DEFAULT_CATEGORY = ("general", int(os.getenv("PERPLEXITY_TTL_GENERAL", str(6 * 3600))))
+
+
+def normalize_query(query):
+    """Lowercase, collapse whitespace and drop trailing punctuation so trivially different phrasings share a key"""
+    query = re.sub(r"\s+", " ", query.strip().lower())
+    return query.strip(" .?!")
+
+
+def categorize_query(query):
+    for category, pattern, ttl in CATEGORY_RULES:
+        if pattern.search(query):
+            return category, ttl
+    return DEFAULT_CATEGORY
+
+
+class PerplexityCache(SQLiteStore):
+    """
+    Persistent memo of perplexity_tool answers keyed by the normalized query.
+
+    Entries expire after a per-category TTL (short for "latest" questions, long for hashtags and keywords),
+    the table is capped at max_entries with least recently used entries evicted first.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS perplexity_cache (
+        key TEXT PRIMARY KEY,
+        query TEXT NOT NULL,
+        category TEXT NOT NULL,
+        answer TEXT NOT NULL,
+        expires_at REAL NOT NULL,
+        last_used REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS perplexity_cache_last_used ON perplexity_cache (last_used);
+    """
+
+    def __init__(self, path=None, max_entries=PERPLEXITY_CACHE_MAX_ENTRIES):
+        super().__init__(path)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._counter_lock = threading.Lock()
+
+    @staticmethod
+    def make_key(query):
+        return hashlib.sha256(normalize_query(query).encode("utf-8")).hexdigest()
+
+    def get(self, query):
+        key = self.make_key(query)
+        now = time.time()
+        conn = self.connection()
+        row = conn.execute("SELECT answer, expires_at FROM perplexity_cache WHERE key = ?", (key,)).fetchone()
+        if row and row["expires_at"] > now:
+            with conn:
+                conn.execute("UPDATE perplexity_cache SET last_used = ? WHERE key = ?", (now, key))
+            self._count(hit=True)
+            return row["answer"]
+        self._count(hit=False)
+        return None
+
+    def set(self, query, answer):
+        category, ttl = categorize_query(query)
+        now = time.time()
+        conn = self.connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO perplexity_cache (key, query, category, answer, expires_at, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                (self.make_key(query), normalize_query(query), category, answer, now + ttl, now),
+            )
+            conn.execute("DELETE FROM perplexity_cache WHERE expires_at <= ?", (now,))
+            conn.execute(
+                "DELETE FROM perplexity_cache WHERE key IN (SELECT key FROM perplexity_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def get_or_fetch(self, query, fetch):
+        """
+        Return the cached answer for query, or call fetch(query) and cache its answer
+
+        fetch must raise on failure, errors are never cached.
+        """
+        answer = self.get(query)
+        if answer is None:
+            answer = fetch(query)
+            self.set(query, answer)
+        return answer
+
+    def _count(self, hit):
+        with self._counter_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        size = self.connection().execute("SELECT COUNT(*) FROM perplexity_cache").fetchone()[0]
+        with self._counter_lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0, "entries": size}
+
+
+perplexity_cache = PerplexityCache()
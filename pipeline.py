@@ -0,0 +1,221 @@
+from watchreq_script import get_gmail_service, get_label_id, claim_new_message_ids, get_message_html, get_top_news_data, download_image, get_text_content, LABEL_NAME
+from my_crew import kickoff_linkedin_post
+from linkedin_post import markdown_to_linkedin_unicode, upload_image_asset, create_post
+from stage_graph import StageGraph, StageError
+from metrics import stage_timer, observe_time_to_post
+from image_io import remove_file
+from image_prep import prepare_and_upload
+from gmail_client import gmail_client
+from dedup_store import dedup_store, content_hash, MESSAGE, ARTICLE, CONTENT
+from job_store import job_store
+from job_queue import current_job_id
+from googleapiclient.errors import HttpError
+from dotenv import load_dotenv
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+load_dotenv()
+
+linkedin_access_token = os.getenv("LINKEDIN_ACCESS_TOKEN")
+linkedin_owner_urn = os.getenv("LINKEDIN_OWNER_URN")
+# Messages of one notification processed in parallel, each still runs its own stage graph
+PIPELINE_MESSAGE_CONCURRENCY = int(os.getenv("PIPELINE_MESSAGE_CONCURRENCY", "1"))
+
+
+class DuplicateContent(Exception):
+    """Raised inside the stage graph when the article text was already posted under another url"""
+
+
+def run_mail_pipeline(notification):
+    """
+    Run the newsletter -> LinkedIn post workflow for every message that a Gmail push notification announces
+
+    Args:
+        notification (dict): Decoded Pub/Sub message data ({"emailAddress": ..., "historyId": ...})
+
+    Returns:
+        dict: Summary per processed message id
+    """
+    # The claimed ids are checkpointed: the history cursor has moved past them, a retry could not list them again
+    checkpoints = job_store.checkpoints(f"notification:{notification.get('emailAddress')}:{notification['historyId']}")
+    service = get_gmail_service()
+    message_ids = checkpoints.get("message_ids")
+    if message_ids is None:
+        def record(claimed_ids):
+            # Runs under the cursor lock, before the cursor moves past the claimed messages
+            checkpoints.set("message_ids", claimed_ids)
+
+        label_id = get_label_id(service, LABEL_NAME)
+        try:
+            with stage_timer("gmail_history"):
+                message_ids = claim_new_message_ids(service, label_id, notification["historyId"], record)
+        except HttpError as e:
+            # Gmail answers 404 (or 400 "Invalid label") when the cached label id no longer exists
+            if e.resp.status not in (400, 404):
+                raise
+            gmail_client.invalidate_label(LABEL_NAME)
+            label_id = get_label_id(service, LABEL_NAME)
+            message_ids = claim_new_message_ids(service, label_id, notification["historyId"], record)
+    print(f"----------- New messages for history id {notification['historyId']}: {message_ids}")
+    results, errors = {}, {}
+    # Read here, the message threads below do not see the worker's job id
+    job_id = current_job_id()
+
+    def process(message_id):
+        # Per message: two messages of one job linking the same article must not share a claim
+        owner = f"{job_id}:{message_id}" if job_id else None
+        try:
+            # Discovery clients are per thread, httplib2 is not thread-safe
+            results[message_id] = process_message(get_gmail_service(), message_id, owner)
+        except Exception as e:
+            print(f"Failed to process message {message_id}: {e}")
+            errors[message_id] = str(e)
+
+    if PIPELINE_MESSAGE_CONCURRENCY > 1 and len(message_ids) > 1:
+        # A collapsed notification (see pubsub_worker.py) can announce many messages at once
+        with ThreadPoolExecutor(max_workers=PIPELINE_MESSAGE_CONCURRENCY, thread_name_prefix="message") as executor:
+            list(executor.map(process, message_ids))
+    else:
+        for message_id in message_ids:
+            process(message_id)
+    if errors:
+        raise RuntimeError(f"Complete workflow failed for messages: {errors}")
+    return results
+
+
+def process_message(service, message_id, owner=None):
+    """
+    Turn one newsletter email into a LinkedIn post, skipping messages, articles and article texts
+    that were already posted (or are being posted by another worker).
+
+    After parsing the newsletter the remaining work runs as a stage graph: the article fetch (with the
+    content dedup check) and the image download run in parallel, the LinkedIn image upload overlaps with
+    the crew generation and the post is created once both are done. A top story without an image is
+    posted as text only.
+
+    Every stage output is checkpointed under "message:<id>" in the job store, so a retried or resumed
+    run skips the Gmail fetch, the image upload, the crew generation and the post it already did.
+    Dedup claims are taken for owner (job and message id): only a later run of the same job may take over
+    the pending claims an earlier run left, never a concurrent run of another job.
+
+    Returns:
+        dict: Summary of the run (title, link, LinkedIn response and stage timings) or the reason it was skipped
+    """
+    started = time.perf_counter()
+    checkpoints = job_store.checkpoints(f"message:{message_id}")
+    resumed = checkpoints.stages()
+    if not dedup_store.claim(MESSAGE, message_id, owner):
+        print(f"----------- Skipping already processed message {message_id}")
+        return {"status": "duplicate", "reason": "message"}
+    if resumed:
+        print(f"----------- Resuming message {message_id} from checkpoints: {resumed}")
+    claimed = [(MESSAGE, message_id)]
+    downloaded = []
+    try:
+        newsletter = checkpoints.get("newsletter")
+        if newsletter is None:
+            with stage_timer("gmail_fetch"):
+                html_code = get_message_html(service, message_id)
+            with stage_timer("parse"):
+                title, article_link, img_src = get_top_news_data(html_code)
+            newsletter = checkpoints.set("newsletter", {"title": title, "link": article_link, "img_src": img_src})
+        title, article_link, img_src = newsletter["title"], newsletter["link"], newsletter["img_src"]
+        print(f"----------- Extracted Top News Data: Title: {title}, Link: {article_link}, Image Source: {img_src}")
+        if not dedup_store.claim(ARTICLE, article_link, owner):
+            print(f"----------- Skipping already posted article {article_link}")
+            dedup_store.complete(MESSAGE, message_id)
+            return {"status": "duplicate", "reason": "article", "link": article_link}
+        claimed.append((ARTICLE, article_link))
+
+        def fetch_article():
+            text_content = get_text_content(article_link)
+            checkpoints.set("article", {"sha256": content_hash(text_content)})
+            print(f"----------- Extracted text content")
+            # Claimed here rather than in generate, so a duplicate stops before the LinkedIn image upload
+            if not dedup_store.claim(CONTENT, text_content, owner):
+                raise DuplicateContent(article_link)
+            claimed.append((CONTENT, text_content))
+            return text_content
+
+        def fetch_image():
+            if checkpoints.get("upload") or not img_src:
+                return None
+            image_path = download_image(img_src)
+            downloaded.append(image_path)
+            print(f"----------- Downloaded image path: {image_path}")
+            return image_path
+
+        def upload_image(image, article):
+            # article is only awaited: a duplicate article never registers an upload
+            asset_urn = checkpoints.get("upload")
+            if asset_urn:
+                return asset_urn
+            if not img_src:
+                # Posted as text only, like batch mode does for image-less stories
+                print(f"----------- Newsletter has no image, posting text only")
+                return None
+            asset_urn, normalized_path = prepare_and_upload(
+                image, linkedin_owner_urn, lambda path: upload_image_asset(linkedin_access_token, path, linkedin_owner_urn))
+            downloaded.append(normalized_path)
+            if not asset_urn:
+                raise RuntimeError("Uploading the image to LinkedIn failed")
+            return checkpoints.set("upload", asset_urn)
+
+        def generate(article):
+            generated = checkpoints.get("generate")
+            if generated is not None:
+                print(f"----------- Reusing the post generated by an earlier run")
+                return generated
+            agent_output = kickoff_linkedin_post(content=article, link=article_link)
+            print(f"----------- Crew generated output successfully")
+            formatted_post = markdown_to_linkedin_unicode(agent_output)
+            print(f"----------- Formatted post for LinkedIn")
+            return checkpoints.set("generate", formatted_post)
+
+        def publish(generate, upload):
+            response = checkpoints.get("publish")
+            if response is not None:
+                print(f"----------- Post was already created by an earlier run")
+                return response
+            print(f"----------- Posting to LinkedIn")
+            print("Step 3: Creating LinkedIn post...")
+            response = create_post(linkedin_access_token, upload, generate, "LinkedIn Post", "Posted via linkedin", linkedin_owner_urn)
+            if not response:
+                raise RuntimeError("Posting to LinkedIn failed")
+            return checkpoints.set("publish", response)
+
+        graph = StageGraph()
+        graph.add("article", fetch_article)
+        graph.add("image", fetch_image)
+        # The image download overlaps with the article fetch, the upload waits for the content dedup check
+        graph.add("upload", upload_image, deps=("image", "article"))
+        graph.add("generate", generate, deps=("article",))
+        graph.add("publish", publish, deps=("generate", "upload"))
+        try:
+            results = graph.run()
+        finally:
+            print(f"----------- Stage timings for message {message_id}:\n{graph.report()}")
+    except StageError as e:
+        if not isinstance(e.error, DuplicateContent):
+            for kind, value in claimed:
+                dedup_store.release(kind, value, owner)
+            raise
+        print(f"----------- Skipping article with already posted content {article_link}")
+        for kind, value in claimed:
+            dedup_store.complete(kind, value)
+        return {"status": "duplicate", "reason": "content", "link": article_link, "timings": graph.timings}
+    except Exception:
+        for kind, value in claimed:
+            dedup_store.release(kind, value, owner)
+        raise
+    finally:
+        for image_path in downloaded:
+            remove_file(image_path)
+    for kind, value in claimed:
+        dedup_store.complete(kind, value)
+    time_to_post = round(time.perf_counter() - started, 3)
+    observe_time_to_post(time_to_post)
+    print(f"Complete workflow successful! Time to post: {time_to_post}s")
+    return {"status": "posted", "title": title, "link": article_link, "linkedin_response": results["publish"],
+            "text_only": not img_src, "timings": graph.timings, "time_to_post": time_to_post, "resumed": resumed}
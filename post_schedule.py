@@ -0,0 +1,138 @@
+import json
+import os
+import threading
+import time
+import traceback
+from sqlite_store import SQLiteStore
+from dotenv import load_dotenv
+
+load_dotenv()
+
+POST_DRIP_INTERVAL = int(os.getenv("POST_DRIP_INTERVAL", "7200"))
+POST_DRIP_MAX_ATTEMPTS = int(os.getenv("POST_DRIP_MAX_ATTEMPTS", "3"))
+
+
+class PostSchedule(SQLiteStore):
+    """
+    Persisted queue of generated posts waiting to be published, oldest first.
+    Rows go pending -> published, or back to pending with a later not_before after a failed attempt
+    until POST_DRIP_MAX_ATTEMPTS is reached (then failed).
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS scheduled_posts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        link TEXT NOT NULL UNIQUE,
+        title TEXT,
+        img_src TEXT,
+        post_text TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        not_before REAL NOT NULL,
+        created_at REAL NOT NULL,
+        published_at REAL,
+        linkedin_response TEXT,
+        error TEXT
+    );
+    CREATE INDEX IF NOT EXISTS scheduled_posts_due ON scheduled_posts (status, not_before);
+    """
+
+    def add(self, link, title, img_src, post_text, not_before=None):
+        now = time.time()
+        conn = self.connection()
+        with conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO scheduled_posts (link, title, img_src, post_text, not_before, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (link, title, img_src, post_text, not_before or now, now),
+            )
+        return cursor.lastrowid if cursor.rowcount else None
+
+    def next_due(self):
+        row = self.connection().execute(
+            "SELECT * FROM scheduled_posts WHERE status = 'pending' AND not_before <= ? ORDER BY not_before, id LIMIT 1",
+            (time.time(),),
+        ).fetchone()
+        return dict(row) if row else None
+
+    def mark_published(self, post_id, linkedin_response):
+        conn = self.connection()
+        with conn:
+            conn.execute(
+                "UPDATE scheduled_posts SET status = 'published', published_at = ?, linkedin_response = ?, attempts = attempts + 1 WHERE id = ?",
+                (time.time(), json.dumps(linkedin_response), post_id),
+            )
+
+    def mark_failed(self, post_id, error, retry_in, max_attempts=POST_DRIP_MAX_ATTEMPTS):
+        conn = self.connection()
+        with conn:
+            conn.execute(
+                "UPDATE scheduled_posts SET attempts = attempts + 1, error = ?, not_before = ?, "
+                "status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END WHERE id = ?",
+                (str(error), time.time() + retry_in, max_attempts, post_id),
+            )
+
+    def list(self, status=None, limit=100):
+        query = "SELECT id, link, title, status, attempts, not_before, created_at, published_at, error FROM scheduled_posts"
+        params = ()
+        if status:
+            query += " WHERE status = ?"
+            params = (status,)
+        query += " ORDER BY not_before, id LIMIT ?"
+        return [dict(row) for row in self.connection().execute(query, params + (limit,))]
+
+
+post_schedule = PostSchedule()
+
+
+class DripScheduler:
+    """
+    Background thread publishing at most one scheduled post per interval.
+
+    Args:
+        publish (callable): publish(row) -> LinkedIn response dict, raises on failure
+        interval (int): Seconds between two published posts
+        leadership (Leadership): When set, only the replica holding it publishes, so a post never goes out twice
+    """
+
+    def __init__(self, publish, schedule=post_schedule, interval=POST_DRIP_INTERVAL, leadership=None):
+        self.publish = publish
+        self.schedule = schedule
+        self.interval = interval
+        self.leadership = leadership
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="drip-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self.leadership is not None:
+            self.leadership.resign()
+
+    def publish_next(self):
+        """Publish the oldest due post, returns True if one was published"""
+        row = self.schedule.next_due()
+        if row is None:
+            return False
+        print(f"----------- Publishing scheduled post {row['id']}: {row['title']}")
+        try:
+            response = self.publish(row)
+        except Exception as e:
+            traceback.print_exc()
+            self.schedule.mark_failed(row["id"], e, retry_in=self.interval)
+            return False
+        self.schedule.mark_published(row["id"], response)
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            leading = self.leadership is None or self.leadership.check()
+            published = leading and self.publish_next()
+            # Nothing due yet, look again soon instead of sleeping a whole interval
+            self._stop.wait(self.interval if published else min(60, self.interval))
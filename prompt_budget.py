@@ -0,0 +1,107 @@
+import os
+import re
+from collections import Counter
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PROMPT_CONTENT_TOKEN_BUDGET = int(os.getenv("PROMPT_CONTENT_TOKEN_BUDGET", "1500"))
+# Title plus the first paragraphs are always kept, they carry the news itself
+PROMPT_LEAD_PARAGRAPHS = int(os.getenv("PROMPT_LEAD_PARAGRAPHS", "3"))
+
+STOPWORDS = set("""a about after also an and are as at be been but by can for from has have how i in into is it its more most new not of on
+or our so than that the their them there these they this to was we were what when which who will with you your""".split())
+WORD_RE = re.compile(r"[a-z0-9][a-z0-9\-\.]*[a-z0-9]|[a-z0-9]")
+
+_encoders = {}
+
+
+def _get_encoder(model):
+    """tiktoken encoder used as a close approximation for the configured model, None when tiktoken is missing"""
+    if model in _encoders:
+        return _encoders[model]
+    try:
+        import tiktoken
+        try:
+            encoder = tiktoken.encoding_for_model(model.split("/")[-1])
+        except KeyError:
+            # Open models such as qwen3 have no tiktoken entry, cl100k is within a few percent of their tokenizers
+            encoder = tiktoken.get_encoding("cl100k_base")
+    except ImportError:
+        encoder = None
+    _encoders[model] = encoder
+    return encoder
+
+
+def count_tokens(text, model):
+    encoder = _get_encoder(model)
+    if encoder is None:
+        # Roughly four characters per token for English text
+        return (len(text) + 3) // 4
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text, max_tokens, model):
+    encoder = _get_encoder(model)
+    if encoder is None:
+        return text[:max_tokens * 4]
+    return encoder.decode(encoder.encode(text, disallowed_special=())[:max_tokens])
+
+
+def _keywords(text):
+    return [word for word in WORD_RE.findall(text.lower()) if word not in STOPWORDS and len(word) > 2]
+
+
+def fit_content_to_budget(content, model, budget=PROMPT_CONTENT_TOKEN_BUDGET, lead_paragraphs=PROMPT_LEAD_PARAGRAPHS):
+    """
+    Trim article text to a token budget for the crew prompt.
+
+    The title (first line) and the lead paragraphs are kept first. The remaining paragraphs are ranked by how
+    many of the title/lead keywords they mention, weighted towards the start of the article, and added while
+    they fit. Kept paragraphs stay in their original order.
+
+    Args:
+        content (str): Article text, one paragraph per line
+        model (str): Model name used to pick the tokenizer
+        budget (int): Maximum number of tokens for the content
+
+    Returns:
+        tuple: (trimmed content, original token count, trimmed token count)
+    """
+    original_tokens = count_tokens(content, model)
+    if original_tokens <= budget:
+        return content, original_tokens, original_tokens
+
+    paragraphs = [line.strip() for line in content.split("\n") if line.strip()]
+    sizes = [count_tokens(paragraph, model) + 1 for paragraph in paragraphs]
+    selected, used = set(), 0
+
+    lead = range(min(len(paragraphs), 1 + lead_paragraphs))
+    for i in lead:
+        if used + sizes[i] > budget:
+            break
+        selected.add(i)
+        used += sizes[i]
+
+    topic = Counter(_keywords(" ".join(paragraphs[i] for i in lead)))
+    ranked = []
+    for i in range(len(paragraphs)):
+        if i in selected:
+            continue
+        words = _keywords(paragraphs[i])
+        if not words:
+            continue
+        overlap = sum(topic[word] for word in set(words))
+        position_weight = 1.0 / (1.0 + i / 20.0)
+        ranked.append(((overlap / len(words) ** 0.5 + 0.1) * position_weight, i))
+    for _, i in sorted(ranked, reverse=True):
+        if used + sizes[i] <= budget:
+            selected.add(i)
+            used += sizes[i]
+
+    if not selected:
+        # Even the title does not fit (one huge unbroken block), cut it by tokens
+        trimmed = truncate_to_tokens(content, budget, model)
+    else:
+        trimmed = "\n".join(paragraphs[i] for i in sorted(selected))
+    return trimmed, original_tokens, count_tokens(trimmed, model)
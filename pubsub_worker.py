@@ -0,0 +1,200 @@
+"""
+Pull-mode alternative to the /mail_payload push webhook.
+
+Streams notifications from the Gmail topic's subscription and collapses every notification received within
+PUBSUB_COLLAPSE_WINDOW seconds into one job: a single Gmail history sync up to the highest historyId of the
+window. Jobs go through the same durable JobQueue as pushes (bounded concurrency, retries, checkpoints).
+The messages of a window are acked together once their job is stored, or nacked for redelivery when the
+queue is full. Pub/Sub flow control bounds how many notifications are leased at once.
+
+Run:
+    python pubsub_worker.py
+
+Against the Pub/Sub emulator (gcloud beta emulators pubsub start), which also creates the topic and subscription:
+    PUBSUB_EMULATOR_HOST=localhost:8085 python pubsub_worker.py
+"""
+import json
+import os
+import signal
+import threading
+import time
+from google.api_core.exceptions import AlreadyExists
+from google.cloud import pubsub_v1
+from job_queue import JobQueue, QueueFullError
+from job_store import job_store
+from gmail_watch import watch_renewer, GMAIL_WATCH_RENEWAL
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PROJECT_ID = os.getenv("GOOGLE_PROJECT_ID")
+TOPIC_NAME = os.getenv("GMAIL_TOPIC_NAME")
+# An empty value (as in .env.example) also falls back to the default
+PUBSUB_SUBSCRIPTION = os.getenv("PUBSUB_SUBSCRIPTION") or f"{TOPIC_NAME}-pull"
+PUBSUB_COLLAPSE_WINDOW = float(os.getenv("PUBSUB_COLLAPSE_WINDOW", "5"))
+PUBSUB_MAX_OUTSTANDING = int(os.getenv("PUBSUB_MAX_OUTSTANDING", "100"))
+
+
+def parse_notification(data):
+    """
+    Returns:
+        dict: The Gmail notification ({"emailAddress": ..., "historyId": ...}) in a message's data
+
+    Raises:
+        ValueError: If the data is not a Gmail notification
+    """
+    try:
+        notification = json.loads(data.decode("utf-8"))
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Could not decode message data: {e}")
+    if not isinstance(notification, dict) or "historyId" not in notification:
+        raise ValueError("Decoded message has no historyId")
+    return notification
+
+
+def collapse(notifications):
+    """One notification per mailbox, carrying the highest historyId: a history sync up to it covers all of them"""
+    latest = {}
+    for notification in notifications:
+        address = notification.get("emailAddress")
+        if address not in latest or int(notification["historyId"]) > int(latest[address]["historyId"]):
+            latest[address] = notification
+    return list(latest.values())
+
+
+class NotificationBatcher:
+    """
+    Collects pulled messages and hands them to the job queue one collapse window at a time.
+
+    Args:
+        queue (JobQueue): Queue running run_mail_pipeline
+        window (float): Seconds to keep collecting after the first message of a batch arrived
+    """
+
+    def __init__(self, queue, window=PUBSUB_COLLAPSE_WINDOW):
+        self.queue = queue
+        self.window = window
+        self._messages = []
+        self._first_at = None
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="pubsub-batcher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify()
+        self._thread.join(timeout)
+
+    def add(self, message):
+        """Subscriber callback, runs on the Pub/Sub client's threads"""
+        try:
+            notification = parse_notification(message.data)
+        except ValueError as e:
+            # Redelivering a malformed message would fail the same way again
+            print(f"Dropping message {message.message_id}: {e}")
+            message.ack()
+            return
+        with self._cond:
+            if not self._messages:
+                self._first_at = time.monotonic()
+            self._messages.append((message, notification))
+            self._cond.notify()
+
+    def _take_batch(self):
+        with self._cond:
+            while not self._messages and not self._stop.is_set():
+                self._cond.wait()
+            while self._messages and not self._stop.is_set():
+                remaining = self._first_at + self.window - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch, self._messages = self._messages, []
+            return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._take_batch()
+            if batch:
+                self.flush(batch)
+
+    def flush(self, batch):
+        messages = [message for message, _ in batch]
+        notifications = collapse([notification for _, notification in batch])
+        if self.queue.free_slots() < len(notifications):
+            print(f"Job queue has no room for {len(notifications)} jobs, nacking {len(messages)} messages for redelivery")
+            for message in messages:
+                message.nack()
+            return
+        try:
+            # Job ids follow the notification and submit() is idempotent per id: a redelivered window (also one
+            # nacked after some of its jobs were queued by a racing submit) returns the jobs it already created
+            job_ids = [self.queue.submit(notification, job_id=f"pull-{notification.get('emailAddress')}-{notification['historyId']}")
+                       for notification in notifications]
+        except QueueFullError as e:
+            print(f"Job queue full, nacking {len(messages)} messages for redelivery: {e}")
+            for message in messages:
+                message.nack()
+            return
+        print(f"----------- Collapsed {len(messages)} notifications into jobs {job_ids}")
+        for message in messages:
+            message.ack()
+
+
+def ensure_subscription(subscriber, subscription_path):
+    """Create the topic and subscription on the emulator, real ones are managed outside the app"""
+    if not os.getenv("PUBSUB_EMULATOR_HOST"):
+        return
+    topic_path = pubsub_v1.PublisherClient.topic_path(PROJECT_ID, TOPIC_NAME)
+    try:
+        pubsub_v1.PublisherClient().create_topic(request={"name": topic_path})
+    except AlreadyExists:
+        pass
+    try:
+        subscriber.create_subscription(request={"name": subscription_path, "topic": topic_path})
+    except AlreadyExists:
+        pass
+
+
+def main():
+    from app import run_mail_pipeline, warmup
+
+    queue = JobQueue(run_mail_pipeline, name="mail", store=job_store)
+    batcher = NotificationBatcher(queue)
+    subscriber = pubsub_v1.SubscriberClient()
+    subscription_path = PUBSUB_SUBSCRIPTION if PUBSUB_SUBSCRIPTION.startswith("projects/") else subscriber.subscription_path(PROJECT_ID, PUBSUB_SUBSCRIPTION)
+    ensure_subscription(subscriber, subscription_path)
+
+    job_store.prune()
+    warmup.start()
+    queue.start()
+    batcher.start()
+    if GMAIL_WATCH_RENEWAL:
+        watch_renewer.start()
+    streaming_pull = subscriber.subscribe(subscription_path, callback=batcher.add,
+                                          flow_control=pubsub_v1.types.FlowControl(max_messages=PUBSUB_MAX_OUTSTANDING))
+    print(f"Listening on {subscription_path} (collapse window {PUBSUB_COLLAPSE_WINDOW}s)")
+
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+    try:
+        while not stop.is_set() and streaming_pull.running:
+            stop.wait(1)
+        if streaming_pull.running:
+            streaming_pull.cancel()
+        # Surfaces the error if the stream died on its own
+        streaming_pull.result(timeout=10)
+    finally:
+        watch_renewer.stop()
+        batcher.stop()
+        queue.stop()
+        subscriber.close()
+
+
+if __name__ == "__main__":
+    main()
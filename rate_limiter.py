@@ -0,0 +1,207 @@
+import asyncio
+import hashlib
+import os
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+import metrics
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# "<requests per second>[:<burst>]" per provider, the defaults sit just under the free tier limits
+RATE_LIMIT_DEFAULTS = {"groq": "0.5:2", "perplexity": "0.8:3", "linkedin": "2:5"}
+# Longest a caller is queued (waiting for a slot or re-queued after 429s) before it gets an error
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "120"))
+# Share of the configured rate kept as a floor when 429s keep halving it
+RATE_LIMIT_MIN_FRACTION = float(os.getenv("RATE_LIMIT_MIN_FRACTION", "0.1"))
+# Share of the configured rate added back after every successful call
+RATE_LIMIT_RECOVERY = float(os.getenv("RATE_LIMIT_RECOVERY", "0.05"))
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+
+class RateLimitTimeout(Exception):
+    """Raised when a caller would have to wait longer than its timeout for a rate limit slot"""
+
+
+def parse_duration(value):
+    """Seconds from a rate limit header value: "1.5", "2m59.56s", "120ms", an epoch timestamp or an HTTP date"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        seconds = float(value)
+    except ValueError:
+        parts = _DURATION_RE.findall(value)
+        if parts:
+            return sum(float(number) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit] for number, unit in parts)
+        try:
+            return max(parsedate_to_datetime(value).timestamp() - time.time(), 0)
+        except (TypeError, ValueError):
+            return None
+    # Some providers send the reset time as an epoch timestamp instead of a delay
+    return max(seconds - time.time(), 0) if seconds > 1e9 else seconds
+
+
+def _header(headers, name):
+    return headers.get(name) if headers is not None else None
+
+
+def retry_after(headers):
+    return parse_duration(_header(headers, "retry-after"))
+
+
+class AdaptiveLimiter:
+    """
+    Token bucket (in its GCRA form) for one provider and API key.
+
+    Every caller reserves the next free slot under a lock and then sleeps until it, so callers are served
+    in arrival order and a burst of callers is spread out instead of hammering the provider at once.
+    The rate adapts AIMD style: a 429 halves it and pauses the bucket for Retry-After, every success adds
+    back a little, and x-ratelimit-* headers cap it at what the provider says is left in the current window.
+
+    Args:
+        name (str): Provider name, used in metrics
+        rate (float): Maximum requests per second
+        burst (int): Requests allowed back to back before spacing kicks in
+    """
+
+    def __init__(self, name, rate, burst=1):
+        self.name = name
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tat = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self, timeout):
+        with self._lock:
+            now = time.monotonic()
+            interval = 1 / self.rate
+            tat = max(self._tat, now)
+            wait = max(0.0, tat - (self.burst - 1) * interval - now)
+            if timeout is not None and wait > timeout:
+                raise RateLimitTimeout(f"{self.name} rate limit slot is {wait:.1f}s away (timeout {timeout:.1f}s)")
+            self._tat = tat + interval
+        if wait:
+            metrics.observe_rate_limit_wait(self.name, wait)
+        return wait
+
+    def acquire(self, timeout=RATE_LIMIT_MAX_WAIT):
+        """Block until the caller's slot, raises RateLimitTimeout if that is more than timeout seconds away"""
+        wait = self._reserve(timeout)
+        if wait:
+            time.sleep(wait)
+
+    async def aacquire(self, timeout=RATE_LIMIT_MAX_WAIT):
+        wait = self._reserve(timeout)
+        if wait:
+            await asyncio.sleep(wait)
+
+    def throttle(self, delay=None):
+        """The provider answered 429: slow down and let nobody through for delay seconds"""
+        metrics.observe_throttle(self.name)
+        with self._lock:
+            self.rate = max(self.max_rate * RATE_LIMIT_MIN_FRACTION, self.rate / 2)
+            interval = 1 / self.rate
+            resume = time.monotonic() + (delay if delay is not None else interval)
+            # Queued callers resume one interval apart after the pause, without a burst
+            self._tat = max(self._tat, resume + (self.burst - 1) * interval)
+
+    def record_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * RATE_LIMIT_RECOVERY)
+
+    def observe(self, status_code, headers=None):
+        """
+        Adapt to a response
+
+        Returns:
+            bool: True if the response was a 429 and the call should be queued again
+        """
+        if status_code == 429:
+            self.throttle(retry_after(headers))
+            return True
+        self.record_success()
+        for kind in ("requests", "tokens"):
+            remaining = _header(headers, f"x-ratelimit-remaining-{kind}")
+            reset = parse_duration(_header(headers, f"x-ratelimit-reset-{kind}"))
+            if remaining is None or reset is None:
+                continue
+            try:
+                remaining = float(remaining)
+            except ValueError:
+                continue
+            with self._lock:
+                if remaining < 1:
+                    # Window exhausted, hold every caller until it resets
+                    self._tat = max(self._tat, time.monotonic() + reset + (self.burst - 1) / self.rate)
+                elif kind == "requests" and reset > 0:
+                    self.rate = max(self.max_rate * RATE_LIMIT_MIN_FRACTION, min(self.rate, remaining / reset))
+        return False
+
+    def call(self, fn, *args, timeout=RATE_LIMIT_MAX_WAIT, **kwargs):
+        """
+        Call fn once a slot is free, queueing it again on 429 errors until timeout.
+        A 429 is recognised by a status_code of 429 on the raised exception (litellm, httpx.HTTPStatusError...).
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            self.acquire(max(0.0, deadline - time.monotonic()))
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                response = getattr(e, "response", None)
+                status_code = getattr(e, "status_code", None) or getattr(response, "status_code", None)
+                if status_code != 429 or time.monotonic() >= deadline:
+                    raise
+                self.throttle(retry_after(getattr(response, "headers", None)))
+                continue
+            self.record_success()
+            return result
+
+
+def _parse_config(value):
+    rate, _, burst = value.partition(":")
+    return float(rate), int(burst or 1)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+_hosts = {}
+
+
+def register_host(base_url, provider):
+    """Rate limit every http_client request to base_url's host (and port) under provider's limits"""
+    host = urlsplit(base_url).netloc.lower()
+    if host:
+        _hosts[host] = provider
+
+
+def service_for(url):
+    """Registered provider name of a url's host, "other" for everything else (article and image hosts)"""
+    return _hosts.get(urlsplit(str(url)).netloc.lower(), "other")
+
+
+def limiter_for(provider, api_key=None):
+    """Shared limiter for a provider and API key, keys are only kept as a hash"""
+    key_hash = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12] if api_key else ""
+    with _limiters_lock:
+        limiter = _limiters.get((provider, key_hash))
+        if limiter is None:
+            rate, burst = _parse_config(os.getenv(f"RATE_LIMIT_{provider.upper()}", RATE_LIMIT_DEFAULTS.get(provider, "5:5")))
+            limiter = _limiters[(provider, key_hash)] = AdaptiveLimiter(provider, rate, burst)
+        return limiter
+
+
+def limiter_for_request(url, headers=None):
+    """Limiter for an outgoing request, None when its host is not a registered provider"""
+    provider = _hosts.get(urlsplit(str(url)).netloc.lower())
+    if provider is None:
+        return None
+    authorization = _header(headers, "Authorization") or _header(headers, "authorization") or ""
+    # Same key as limiter_for(provider, api_key) gets from code that holds the raw key (the crew's LLM)
+    return limiter_for(provider, authorization.removeprefix("Bearer ") or None)
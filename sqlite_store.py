@@ -0,0 +1,47 @@
+import os
+import threading
+from dotenv import load_dotenv
+
+# pysqlite3-binary ships a newer SQLite than some base images, fall back to the stdlib module
+try:
+    import pysqlite3 as sqlite3
+except ImportError:
+    import sqlite3
+
+load_dotenv()
+
+STATE_DB_PATH = os.getenv("STATE_DB_PATH", "state.db")
+
+
+class SQLiteStore:
+    """
+    Base class for the small SQLite-backed state stores.
+
+    Subclasses set SCHEMA, which is applied once on construction. Every thread gets its own connection,
+    the database runs in WAL mode so readers never block the single writer.
+    """
+
+    SCHEMA = ""
+
+    def __init__(self, path=None):
+        self.path = path or STATE_DB_PATH
+        self._local = threading.local()
+        with self.connection() as conn:
+            conn.executescript(self.SCHEMA)
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add_column(self, table, column, declaration):
+        """Add a column that SCHEMA gained after the table was first created"""
+        conn = self.connection()
+        if column not in {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}:
+            with conn:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
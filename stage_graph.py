@@ -0,0 +1,92 @@
+import time
+from metrics import stage_timer
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class StageError(Exception):
+    """Raised by StageGraph.run() when a stage fails, the original exception is chained"""
+
+    def __init__(self, stage, error):
+        super().__init__(f"Stage '{stage}' failed: {error}")
+        self.stage = stage
+        self.error = error
+
+
+class StageGraph:
+    """
+    Small dependency graph of pipeline stages.
+
+    Each stage is a function called with the results of its dependencies as keyword arguments.
+    A stage starts as soon as all of its dependencies are done, so independent stages overlap.
+
+    Example:
+        graph = StageGraph()
+        graph.add("article", fetch_article)
+        graph.add("image", download)
+        graph.add("post", publish, deps=("article", "image"))
+        results = graph.run()
+    """
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+        self.stages = {}
+        self.timings = {}
+
+    def add(self, name, fn, deps=()):
+        unknown = [dep for dep in deps if dep not in self.stages]
+        if unknown:
+            raise ValueError(f"Stage '{name}' depends on unknown stages {unknown}")
+        self.stages[name] = (fn, tuple(deps))
+        return self
+
+    def run(self):
+        """
+        Run every stage, returning {stage name: result}. Timings (seconds, relative to the start of the run)
+        are left in self.timings, including the total wall time and the epoch start time under "total".
+
+        Raises:
+            StageError: For the first stage that fails, stages that have not started yet are cancelled
+        """
+        results, running, self.timings = {}, {}, {}
+        pending = dict(self.stages)
+        started_at, started = time.time(), time.perf_counter()
+
+        def timed(name, fn, kwargs):
+            stage_start = time.perf_counter()
+            try:
+                with stage_timer(name):
+                    return fn(**kwargs)
+            finally:
+                stage_end = time.perf_counter()
+                self.timings[name] = {
+                    "start": round(stage_start - started, 4),
+                    "end": round(stage_end - started, 4),
+                    "duration": round(stage_end - stage_start, 4),
+                }
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="stage") as executor:
+            while pending or running:
+                for name, (fn, deps) in list(pending.items()):
+                    if all(dep in results for dep in deps):
+                        kwargs = {dep: results[dep] for dep in deps}
+                        running[executor.submit(timed, name, fn, kwargs)] = name
+                        del pending[name]
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        for other in running:
+                            other.cancel()
+                        raise StageError(name, error) from error
+                    results[name] = future.result()
+
+        total = round(time.perf_counter() - started, 4)
+        self.timings["total"] = {"start": 0.0, "end": total, "duration": total, "started_at": round(started_at, 3)}
+        return results
+
+    def report(self):
+        lines = []
+        for name, timing in sorted(self.timings.items(), key=lambda item: (item[0] == "total", item[1]["start"])):
+            lines.append(f"{name:<12} {timing['start']:>8.3f}s -> {timing['end']:>8.3f}s  ({timing['duration']:.3f}s)")
+        return "\n".join(lines)
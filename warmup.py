@@ -0,0 +1,62 @@
+import os
+import threading
+import time
+import traceback
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# "background": warm up after the server is listening, "eager": before it starts serving, "lazy": only on first use
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "background")
+
+
+class Warmup:
+    """
+    Runs the slow startup steps (heavy imports, client and crew construction) off the request path.
+
+    Required steps decide readiness, optional ones (e.g. building a Gmail client, which needs a token) only
+    record their error. Anything not warmed yet is still loaded lazily by the first job that needs it.
+
+    Args:
+        steps (list): (name, callable, required) tuples, run in order
+    """
+
+    def __init__(self, steps):
+        self.steps = steps
+        self.state = "pending"
+        self.timings = {}
+        self.errors = {}
+        self._thread = None
+
+    def start(self, mode=STARTUP_WARMUP):
+        if mode == "lazy":
+            self.state = "ready"
+        elif mode == "eager":
+            self.run()
+        elif self._thread is None:
+            self._thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+            self._thread.start()
+
+    def run(self):
+        self.state = "warming"
+        started = time.perf_counter()
+        failed = False
+        for name, fn, required in self.steps:
+            step_start = time.perf_counter()
+            try:
+                fn()
+            except Exception as e:
+                traceback.print_exc()
+                self.errors[name] = str(e)
+                failed = failed or required
+            self.timings[name] = round(time.perf_counter() - step_start, 3)
+        self.timings["total"] = round(time.perf_counter() - started, 3)
+        self.state = "failed" if failed else "ready"
+        print(f"----------- Warmup {self.state} in {self.timings['total']}s: {self.timings}")
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    def status(self):
+        return {"state": self.state, "timings": self.timings, "errors": self.errors}
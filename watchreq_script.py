@@ -1,13 +1,16 @@
 import os.path
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
 
 import base64
-from bs4 import BeautifulSoup
 from dotenv import load_dotenv
 import os
-import requests
+import json
+import threading
+from googleapiclient.errors import HttpError
+from gmail_client import gmail_client
+from coordination import coordination, lock
+from article_cache import article_cache
+import image_io
+from newsletter_parser import get_top_story
 load_dotenv()  
 
 # The same SCOPES used during your quickstart
@@ -18,24 +21,22 @@ PROJECT_ID = os.getenv("GOOGLE_PROJECT_ID") # <-- replace with your Project ID
 TOPIC_NAME = os.getenv("GMAIL_TOPIC_NAME")  # <-- replace with your Pub/Sub topic name (not subscription)
 LABEL_NAME = os.getenv("TARGET_LABEL_NAME")  # <-- your Gmail label's name
 
+# "incremental" fetches only messages added since the last processed historyId, "latest" always takes the newest message
+GMAIL_FETCH_MODE = os.getenv("GMAIL_FETCH_MODE", "incremental")
+# Only read when the shared state has no cursor yet, it was the cursor's home before replicas shared one
+HISTORY_STATE_FILE = os.getenv("GMAIL_HISTORY_STATE_FILE", "history_state.json")
+HISTORY_STATE_KEY = "gmail_history_id"
+# Upper bound on one history sync, the cross-replica cursor lock expires after it
+HISTORY_LOCK_TTL = 300
+
+_history_lock = threading.Lock()
+
 def get_gmail_service():
-    creds = None
-    if os.path.exists('token.json'):
-        creds = Credentials.from_authorized_user_file('token.json', SCOPES)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            raise Exception("You must authorize the app and have a valid token.json file.")
-    return build('gmail', 'v1', credentials=creds)
+    # Credentials and the discovery client are cached process-wide, see gmail_client.py
+    return gmail_client.get_service()
 
 def get_label_id(service, label_name): 
-    results = service.users().labels().list(userId='me').execute()
-    labels = results.get('labels', [])
-    for label in labels:
-        if label['name'] == label_name:
-            return label['id']
-    raise Exception(f"Label '{label_name}' not found. Please check spelling or create it in Gmail.")
+    return gmail_client.get_label_id(label_name, service)
 
 def send_gmail_watch(service, label_id, topic_name):
     body = {
@@ -46,11 +47,22 @@ def send_gmail_watch(service, label_id, topic_name):
     response = service.users().watch(userId='me', body=body).execute()
     print("Watch response from Gmail API:")
     print(response)
+    return response
 
+def watch_label():
+    """
+    Start or renew the watch on LABEL_NAME
 
-def get_message_body(service, label_id): #returns html content
-    response = service.users().messages().list(userId='me', labelIds=[label_id]).execute()
-    message_id = response['messages'][0]['id']
+    Returns:
+        dict: The watch response ({"historyId": ..., "expiration": ...}) with the topic and label it covers
+    """
+    service = get_gmail_service()
+    topic_full_name = f'projects/{PROJECT_ID}/topics/{TOPIC_NAME}'
+    response = send_gmail_watch(service, get_label_id(service, LABEL_NAME), topic_full_name)
+    return {**response, "topic": topic_full_name, "label": LABEL_NAME}
+
+
+def get_message_html(service, message_id): #returns html content
     message = service.users().messages().get(userId="me", id=message_id, format="full").execute()
     body_content = None
     if "payload" in message:
@@ -72,51 +84,122 @@ def get_message_body(service, label_id): #returns html content
                     body_content = decoded_bytes.decode('UTF-8')
     return body_content 
 
+def get_latest_message_id(service, label_id):
+    response = service.users().messages().list(userId='me', labelIds=[label_id], maxResults=1).execute()
+    messages = response.get('messages', [])
+    return messages[0]['id'] if messages else None
+
+def list_label_message_ids(service, label_id, max_results): # newest first
+    message_ids, page_token = [], None
+    while len(message_ids) < max_results:
+        response = service.users().messages().list(userId='me', labelIds=[label_id], pageToken=page_token,
+                                                    maxResults=min(500, max_results - len(message_ids))).execute()
+        message_ids += [message['id'] for message in response.get('messages', [])]
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            break
+    return message_ids
+
+def get_message_body(service, label_id): #returns html content
+    message_id = get_latest_message_id(service, label_id)
+    if not message_id:
+        raise Exception(f"No messages found under label id '{label_id}'.")
+    return get_message_html(service, message_id)
+
+def load_last_history_id():
+    # The cursor lives in the shared state so every worker and replica advances the same one
+    history_id = coordination.get(HISTORY_STATE_KEY)
+    if history_id is not None or not os.path.exists(HISTORY_STATE_FILE):
+        return history_id
+    with open(HISTORY_STATE_FILE, 'r') as f:
+        return json.load(f).get('historyId')
+
+def save_last_history_id(history_id):
+    coordination.set(HISTORY_STATE_KEY, str(history_id))
+
+def list_added_message_ids(service, label_id, start_history_id):
+    """
+    List ids of messages added to a label since a history id, oldest first
+
+    Returns:
+        tuple: (message_ids, latest_history_id)
+    """
+    message_ids, seen = [], set()
+    latest_history_id = start_history_id
+    page_token = None
+    while True:
+        response = service.users().history().list(userId='me', startHistoryId=start_history_id, labelId=label_id,
+                                                  historyTypes=['messageAdded'], pageToken=page_token).execute()
+        for record in response.get('history', []):
+            for added in record.get('messagesAdded', []):
+                message = added['message']
+                if label_id in message.get('labelIds', [label_id]) and message['id'] not in seen:
+                    seen.add(message['id'])
+                    message_ids.append(message['id'])
+        latest_history_id = response.get('historyId', latest_history_id)
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            return message_ids, latest_history_id
+
+def claim_new_message_ids(service, label_id, notification_history_id, record=None):
+    """
+    Return the ids of messages that arrived since the last processed historyId and advance the stored cursor,
+    so every message is handed out exactly once even when pushes overlap.
+    Falls back to the newest labelled message when there is no usable cursor yet.
+
+    Args:
+        service: Gmail API client
+        label_id (str): Label to watch
+        notification_history_id (str): historyId from the Pub/Sub notification
+        record (callable): record(message_ids) persists the claimed ids, it runs under the cursor lock before
+            the cursor advances, so a crash in between can never lose them
+
+    Returns:
+        list: Gmail message ids, oldest first
+    """
+    if GMAIL_FETCH_MODE != "incremental":
+        message_id = get_latest_message_id(service, label_id)
+        return [message_id] if message_id else []
+
+    # The thread lock keeps the workers of this process in line, the shared lock the other processes and replicas
+    with _history_lock, lock("gmail-history", ttl=HISTORY_LOCK_TTL, timeout=HISTORY_LOCK_TTL):
+        start_history_id = load_last_history_id()
+        if start_history_id is not None and int(start_history_id) >= int(notification_history_id):
+            # Already synced past this notification (redelivery or an overlapping push)
+            return []
+        message_ids = None
+        if start_history_id is not None:
+            try:
+                message_ids, latest_history_id = list_added_message_ids(service, label_id, start_history_id)
+            except HttpError as e:
+                if e.resp.status != 404:
+                    raise
+                # startHistoryId is too old for Gmail to replay, resync from the newest message
+                print(f"History id {start_history_id} expired, falling back to the latest message")
+        if message_ids is None:
+            message_id = get_latest_message_id(service, label_id)
+            message_ids = [message_id] if message_id else []
+            latest_history_id = notification_history_id
+        if record is not None:
+            record(message_ids)
+        save_last_history_id(max(int(latest_history_id), int(notification_history_id)))
+        return message_ids
+
 def get_top_news_data(mail_html_content):
-    title, content_page_link, img_src = None, None, None
-    soup = BeautifulSoup(mail_html_content, 'lxml')
-    top_news_strong = soup.find('strong', string="Top News")
-    top_news_tr = top_news_strong.find_parent("tr") if top_news_strong else print("Top News not found")
-    next_tr = top_news_tr.find_next_sibling() if top_news_tr else print("top_news_tr not found")
-    a_tag = next_tr.find('a') if next_tr else print("Next sibling not found")
-    if a_tag:
-        content_page_link = a_tag.get('href')
-        title = a_tag.get_text(strip=True)
-    img_list = soup.find_all('img')
-    img_src = img_list[1].get('src') if len(img_list) > 1 else None
-    return title, content_page_link, img_src
+    # Raises NewsletterParseError instead of returning Nones when the Top News block is missing
+    story = get_top_story(mail_html_content)
+    return story.title, story.link, story.img_src
 
 def download_image(img_url):
-    image_path = None
-    response = requests.get(img_url)
-    # Extract filename from URL, or set your own
-    filename = "post_image."+img_url.split(".")[-1] if img_url else "default_image.jpg" 
-
-    # Write the image content to a file
-    with open(filename, 'wb') as f:
-        f.write(response.content)
-    image_path = f'./{filename}'
-    print(f"Image saved in path {image_path}")
-    return image_path
+    # Streams to a per-call temp file named after the sniffed image type, see image_io.py
+    return image_io.download_image(img_url)
 
 def get_text_content(page_url: str):
-    response = requests.get(page_url)
-    response.raise_for_status() 
-    soup = BeautifulSoup(response.text, 'lxml')
-    page_text = soup.get_text(separator='\n', strip=True)
-    return page_text
+    # Streams the page with a size cap, keeps only the main article body and caches it on disk
+    return article_cache.get_text(page_url)
          
 
 if __name__ == '__main__':
-    # Initialize gmail API client
-    service = get_gmail_service()
-
-    # Find label ID for your "Alpha Signal" label
-    label_id = get_label_id(service, LABEL_NAME)
-    print(f"Label '{LABEL_NAME}' ID is: {label_id}")
-
-    # Pub/Sub topic full name (expected format)
-    topic_full_name = f'projects/{PROJECT_ID}/topics/{TOPIC_NAME}'
-
-    # Send the watch request
-    send_gmail_watch(service, label_id, topic_full_name)
+    # Send the watch request right away, the app renews it on its own afterwards (see gmail_watch.py)
+    from gmail_watch import watch_renewer
+    watch_renewer.renew()